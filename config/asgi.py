@@ -3,11 +3,20 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+En producción el sitio se sirve por WSGI (línea "web" del Procfile) y solo
+los flujos Server-Sent Events (chat de partidos y avisos) se sirven desde
+este módulo, en un proceso aparte (línea "sse"): esperan en el loop sin
+ocupar un worker por conexión abierta, y las páginas no comparten proceso
+con ellos. Las plantillas apuntan los flujos a ese proceso con FLUJOS_URL.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import pymysql
+
+pymysql.install_as_MySQLdb()
 
 from django.core.asgi import get_asgi_application
 
@@ -89,6 +89,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'eventos.middleware.ConsultasMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -105,6 +106,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'eventos.context_processors.flujos',
             ],
         },
     },
@@ -128,6 +130,69 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# La caché la comparten todos los procesos (versiones, invalidaciones) y el
+# bloqueo contra estampidas usa cache.add, que debe ser atómico entre procesos:
+# Redis si hay REDIS_URL; si no, la tabla de caché en la base de datos (su
+# INSERT con clave única hace atómico el add). FileBasedCache no sirve: su add
+# es leer-y-escribir y cada set puede recorrer el directorio completo.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            # Se crea con: python manage.py createcachetable
+            'LOCATION': 'cache_nf1',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+            },
+        }
+    }
+
+
+# Medición de consultas por solicitud (eventos.middleware.ConsultasMiddleware)
+# Fracción de solicitudes medidas; las de usuarios staff se miden siempre
+CONSULTAS_MUESTREO = float(os.getenv('CONSULTAS_MUESTREO', '1.0' if DEBUG else '0.02'))
+# Sobre este total por solicitud se registra un aviso
+CONSULTAS_PRESUPUESTO = int(os.getenv('CONSULTAS_PRESUPUESTO', '50'))
+# Repeticiones de una misma forma de SQL que se consideran un N+1
+CONSULTAS_REPETICIONES_N1 = int(os.getenv('CONSULTAS_REPETICIONES_N1', '5'))
+
+# Origen del proceso ASGI que sirve los flujos SSE (línea "sse" del Procfile), por
+# ejemplo https://flujos.nosfalta1.cl. Vacío: los flujos se piden al mismo origen
+# (runserver, o un solo proceso ASGI). Con otro origen la cookie de sesión debe
+# valer para ambos (SESSION_COOKIE_DOMAIN=.nosfalta1.cl) y el origen del sitio
+# debe estar en CSRF_TRUSTED_ORIGINS, que también autoriza el CORS de los flujos
+FLUJOS_URL = os.getenv('FLUJOS_URL', '').rstrip('/')
+SESSION_COOKIE_DOMAIN = os.getenv('SESSION_COOKIE_DOMAIN') or None
+
+# Chat de partidos: broker que avisa de los mensajes nuevos a los flujos SSE.
+# BrokerCache funciona con varios workers (comparten la caché); BrokerMemoria
+# entrega sin espera pero solo dentro de un proceso
+CHAT_BROKER = os.getenv('CHAT_BROKER', 'eventos.chat.BrokerCache')
+# Segundos entre revisiones de la caché con BrokerCache; una sola por proceso para todos los flujos
+CHAT_INTERVALO = float(os.getenv('CHAT_INTERVALO', '1.0'))
+# Segundos entre revisiones de las versiones de avisos; una sola por proceso para todos los flujos
+AVISOS_INTERVALO = float(os.getenv('AVISOS_INTERVALO', '2.0'))
+# Cola de tareas (eventos.tareas): con TAREAS_EN_LINEA=True se ejecutan al confirmar la
+# transacción de la vista, sin trabajador (desarrollo local)
+TAREAS_EN_LINEA = os.getenv('TAREAS_EN_LINEA', 'False').lower() == 'true'
+# Segundos tras los que una tarea en curso se da por abandonada y vuelve a la cola
+TAREAS_TIEMPO_MAXIMO = int(os.getenv('TAREAS_TIEMPO_MAXIMO', '600'))
+TAREAS_RETENCION_DIAS = int(os.getenv('TAREAS_RETENCION_DIAS', '7'))
+# Notificaciones leídas más viejas que esto se depuran (depurar_notificaciones) y las vistas
+# solo leen esta ventana; con la tabla particionada, los meses completos fuera de ella se retiran
+NOTIFICACIONES_RETENCION_DIAS = int(os.getenv('NOTIFICACIONES_RETENCION_DIAS', '90'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
 from .models import (Usuario, Localidad, Reserva, Partido, ParticipantePartido, 
-                     MensajePartido, Notificacion, Recinto, Cancha, HorarioCancha,
-                     Equipo, MiembroEquipo, PartidoCompetitivo, InvitacionEquipo, EstadisticaJugador)
+                     MensajePartido, LecturaChat, Notificacion, NotificacionArchivada, Recinto, Cancha, HorarioCancha,
+                     Equipo, MiembroEquipo, PartidoCompetitivo, InvitacionEquipo, EstadisticaJugador,
+                     SerieReserva, Tarea)
 
 
 class UsuarioAdmin(BaseUserAdmin):
@@ -26,7 +28,7 @@ class UsuarioAdmin(BaseUserAdmin):
 
 @admin.register(Localidad)
 class LocalidadAdmin(admin.ModelAdmin):
-    list_display = ('id_localidad', 'nombre', 'fecha_creacion')
+    list_display = ('id_localidad', 'nombre', 'latitud', 'longitud', 'fecha_creacion')
     search_fields = ('nombre',)
 
 
@@ -38,16 +40,21 @@ class ReservaAdmin(admin.ModelAdmin):
     date_hierarchy = 'fecha_reserva'
 
 
+@admin.register(SerieReserva)
+class SerieReservaAdmin(admin.ModelAdmin):
+    list_display = ('id_serie', 'id_cancha', 'id_usuario', 'dia_semana', 'hora_inicio', 'hora_fin', 'fecha_inicio', 'fecha_fin', 'estado')
+    search_fields = ('id_usuario__nombre', 'id_usuario__apellido', 'id_cancha__nombre')
+    list_filter = ('estado', 'dia_semana', 'id_cancha')
+
+
 @admin.register(Partido)
 class PartidoAdmin(admin.ModelAdmin):
-    list_display = ('id_partido', 'lugar', 'fecha_inicio', 'id_organizador', 'max_jugadores', 'jugadores_actuales', 'espacios_disponibles')
+    list_display = ('id_partido', 'lugar', 'fecha_inicio', 'id_organizador', 'max_jugadores', 'num_participantes', 'espacios_disponibles')
     search_fields = ('lugar', 'descripcion', 'id_organizador__nombre')
-    list_filter = ('fecha_inicio', 'id_localidad')
+    list_filter = ('archivado', 'fecha_inicio', 'id_localidad')
     date_hierarchy = 'fecha_inicio'
-    
-    def jugadores_actuales(self, obj):
-        return obj.jugadores_actuales()
-    jugadores_actuales.short_description = 'Jugadores Actuales'
+    # Lo mantienen las inscripciones y el comando reconciliar_participantes
+    readonly_fields = ('num_participantes',)
     
     def espacios_disponibles(self, obj):
         return obj.espacios_disponibles()
@@ -74,6 +81,13 @@ class MensajePartidoAdmin(admin.ModelAdmin):
     mensaje_corto.short_description = 'Mensaje'
 
 
+@admin.register(LecturaChat)
+class LecturaChatAdmin(admin.ModelAdmin):
+    list_display = ('id_lectura', 'id_partido', 'id_usuario', 'id_ultimo_leido', 'fecha_actualizacion')
+    search_fields = ('id_usuario__nombre', 'id_usuario__apellido')
+    list_select_related = ('id_partido', 'id_usuario')
+
+
 @admin.register(Notificacion)
 class NotificacionAdmin(admin.ModelAdmin):
     list_display = ('id_notificacion', 'id_usuario', 'tipo', 'id_partido', 'leida', 'fecha_creacion')
@@ -87,12 +101,21 @@ class NotificacionAdmin(admin.ModelAdmin):
     mensaje_corto.short_description = 'Mensaje'
 
 
+@admin.register(NotificacionArchivada)
+class NotificacionArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('id_notificacion', 'id_usuario', 'tipo', 'id_partido', 'fecha_creacion', 'fecha_archivo')
+    search_fields = ('mensaje',)
+    list_filter = ('tipo', 'fecha_creacion')
+    # Tabla que solo crece: no contarla entera en cada página
+    show_full_result_count = False
+
+
 admin.site.register(Usuario, UsuarioAdmin)
 
 
 @admin.register(Recinto)
 class RecintoAdmin(admin.ModelAdmin):
-    list_display = ('id_recinto', 'nombre', 'direccion', 'id_localidad', 'fecha_creacion')
+    list_display = ('id_recinto', 'nombre', 'direccion', 'id_localidad', 'latitud', 'longitud', 'fecha_creacion')
     search_fields = ('nombre', 'direccion')
     list_filter = ('id_localidad', 'fecha_creacion')
 
@@ -153,3 +176,19 @@ class EstadisticaJugadorAdmin(admin.ModelAdmin):
     list_filter = ('id_partido__fecha_hora',)
 
 
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id_tarea', 'funcion', 'estado', 'prioridad', 'intentos', 'max_intentos', 'ejecutar_desde', 'fecha_fin')
+    search_fields = ('funcion',)
+    list_filter = ('estado', 'funcion')
+    readonly_fields = ('fecha_creacion', 'tomada_en', 'trabajador', 'ultimo_error')
+    actions = ['reintentar']
+
+    @admin.action(description='Volver a encolar las tareas seleccionadas')
+    def reintentar(self, request, queryset):
+        cantidad = queryset.exclude(estado='en_curso').update(
+            estado='pendiente', intentos=0, ejecutar_desde=timezone.now(), fecha_fin=None
+        )
+        self.message_user(request, f'{cantidad} tareas encoladas de nuevo.')
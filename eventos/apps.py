@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class EventosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'eventos'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .busqueda import preparar_indice_sqlite
+        post_migrate.connect(preparar_indice_sqlite, sender=self)
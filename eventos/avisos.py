@@ -0,0 +1,193 @@
+"""
+Contador de avisos sin leer (notificaciones y mensajes de chat) enviado por flujo.
+
+La insignia de la barra ya no consulta cada 30 segundos: cada pestaña abre un
+flujo Server-Sent Events (vista avisos_eventos) que manda el contador al
+conectarse y después solo cuando cambia. Para saber si cambió no se toca la
+base: cada usuario tiene en la caché una sola versión, igual que las de
+cache_home, que se renueva al confirmar una notificación, un cursor de
+lectura o un mensaje nuevo en cualquiera de sus chats. Un sondeo por proceso
+(eventos.sondeo) lee cada AVISOS_INTERVALO segundos las versiones de todos
+los usuarios con flujos abiertos, y cada flujo recalcula el contador solo
+si la suya cambió.
+
+Las notificaciones no leídas no se cuentan en la tabla: cada usuario guarda
+su contador en Usuario.notificaciones_no_leidas, que se ajusta con UPDATE al
+crear, leer o borrar notificaciones, y se lee desde la caché bajo la versión
+de avisos del usuario. El comando reconciliar_notificaciones corrige las
+desviaciones (ediciones desde el admin, escrituras fuera de estas funciones).
+"""
+import time
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import LecturaChat, MensajePartido, Notificacion, Usuario
+from .sondeo import SondeoCache
+
+TTL_VERSION = 24 * 60 * 60
+# Cada escritura renueva la versión: el TTL solo acota lo cambiado fuera de estas funciones
+TTL_NO_LEIDAS = 60 * 60
+
+# Un sondeo por proceso para los flujos de todos los usuarios
+_sondeo = SondeoCache('AVISOS_INTERVALO', 2.0)
+
+
+def _clave_usuario(usuario_id):
+    return f'avisos:usuario:{usuario_id}'
+
+
+def _clave_no_leidas(usuario_id, version):
+    return f'avisos:no_leidas:{usuario_id}:{version}'
+
+
+def _renovar(claves):
+    cache.set_many({clave: uuid.uuid4().hex[:12] for clave in claves}, TTL_VERSION)
+
+
+def avisar_usuarios(usuario_ids):
+    """Renovar la versión de avisos de estos usuarios al confirmar la transacción"""
+    claves = [_clave_usuario(usuario_id) for usuario_id in set(usuario_ids)]
+    transaction.on_commit(lambda: _renovar(claves))
+
+
+def avisar_chat(partido_id):
+    """Un mensaje nuevo cambia los no leídos de todos los que siguen el chat"""
+    # Unas decenas de cursores por partido: se leen en la transacción del mensaje
+    avisar_usuarios(LecturaChat.objects.filter(id_partido_id=partido_id).values_list('id_usuario_id', flat=True))
+
+
+def _lecturas_con_no_leidos(usuario_id):
+    # Por cada cursor del usuario, un conteo sobre el rango (id_partido, id_mensaje > cursor) del índice
+    no_leidos = MensajePartido.objects.filter(
+        id_partido_id=OuterRef('id_partido_id'), id_mensaje__gt=OuterRef('id_ultimo_leido')
+    ).order_by().values('id_partido_id').annotate(total=Count('pk')).values('total')
+    return LecturaChat.objects.filter(id_usuario_id=usuario_id).annotate(
+        no_leidos=Coalesce(Subquery(no_leidos), Value(0))
+    )
+
+
+def contar_no_leidos(usuario_id):
+    """Mensajes sin leer del usuario en todos sus chats"""
+    return _lecturas_con_no_leidos(usuario_id).aggregate(total=Sum('no_leidos'))['total'] or 0
+
+
+def chats_no_leidos(usuario_id):
+    """Lecturas con mensajes pendientes, con el partido y el conteo en no_leidos"""
+    return list(
+        _lecturas_con_no_leidos(usuario_id).filter(no_leidos__gt=0)
+        .select_related('id_partido').only('id_partido__id_partido', 'id_partido__lugar', 'id_partido__fecha_inicio')
+        .order_by('-no_leidos')
+    )
+
+
+def sumar_no_leidas(conteos):
+    """
+    Ajustar el contador de notificaciones no leídas: {usuario_id: cambio}.
+
+    Un UPDATE por cada cambio distinto (una notificación a mil usuarios es un
+    solo UPDATE). Al restar nunca baja de cero: GREATEST(contador, n) - n no
+    desborda la columna sin signo de MySQL.
+    """
+    por_cambio = defaultdict(list)
+    for usuario_id, cambio in conteos.items():
+        if cambio:
+            por_cambio[cambio].append(usuario_id)
+    if not por_cambio:
+        return
+    for cambio, usuario_ids in por_cambio.items():
+        if cambio > 0:
+            valor = F('notificaciones_no_leidas') + cambio
+        else:
+            valor = Greatest(F('notificaciones_no_leidas'), -cambio) + cambio
+        Usuario.objects.filter(pk__in=usuario_ids).update(notificaciones_no_leidas=valor)
+    # La versión nueva deja atrás el contador guardado con la anterior
+    avisar_usuarios(conteos)
+
+
+def _version_usuario(usuario_id):
+    clave = _clave_usuario(usuario_id)
+    version = cache.get(clave)
+    if version is None:
+        # add: si otro la creó (o una escritura la renovó) entre medio, vale la suya
+        cache.add(clave, uuid.uuid4().hex[:12], TTL_VERSION)
+        version = cache.get(clave)
+    return version
+
+
+def notificaciones_no_leidas(usuario_id):
+    """
+    Contador de notificaciones no leídas desde la caché; si no está, de la columna del usuario.
+
+    El valor se guarda bajo la versión de avisos del usuario, que cada escritura
+    renueva al confirmar. Una lectura de la columna que se cruza con una
+    escritura queda guardada bajo la versión vieja, que ya nadie consulta.
+    """
+    clave = _clave_no_leidas(usuario_id, _version_usuario(usuario_id))
+    valor = cache.get(clave)
+    if valor is None:
+        valor = Usuario.objects.filter(pk=usuario_id).values_list('notificaciones_no_leidas', flat=True).first() or 0
+        cache.add(clave, valor, TTL_NO_LEIDAS)
+    return valor
+
+
+def usuarios_desviados(desde_pk, hasta_pk):
+    """Usuarios del rango [desde_pk, hasta_pk) cuyo contador no coincide con sus notificaciones"""
+    return Usuario.objects.filter(pk__gte=desde_pk, pk__lt=hasta_pk).annotate(
+        real=_conteo_real()
+    ).exclude(notificaciones_no_leidas=F('real'))
+
+
+def reconciliar_no_leidas(desde_pk, hasta_pk):
+    """Corregir el contador de los usuarios desviados del rango; devuelve los corregidos"""
+    ids = list(usuarios_desviados(desde_pk, hasta_pk).values_list('pk', flat=True))
+    if ids:
+        Usuario.objects.filter(pk__in=ids).update(notificaciones_no_leidas=_conteo_real())
+        avisar_usuarios(ids)
+    return len(ids)
+
+
+def _conteo_real():
+    no_leidas = Notificacion.objects.filter(
+        id_usuario=OuterRef('pk'), leida=False
+    ).order_by().values('id_usuario').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(no_leidas), Value(0))
+
+
+def contar_avisos(usuario_id):
+    """{'count', 'notificaciones', 'mensajes'} como los entrega la insignia"""
+    notificaciones = notificaciones_no_leidas(usuario_id)
+    mensajes = contar_no_leidos(usuario_id)
+    return {'count': notificaciones + mensajes, 'notificaciones': notificaciones, 'mensajes': mensajes}
+
+
+async def cambios_avisos(usuario_id, espera, duracion):
+    """
+    Contador al empezar y luego cada vez que cambia; None tras cada espera sin cambios.
+
+    Termina pasados `duracion` segundos para que el cliente reconecte.
+    """
+    clave = _clave_usuario(usuario_id)
+    limite = time.monotonic() + duracion
+    version = await _sondeo.leer(clave)
+    conteo = await sync_to_async(contar_avisos)(usuario_id)
+    yield conteo
+    ultimo_envio = time.monotonic()
+    while (ahora := time.monotonic()) < limite:
+        actual = await _sondeo.esperar(clave, version, min(ultimo_envio + espera, limite) - ahora)
+        if actual != version:
+            version = actual
+            nuevo = await sync_to_async(contar_avisos)(usuario_id)
+            if nuevo != conteo:
+                conteo = nuevo
+                ultimo_envio = time.monotonic()
+                yield conteo
+                continue
+        if time.monotonic() >= ultimo_envio + espera:
+            ultimo_envio = time.monotonic()
+            yield None
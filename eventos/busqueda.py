@@ -0,0 +1,110 @@
+"""
+Búsqueda de texto completo sobre partidos (lugar y descripción).
+
+En MySQL usa el índice FULLTEXT partidos_texto_ft (migración
+0015_partidos_texto_ft) con MATCH ... AGAINST en modo de lenguaje natural, que
+además entrega la relevancia. En SQLite (desarrollo y pruebas) el equivalente
+es la tabla virtual FTS5 partidos_fts, que se mantiene con triggers creados
+tras cada migrate: SQLite rehace la tabla partidos en algunas migraciones y
+con ello pierde sus triggers. En otros motores se cae a LIKE sin ranking.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import Partido
+
+TAMANO_PAGINA_BUSQUEDA = 20
+MAX_PAGINAS_BUSQUEDA = 25
+# Términos considerados por búsqueda; el resto se ignora
+MAX_TERMINOS = 10
+
+SQL_FTS_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS partidos_fts USING fts5(
+        lugar, descripcion, content='partidos', content_rowid='id_partido',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS partidos_fts_ai AFTER INSERT ON partidos BEGIN
+        INSERT INTO partidos_fts(rowid, lugar, descripcion) VALUES (new.id_partido, new.lugar, new.descripcion);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS partidos_fts_ad AFTER DELETE ON partidos BEGIN
+        INSERT INTO partidos_fts(partidos_fts, rowid, lugar, descripcion)
+        VALUES ('delete', old.id_partido, old.lugar, old.descripcion);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS partidos_fts_au AFTER UPDATE OF lugar, descripcion ON partidos BEGIN
+        INSERT INTO partidos_fts(partidos_fts, rowid, lugar, descripcion)
+        VALUES ('delete', old.id_partido, old.lugar, old.descripcion);
+        INSERT INTO partidos_fts(rowid, lugar, descripcion) VALUES (new.id_partido, new.lugar, new.descripcion);
+    END""",
+    "INSERT INTO partidos_fts(partidos_fts) VALUES ('rebuild')",
+]
+
+
+def preparar_indice_sqlite(sender, using='default', **kwargs):
+    """post_migrate: crear o reparar el índice FTS5 de partidos cuando la base es SQLite"""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        if 'partidos' not in conexion.introspection.table_names(cursor):
+            return
+        for sentencia in SQL_FTS_SQLITE:
+            cursor.execute(sentencia)
+
+
+def terminos_busqueda(texto):
+    """Palabras de la consulta, en minúsculas y sin signos"""
+    return re.findall(r'\w+', (texto or '').lower())[:MAX_TERMINOS]
+
+
+def _filtrar_por_texto(partidos, terminos):
+    """Filtrar por los términos y anotar 'relevancia' según el motor"""
+    if connection.vendor == 'mysql':
+        relevancia = RawSQL(
+            'MATCH (partidos.lugar, partidos.descripcion) AGAINST (%s IN NATURAL LANGUAGE MODE)',
+            (' '.join(terminos),),
+            output_field=FloatField(),
+        )
+        return partidos.annotate(relevancia=relevancia).filter(relevancia__gt=0)
+
+    if connection.vendor == 'sqlite':
+        # Cualquiera de los términos, también como prefijo ("futbol" encuentra "futbolito")
+        consulta = ' OR '.join(f'"{termino}"*' for termino in terminos)
+        coincidencias = RawSQL('SELECT rowid FROM partidos_fts WHERE partidos_fts MATCH %s', (consulta,))
+        # bm25 es menor cuanto más relevante: se invierte para ordenar igual que MySQL
+        relevancia = RawSQL(
+            'SELECT -bm25(partidos_fts) FROM partidos_fts '
+            'WHERE partidos_fts MATCH %s AND partidos_fts.rowid = partidos.id_partido',
+            (consulta,),
+            output_field=FloatField(),
+        )
+        return partidos.filter(id_partido__in=coincidencias).annotate(relevancia=relevancia)
+
+    condicion = Q()
+    for termino in terminos:
+        condicion |= Q(lugar__icontains=termino) | Q(descripcion__icontains=termino)
+    return partidos.filter(condicion).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+def buscar_partidos_texto(texto, solo_proximos=True, pagina=1, tamano=TAMANO_PAGINA_BUSQUEDA):
+    """
+    Página de partidos vigentes que coinciden con el texto; devuelve (partidos, hay_siguiente).
+
+    Se ordena por relevancia y, a igual relevancia, por fecha más cercana.
+    """
+    terminos = terminos_busqueda(texto)
+    if not terminos:
+        return [], False
+
+    partidos = Partido.objects.filter(archivado=False).select_related('id_organizador', 'id_localidad')
+    if solo_proximos:
+        partidos = partidos.filter(fecha_inicio__gte=timezone.now())
+    partidos = _filtrar_por_texto(partidos, terminos).order_by('-relevancia', 'fecha_inicio', 'id_partido')
+
+    inicio = (pagina - 1) * tamano
+    # Una fila extra indica si hay página siguiente sin contar el total
+    resultados = list(partidos[inicio:inicio + tamano + 1])
+    return resultados[:tamano], len(resultados) > tamano
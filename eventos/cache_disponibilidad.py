@@ -0,0 +1,103 @@
+"""
+Caché versionada de horarios disponibles por (cancha, fecha, duración).
+
+Cada cancha tiene una versión (cambia con sus HorarioCancha) y cada
+cancha-día otra (cambia con sus Reserva). Las entradas cacheadas y el ETag de
+la API incluyen ambas, así que invalidar es solo asignar una versión nueva:
+las entradas antiguas dejan de consultarse y expiran solas. Las versiones son
+valores aleatorios, no contadores, para que una versión perdida o expulsada
+de la caché nunca vuelva a coincidir con datos antiguos.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .disponibilidad import disponibilidad_canchas, hora_texto
+
+TTL_SEGUNDOS = 600
+# Tiempo máximo que una solicitud espera a que otra termine de calcular la misma entrada
+ESPERA_SEGUNDOS = 2.0
+INTERVALO_ESPERA = 0.05
+
+
+def _clave_version_cancha(cancha_id):
+    return f'disp:v:{cancha_id}'
+
+
+def _clave_version_dia(cancha_id, fecha):
+    return f'disp:v:{cancha_id}:{fecha.isoformat()}'
+
+
+def _nueva_version():
+    return uuid.uuid4().hex[:12]
+
+
+def obtener_version(cancha_id, fecha):
+    """Versión actual de (cancha, fecha); se inicializa si no existe"""
+    claves = [_clave_version_cancha(cancha_id), _clave_version_dia(cancha_id, fecha)]
+    valores = cache.get_many(claves)
+    for clave in claves:
+        if clave not in valores:
+            nueva = _nueva_version()
+            # Si otro proceso la creó primero, usar la suya
+            if not cache.add(clave, nueva, timeout=None):
+                nueva = cache.get(clave, nueva)
+            valores[clave] = nueva
+    return '-'.join(valores[clave] for clave in claves)
+
+
+def invalidar_dia(cancha_id, fecha):
+    """Asignar una versión nueva al día al confirmar la transacción actual"""
+    transaction.on_commit(
+        lambda: cache.set(_clave_version_dia(cancha_id, fecha), _nueva_version(), timeout=None)
+    )
+
+
+def invalidar_cancha(cancha_id):
+    """Asignar una versión nueva a la cancha (invalida todos sus días)"""
+    transaction.on_commit(
+        lambda: cache.set(_clave_version_cancha(cancha_id), _nueva_version(), timeout=None)
+    )
+
+
+def _calcular_horarios(cancha_id, fecha, duracion_minutos):
+    slots = disponibilidad_canchas([cancha_id], fecha, fecha, duracion_minutos)[cancha_id][fecha]
+    return [{
+        'hora_inicio': hora_texto(inicio),
+        'hora_fin': hora_texto(fin),
+    } for inicio, fin in slots]
+
+
+def horarios_cacheados(cancha_id, fecha, duracion_minutos, version=None):
+    """
+    Horarios disponibles ya formateados ('HH:MM') desde la caché.
+
+    Ante varios fallos simultáneos de la misma entrada solo uno calcula: el
+    resto espera su resultado hasta ESPERA_SEGUNDOS y luego calcula por su cuenta.
+    """
+    if version is None:
+        version = obtener_version(cancha_id, fecha)
+    clave = f'disp:h:{cancha_id}:{fecha.isoformat()}:{duracion_minutos}:{version}'
+    horarios = cache.get(clave)
+    if horarios is not None:
+        return horarios
+
+    clave_calculo = f'{clave}:calculando'
+    calculando = cache.add(clave_calculo, 1, timeout=int(ESPERA_SEGUNDOS) + 1)
+    if not calculando:
+        limite = time.monotonic() + ESPERA_SEGUNDOS
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA)
+            horarios = cache.get(clave)
+            if horarios is not None:
+                return horarios
+
+    try:
+        horarios = _calcular_horarios(cancha_id, fecha, duracion_minutos)
+        cache.set(clave, horarios, TTL_SEGUNDOS)
+    finally:
+        if calculando:
+            cache.delete(clave_calculo)
+    return horarios
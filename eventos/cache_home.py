@@ -0,0 +1,105 @@
+"""
+Caché compartida del feed de la portada (próximos partidos).
+
+El listado es igual para todos los visitantes, así que se guarda ya
+renderizado como HTML con un TTL corto. La clave incluye una versión que se
+renueva al cambiar un partido o una inscripción, igual que en
+cache_disponibilidad. Lo propio de cada usuario (inscrito u organizador) no se
+cachea: cada tarjeta deja una marca que la vista reemplaza a partir de una sola
+consulta pequeña sobre los partidos del feed.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Partido, ParticipantePartido
+
+TTL_SEGUNDOS = 60
+PARTIDOS_HOME = 10
+ESPERA_SEGUNDOS = 1.0
+INTERVALO_ESPERA = 0.05
+
+CLAVE_VERSION = 'home:v'
+MARCA_ESTADO = '<!--estado:{}-->'
+
+INSIGNIA_INSCRITO = '<span class="badge bg-primary ms-2"><i class="bi bi-check-circle"></i> Inscrito</span>'
+INSIGNIA_ORGANIZADOR = '<span class="badge bg-warning text-dark ms-2"><i class="bi bi-star-fill"></i> Organizas</span>'
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        if not cache.add(CLAVE_VERSION, version, timeout=None):
+            version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+def invalidar_home():
+    """Asignar una versión nueva al feed al confirmar la transacción actual"""
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, uuid.uuid4().hex[:12], timeout=None))
+
+
+def _calcular_feed():
+    partidos = list(Partido.objects.filter(
+        archivado=False, fecha_inicio__gte=timezone.now()
+    ).select_related('id_organizador', 'id_localidad').order_by('fecha_inicio')[:PARTIDOS_HOME])
+    return {
+        'html': render_to_string('home_partidos.html', {'partidos': partidos}),
+        'organizadores': {partido.id_partido: partido.id_organizador_id for partido in partidos},
+    }
+
+
+def feed_home():
+    """
+    Feed compartido como {'html', 'organizadores'} desde la caché.
+
+    Ante varios fallos simultáneos solo uno calcula; el resto espera su
+    resultado hasta ESPERA_SEGUNDOS y luego calcula por su cuenta.
+    """
+    clave = f'home:feed:{_version()}'
+    feed = cache.get(clave)
+    if feed is not None:
+        return feed
+
+    clave_calculo = f'{clave}:calculando'
+    calculando = cache.add(clave_calculo, 1, timeout=int(ESPERA_SEGUNDOS) + 1)
+    if not calculando:
+        limite = time.monotonic() + ESPERA_SEGUNDOS
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA)
+            feed = cache.get(clave)
+            if feed is not None:
+                return feed
+
+    try:
+        feed = _calcular_feed()
+        cache.set(clave, feed, TTL_SEGUNDOS)
+    finally:
+        if calculando:
+            cache.delete(clave_calculo)
+    return feed
+
+
+def html_para_usuario(feed, usuario):
+    """HTML del feed con las insignias del usuario; una consulta como máximo"""
+    html = feed['html']
+    ids = feed['organizadores']
+    inscritos = set()
+    if usuario.is_authenticated and ids:
+        inscritos = set(ParticipantePartido.objects.filter(
+            id_usuario=usuario, id_partido_id__in=list(ids)
+        ).values_list('id_partido_id', flat=True))
+
+    for partido_id, organizador_id in ids.items():
+        insignia = ''
+        if usuario.is_authenticated and organizador_id == usuario.pk:
+            insignia = INSIGNIA_ORGANIZADOR
+        elif partido_id in inscritos:
+            insignia = INSIGNIA_INSCRITO
+        html = html.replace(MARCA_ESTADO.format(partido_id), insignia)
+    return html
@@ -0,0 +1,149 @@
+"""
+Búsqueda por cercanía sobre localidades y recintos geocodificados.
+
+Primero se acota con una caja de coordenadas (rango de latitud y de longitud)
+que resuelve el índice (latitud, longitud) de cada tabla; la distancia exacta
+(haversine) se calcula solo sobre esos candidatos y descarta las esquinas de
+la caja que quedan fuera del radio.
+
+Un partido se ubica en el recinto de su reserva si está geocodificado y, si
+no, en su localidad. Una cancha se ubica en su recinto o, si el recinto no
+tiene coordenadas, en la localidad del recinto.
+"""
+from datetime import timedelta
+from math import asin, cos, radians, sin, sqrt
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .disponibilidad import buscar_slots
+from .models import Cancha, Localidad, Partido, Recinto
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = 111.32
+MAX_RADIO_KM = 100
+# Ventana de fechas y tope de candidatos por consulta de partidos_cercanos
+DIAS_PARTIDOS = 30
+MAX_CANDIDATOS = 500
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distancia en kilómetros entre dos puntos sobre la esfera terrestre"""
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * asin(sqrt(a))
+
+
+def caja_coordenadas(lat, lng, radio_km):
+    """(lat_min, lat_max, lng_min, lng_max) de la caja que contiene el círculo"""
+    dlat = radio_km / KM_POR_GRADO
+    # Cerca de los polos un grado de longitud mide casi cero: se acota el ancho
+    dlng = min(radio_km / (KM_POR_GRADO * max(cos(radians(lat)), 0.01)), 180)
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _en_caja(modelo, caja):
+    """Claves de las filas del modelo dentro de la caja (consulta cubierta por el índice de coordenadas)"""
+    lat_min, lat_max, lng_min, lng_max = caja
+    return list(modelo.objects.filter(
+        latitud__range=(lat_min, lat_max), longitud__range=(lng_min, lng_max)
+    ).values_list('pk', flat=True))
+
+
+def _coordenadas(objeto):
+    if objeto is None or objeto.latitud is None:
+        return None
+    return float(objeto.latitud), float(objeto.longitud)
+
+
+def _ordenar_por_distancia(lat, lng, radio_km, objetos, ubicar):
+    """Anotar .distancia_km, descartar los que quedan fuera del radio y ordenar"""
+    cercanos = []
+    for objeto in objetos:
+        punto = ubicar(objeto)
+        if punto is None:
+            continue
+        objeto.distancia_km = haversine_km(lat, lng, *punto)
+        if objeto.distancia_km <= radio_km:
+            cercanos.append(objeto)
+    cercanos.sort(key=lambda objeto: objeto.distancia_km)
+    return cercanos
+
+
+def partidos_cercanos(lat, lng, radio_km, limite=50, dias=DIAS_PARTIDOS):
+    """
+    Próximos partidos vigentes a radio_km o menos del punto, del más cercano al más lejano.
+
+    Solo se consideran los de los próximos `dias` días y, de ellos, los
+    MAX_CANDIDATOS más pronto por cada vía de ubicación (localidad o recinto de
+    la reserva): el costo no crece con todo el calendario de la zona. Cada vía
+    es su propia consulta por índice en lugar de un OR con JOIN.
+    """
+    caja = caja_coordenadas(lat, lng, radio_km)
+    localidades = _en_caja(Localidad, caja)
+    recintos = _en_caja(Recinto, caja)
+    if not localidades and not recintos:
+        return []
+
+    ahora = timezone.now()
+    vigentes = Partido.objects.filter(
+        archivado=False, fecha_inicio__gte=ahora, fecha_inicio__lt=ahora + timedelta(days=dias)
+    ).select_related('id_organizador', 'id_localidad', 'id_reserva__id_recinto').order_by('fecha_inicio', 'id_partido')
+    candidatos = {}
+    if localidades:
+        for partido in vigentes.filter(id_localidad_id__in=localidades)[:MAX_CANDIDATOS]:
+            candidatos[partido.pk] = partido
+    if recintos:
+        for partido in vigentes.filter(id_reserva__id_recinto_id__in=recintos)[:MAX_CANDIDATOS]:
+            candidatos[partido.pk] = partido
+
+    def ubicar(partido):
+        recinto = partido.id_reserva.id_recinto if partido.id_reserva_id else None
+        return _coordenadas(recinto) or _coordenadas(partido.id_localidad)
+
+    # El orden es estable: a igual distancia (misma localidad) queda primero el más pronto
+    por_fecha = sorted(candidatos.values(), key=lambda partido: (partido.fecha_inicio, partido.pk))
+    return _ordenar_por_distancia(lat, lng, radio_km, por_fecha, ubicar)[:limite]
+
+
+def canchas_cercanas(lat, lng, radio_km, fecha_desde, fecha_hasta, duracion_minutos=90,
+                     franja=None, limite=20, slots_por_cancha=3):
+    """
+    Canchas con horarios libres a radio_km o menos del punto, de la más cercana a la más lejana.
+
+    Cada cancha trae .slots con sus primeros slots_por_cancha horarios libres
+    como tuplas (fecha, minutos_inicio, minutos_fin).
+    """
+    caja = caja_coordenadas(lat, lng, radio_km)
+    localidades = _en_caja(Localidad, caja)
+    recintos = _en_caja(Recinto, caja)
+    if not localidades and not recintos:
+        return []
+
+    candidatos = Cancha.objects.filter(
+        Q(id_recinto_id__in=recintos)
+        | Q(id_recinto__latitud__isnull=True, id_recinto__id_localidad_id__in=localidades)
+    ).select_related('id_recinto__id_localidad')
+
+    def ubicar(cancha):
+        return _coordenadas(cancha.id_recinto) or _coordenadas(cancha.id_recinto.id_localidad)
+
+    cercanas = _ordenar_por_distancia(lat, lng, radio_km, candidatos, ubicar)
+    if not cercanas:
+        return []
+
+    slots = {}
+    for fecha, inicio, fin, cancha in buscar_slots(cercanas, fecha_desde, fecha_hasta, duracion_minutos, franja):
+        libres = slots.setdefault(cancha.id_cancha, [])
+        if len(libres) < slots_por_cancha:
+            libres.append((fecha, inicio, fin))
+
+    resultado = []
+    for cancha in cercanas:
+        if cancha.id_cancha in slots:
+            cancha.slots = slots[cancha.id_cancha]
+            resultado.append(cancha)
+            if len(resultado) == limite:
+                break
+    return resultado
@@ -0,0 +1,226 @@
+"""
+Chat en tiempo real de los partidos.
+
+Enviar un mensaje es un INSERT y una publicación en el broker. Los clientes
+siguen el chat con Server-Sent Events (vista chat_partido_eventos, servida
+por el proceso ASGI "sse" del Procfile) y reciben solo los mensajes
+posteriores al último que tienen; al reconectar, EventSource envía
+Last-Event-ID y el flujo retoma desde ahí sin repetir ni perder mensajes.
+
+El broker se elige con settings.CHAT_BROKER:
+
+- BrokerCache (por defecto) publica en la caché el id del último mensaje de
+  cada partido. Un sondeo por proceso (eventos.sondeo) revisa cada
+  CHAT_INTERVALO segundos las claves de todos los chats con suscriptores, y
+  solo los suscriptores del chat que cambió leen de la base los mensajes
+  nuevos. Sirve con varios workers y procesos mientras compartan la caché.
+- BrokerMemoria entrega cada mensaje por colas asyncio del propio proceso, sin
+  espera ni consultas extra; sirve solo con un único worker.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from .avisos import avisar_chat, avisar_usuarios
+from .models import LecturaChat, MensajePartido, ParticipantePartido
+from .sondeo import SondeoCache
+
+# Mensajes que se muestran al abrir el partido y por cada página hacia atrás
+MENSAJES_PAGINA = 50
+# Mensajes entregados como máximo por lectura de la base
+LOTE_MENSAJES = 100
+TTL_ULTIMO = 24 * 60 * 60
+# Cada flujo SSE se cierra tras este tiempo y el navegador reconecta con Last-Event-ID
+DURACION_FLUJO_SEGUNDOS = 5 * 60
+LATIDO_SEGUNDOS = 15
+REINTENTO_MS = 3000
+
+
+def serializar_mensaje(mensaje):
+    usuario = mensaje.id_usuario
+    return {
+        'id_mensaje': mensaje.id_mensaje,
+        'usuario': {'id_usuario': usuario.id_usuario, 'nombre': usuario.nombre, 'apellido': usuario.apellido},
+        'mensaje': mensaje.mensaje,
+        'fecha_creacion': mensaje.fecha_creacion.isoformat(),
+    }
+
+
+def _mensajes_partido(partido_id):
+    return MensajePartido.objects.filter(id_partido_id=partido_id).select_related('id_usuario').only(
+        'id_mensaje', 'mensaje', 'fecha_creacion',
+        'id_usuario__id_usuario', 'id_usuario__nombre', 'id_usuario__apellido',
+    )
+
+
+def _desde_mensaje(mensajes, partido_id, id_mensaje, posteriores):
+    """Filtrar los mensajes anteriores o posteriores a id_mensaje en orden (fecha_creacion, id_mensaje)"""
+    fecha = MensajePartido.objects.filter(
+        id_partido_id=partido_id, pk=id_mensaje
+    ).values_list('fecha_creacion', flat=True).first()
+    if fecha is None:
+        # Mensaje borrado o de otro partido: basta el id, que crece junto con la fecha
+        return mensajes.filter(id_mensaje__gt=id_mensaje) if posteriores else mensajes.filter(id_mensaje__lt=id_mensaje)
+    if posteriores:
+        return mensajes.filter(Q(fecha_creacion__gt=fecha) | Q(fecha_creacion=fecha, id_mensaje__gt=id_mensaje))
+    return mensajes.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id_mensaje__lt=id_mensaje))
+
+
+def historial_mensajes(partido_id, antes_de=None, despues_de=None, limite=MENSAJES_PAGINA):
+    """
+    Una página del chat en orden cronológico y si quedan más mensajes en esa dirección.
+
+    Sin cursores devuelve los últimos `limite` mensajes; con antes_de, los
+    anteriores a ese mensaje (para ir hacia atrás) y con despues_de, los
+    posteriores (para consultar solo lo nuevo). Cada página es un rango del
+    índice (id_partido, fecha_creacion), sin importar cuántos mensajes tenga el partido.
+    """
+    mensajes = _mensajes_partido(partido_id)
+    if despues_de:
+        pagina = list(
+            _desde_mensaje(mensajes, partido_id, despues_de, posteriores=True)
+            .order_by('fecha_creacion', 'id_mensaje')[:limite + 1]
+        )
+        return pagina[:limite], len(pagina) > limite
+    if antes_de:
+        mensajes = _desde_mensaje(mensajes, partido_id, antes_de, posteriores=False)
+    pagina = list(mensajes.order_by('-fecha_creacion', '-id_mensaje')[:limite + 1])
+    return pagina[:limite][::-1], len(pagina) > limite
+
+
+def mensajes_desde(partido_id, ultimo_id, limite=LOTE_MENSAJES):
+    """Mensajes posteriores a ultimo_id ya serializados; con 0, los últimos del partido"""
+    mensajes, _ = historial_mensajes(partido_id, despues_de=ultimo_id, limite=limite)
+    return [serializar_mensaje(mensaje) for mensaje in mensajes]
+
+
+def puede_escribir(partido, usuario):
+    """Escriben el organizador y los inscritos"""
+    if not usuario.is_authenticated:
+        return False
+    return partido.id_organizador_id == usuario.pk or ParticipantePartido.objects.filter(
+        id_partido=partido, id_usuario=usuario
+    ).exists()
+
+
+def crear_mensaje(partido, usuario, texto):
+    """Guardar el mensaje y publicarlo a los suscriptores del partido al confirmar"""
+    with transaction.atomic():
+        mensaje = MensajePartido.objects.create(id_partido=partido, id_usuario=usuario, mensaje=texto)
+        # Lo propio se da por leído: así los no leídos se cuentan sin mirar el autor
+        marcar_leido(partido.pk, usuario.pk, mensaje.id_mensaje)
+        datos = serializar_mensaje(mensaje)
+        transaction.on_commit(lambda: broker.publicar(partido.pk, datos))
+        avisar_chat(partido.pk)
+    return mensaje
+
+
+def crear_lecturas(partido_id, usuario_ids):
+    """Cursores de lectura para quienes entran al chat, con los mensajes previos ya leídos"""
+    ultimo = MensajePartido.objects.filter(id_partido_id=partido_id).aggregate(ultimo=Max('id_mensaje'))['ultimo']
+    LecturaChat.objects.bulk_create([
+        LecturaChat(id_partido_id=partido_id, id_usuario_id=usuario_id, id_ultimo_leido=ultimo or 0)
+        for usuario_id in usuario_ids
+    ], ignore_conflicts=True)
+    # El flujo de avisos de cada uno debe empezar a seguir este chat
+    avisar_usuarios(usuario_ids)
+
+
+def marcar_leido(partido_id, usuario_id, hasta):
+    """Avanzar el cursor del usuario; nunca retrocede si llega una marca vieja"""
+    if LecturaChat.objects.filter(
+        id_partido_id=partido_id, id_usuario_id=usuario_id, id_ultimo_leido__lt=hasta
+    ).update(id_ultimo_leido=hasta, fecha_actualizacion=timezone.now()):
+        avisar_usuarios([usuario_id])
+
+
+class BrokerMemoria:
+    """Colas asyncio por partido dentro del proceso"""
+
+    def __init__(self):
+        self._suscriptores = defaultdict(set)
+        self._candado = threading.Lock()
+
+    def publicar(self, partido_id, mensaje):
+        with self._candado:
+            suscriptores = list(self._suscriptores.get(partido_id, ()))
+        # Las vistas síncronas corren en otro hilo: se entrega en el loop de cada suscriptor
+        for loop, cola in suscriptores:
+            loop.call_soon_threadsafe(cola.put_nowait, mensaje)
+
+    async def escuchar(self, partido_id, ultimo_id, espera):
+        """Mensajes posteriores a ultimo_id a medida que llegan; None tras cada espera sin novedades"""
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._candado:
+            self._suscriptores[partido_id].add(suscripcion)
+        try:
+            # Lo escrito antes de suscribirse se lee de la base una sola vez
+            for mensaje in await sync_to_async(mensajes_desde)(partido_id, ultimo_id):
+                ultimo_id = mensaje['id_mensaje']
+                yield mensaje
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(suscripcion[1].get(), espera)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if mensaje['id_mensaje'] > ultimo_id:
+                    ultimo_id = mensaje['id_mensaje']
+                    yield mensaje
+        finally:
+            with self._candado:
+                self._suscriptores[partido_id].discard(suscripcion)
+                if not self._suscriptores[partido_id]:
+                    del self._suscriptores[partido_id]
+
+
+class BrokerCache:
+    """Último id por partido en la caché compartida; los mensajes se leen de la base"""
+
+    def __init__(self):
+        self.sondeo = SondeoCache('CHAT_INTERVALO', 1.0)
+
+    def _clave(self, partido_id):
+        return f'chat:ultimo:{partido_id}'
+
+    def publicar(self, partido_id, mensaje):
+        cache.set(self._clave(partido_id), mensaje['id_mensaje'], TTL_ULTIMO)
+
+    async def escuchar(self, partido_id, ultimo_id, espera):
+        clave = self._clave(partido_id)
+        publicado = await self.sondeo.leer(clave)
+        # Sin clave (expiró o nadie escribió desde el reinicio) se revisa la base una vez
+        pendiente = publicado is None or publicado > ultimo_id
+        while True:
+            if pendiente:
+                mensajes = await sync_to_async(mensajes_desde)(partido_id, ultimo_id)
+                for mensaje in mensajes:
+                    ultimo_id = mensaje['id_mensaje']
+                    yield mensaje
+                # Un lote completo puede no ser todo: se vuelve a leer sin esperar
+                if len(mensajes) == LOTE_MENSAJES:
+                    continue
+            actual = await self.sondeo.esperar(clave, publicado, espera)
+            if actual == publicado:
+                yield None
+                pendiente = False
+                continue
+            publicado = actual
+            pendiente = publicado is not None and publicado > ultimo_id
+
+
+def _crear_broker():
+    return import_string(getattr(settings, 'CHAT_BROKER', 'eventos.chat.BrokerCache'))()
+
+
+# Un broker por proceso, creado al primer uso
+broker = SimpleLazyObject(_crear_broker)
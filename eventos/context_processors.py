@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def flujos(request):
+    """Origen de los flujos Server-Sent Events para las plantillas ('' si es el mismo sitio)"""
+    return {'FLUJOS_URL': getattr(settings, 'FLUJOS_URL', '')}
@@ -0,0 +1,347 @@
+"""
+Motor de disponibilidad de canchas basado en intervalos.
+
+Carga en una sola pasada los horarios de apertura (HorarioCancha) y las
+reservas confirmadas de un conjunto de canchas para un rango de fechas, y
+calcula los slots libres restando listas ordenadas de intervalos (barrido),
+en vez de comparar cada slot contra cada reserva.
+
+Para los próximos HORIZONTE_DIAS días el resultado se materializa en
+DisponibilidadCanchaDia (un mapa de bits de unidades de 30 minutos por cancha
+y día), de modo que la lectura habitual es un solo recorrido por índice. Los
+días sin fila materializada, o cuyos horarios no calzan con la grilla de 30
+minutos, se calculan con el barrido de intervalos.
+"""
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import HorarioCancha, Reserva, DisponibilidadCanchaDia
+
+# Los slots se ofrecen cada 30 minutos desde la apertura de cada horario
+PASO_MINUTOS = 30
+UNIDADES_DIA = 24 * 60 // PASO_MINUTOS
+# Días hacia adelante que se mantienen materializados
+HORIZONTE_DIAS = 60
+
+
+def a_minutos(hora):
+    """Convertir un time a minutos desde medianoche"""
+    return hora.hour * 60 + hora.minute
+
+
+def a_hora(minutos):
+    """Convertir minutos desde medianoche a time"""
+    return time(minutos // 60, minutos % 60)
+
+
+# Tabla de minutos -> 'HH:MM' para formatear miles de slots sin strftime
+_HORAS_TEXTO = ['%02d:%02d' % divmod(minutos, 60) for minutos in range(24 * 60 + 1)]
+
+
+def hora_texto(minutos):
+    """Formatear minutos desde medianoche como 'HH:MM'"""
+    return _HORAS_TEXTO[minutos]
+
+
+def fusionar_intervalos(intervalos):
+    """Ordenar y fusionar intervalos (inicio, fin) solapados o contiguos"""
+    fusionados = []
+    for inicio, fin in sorted(intervalos):
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1] = (fusionados[-1][0], fin)
+        else:
+            fusionados.append((inicio, fin))
+    return fusionados
+
+
+def restar_intervalos(ventanas, ocupados):
+    """
+    Restar los intervalos ocupados a las ventanas de apertura.
+
+    Ambas listas deben venir ordenadas y `ocupados` además fusionada.
+    Devuelve tuplas (inicio_ventana, inicio_libre, fin_libre); se conserva el
+    inicio de la ventana porque los slots se alinean a su grilla.
+    """
+    libres = []
+    j = 0
+    for v_inicio, v_fin in ventanas:
+        # Descartar reservas que terminan antes de esta ventana
+        while j < len(ocupados) and ocupados[j][1] <= v_inicio:
+            j += 1
+        cursor = v_inicio
+        k = j
+        while k < len(ocupados) and ocupados[k][0] < v_fin:
+            o_inicio, o_fin = ocupados[k]
+            if o_inicio > cursor:
+                libres.append((v_inicio, cursor, o_inicio))
+            cursor = max(cursor, o_fin)
+            k += 1
+        if cursor < v_fin:
+            libres.append((v_inicio, cursor, v_fin))
+    return libres
+
+
+def recortar_tramos(libres, desde, hasta):
+    """Limitar los tramos libres a una franja horaria (en minutos) conservando su grilla"""
+    recortados = []
+    for v_inicio, inicio, fin in libres:
+        inicio, fin = max(inicio, desde), min(fin, hasta)
+        if inicio < fin:
+            recortados.append((v_inicio, inicio, fin))
+    return recortados
+
+
+def generar_slots(libres, duracion_minutos, paso=PASO_MINUTOS):
+    """Generar los slots (inicio, fin) en minutos que caben en cada tramo libre"""
+    if duracion_minutos <= 0:
+        return []
+    slots = []
+    for v_inicio, inicio, fin in libres:
+        desfase = (inicio - v_inicio) % paso
+        actual = inicio if desfase == 0 else inicio + paso - desfase
+        while actual + duracion_minutos <= fin:
+            slots.append((actual, actual + duracion_minutos))
+            actual += paso
+    return slots
+
+
+def formatear_slots(slots):
+    """Convertir slots en minutos al formato de Cancha.get_horarios_disponibles"""
+    return [{
+        'hora_inicio': a_hora(inicio),
+        'hora_fin': a_hora(fin),
+        'disponible': True,
+    } for inicio, fin in slots]
+
+
+def cargar_ventanas(cancha_ids):
+    """Horarios activos agrupados por (cancha, día de la semana), ordenados"""
+    ventanas = defaultdict(list)
+    horarios = HorarioCancha.objects.filter(
+        id_cancha_id__in=cancha_ids,
+        activo=True
+    ).values_list('id_cancha_id', 'dia_semana', 'hora_inicio', 'hora_fin')
+    for cancha_id, dia_semana, hora_inicio, hora_fin in horarios:
+        ventanas[(cancha_id, dia_semana)].append((a_minutos(hora_inicio), a_minutos(hora_fin)))
+    for lista in ventanas.values():
+        lista.sort()
+    return ventanas
+
+
+def cargar_ocupados(cancha_ids, fecha_desde, fecha_hasta):
+    """Reservas confirmadas agrupadas por (cancha, fecha), ordenadas y fusionadas"""
+    ocupados = defaultdict(list)
+    reservas = Reserva.objects.filter(
+        id_cancha_id__in=cancha_ids,
+        fecha_reserva__range=(fecha_desde, fecha_hasta),
+        estado='confirmada'
+    ).values_list('id_cancha_id', 'fecha_reserva', 'hora_inicio', 'hora_fin')
+    for cancha_id, fecha, hora_inicio, hora_fin in reservas:
+        ocupados[(cancha_id, fecha)].append((a_minutos(hora_inicio), a_minutos(hora_fin)))
+    return {clave: fusionar_intervalos(lista) for clave, lista in ocupados.items()}
+
+
+def _mascara(desde_unidad, hasta_unidad):
+    """Bits de las unidades [desde_unidad, hasta_unidad)"""
+    if hasta_unidad <= desde_unidad:
+        return 0
+    return ((1 << (hasta_unidad - desde_unidad)) - 1) << desde_unidad
+
+
+def calcular_mapa_dia(ventanas_dia, ocupados_dia):
+    """
+    Construir los mapas de bits de un día a partir de sus intervalos en minutos.
+
+    Retorna (apertura, libres, cortes, alineado). Si algún extremo no cae en la
+    grilla de 30 minutos el mapa no es exacto y se marca alineado=False.
+    """
+    alineado = all(
+        inicio % PASO_MINUTOS == 0 and fin % PASO_MINUTOS == 0
+        for inicio, fin in list(ventanas_dia) + list(ocupados_dia)
+    )
+    apertura = cortes = ocupado = 0
+    for inicio, fin in ventanas_dia:
+        apertura |= _mascara(inicio // PASO_MINUTOS, fin // PASO_MINUTOS)
+        cortes |= 1 << (inicio // PASO_MINUTOS)
+    for inicio, fin in ocupados_dia:
+        ocupado |= _mascara(inicio // PASO_MINUTOS, -(-fin // PASO_MINUTOS))
+    return apertura, apertura & ~ocupado, cortes, alineado
+
+
+def slots_desde_mapa(libres, cortes, duracion_minutos, franja=None):
+    """Generar slots (inicio, fin) en minutos desde los mapas de bits de un día"""
+    # Sin duración positiva no hay slots (y el desplazamiento negativo fallaría)
+    if not libres or duracion_minutos <= 0:
+        return []
+    unidades = -(-duracion_minutos // PASO_MINUTOS)
+    bloque = (1 << unidades) - 1
+    # Un slot no puede cruzar el inicio de otro horario de apertura
+    interior = bloque & ~1
+    slots = []
+    for i in range(UNIDADES_DIA - unidades + 1):
+        if (libres >> i) & bloque == bloque and not (cortes >> i) & interior:
+            inicio = i * PASO_MINUTOS
+            fin = inicio + duracion_minutos
+            if franja and (inicio < franja[0] or fin > franja[1]):
+                continue
+            slots.append((inicio, fin))
+    return slots
+
+
+def cargar_materializados(cancha_ids, fecha_desde, fecha_hasta):
+    """Mapas precalculados y exactos por (cancha, fecha) en un solo recorrido por índice"""
+    filas = DisponibilidadCanchaDia.objects.filter(
+        id_cancha_id__in=cancha_ids,
+        fecha__range=(fecha_desde, fecha_hasta),
+        alineado=True
+    ).values_list('id_cancha_id', 'fecha', 'libres', 'cortes')
+    return {(cancha_id, fecha): (libres, cortes) for cancha_id, fecha, libres, cortes in filas}
+
+
+def disponibilidad_canchas(cancha_ids, fecha_desde, fecha_hasta, duracion_minutos=90, franja=None):
+    """
+    Calcular los slots libres de varias canchas entre dos fechas (inclusive).
+
+    Retorna {id_cancha: {fecha: [(inicio, fin), ...]}} con los slots en
+    minutos desde medianoche. Lee primero los días materializados y solo
+    calcula por intervalos los que falten, con a lo más tres consultas sin
+    importar cuántas canchas o días se pidan. `franja` opcional (desde, hasta)
+    en minutos restringe los slots a esa parte del día.
+    """
+    cancha_ids = list(cancha_ids)
+    dias = (fecha_hasta - fecha_desde).days + 1
+    fechas = [fecha_desde + timedelta(days=i) for i in range(dias)]
+
+    materializados = cargar_materializados(cancha_ids, fecha_desde, fecha_hasta)
+    pendientes = [
+        cancha_id for cancha_id in cancha_ids
+        if any((cancha_id, fecha) not in materializados for fecha in fechas)
+    ]
+    ventanas = cargar_ventanas(pendientes) if pendientes else {}
+    ocupados = cargar_ocupados(pendientes, fecha_desde, fecha_hasta) if pendientes else {}
+
+    resultado = {}
+    for cancha_id in cancha_ids:
+        por_fecha = {}
+        for fecha in fechas:
+            mapa = materializados.get((cancha_id, fecha))
+            if mapa:
+                por_fecha[fecha] = slots_desde_mapa(mapa[0], mapa[1], duracion_minutos, franja)
+                continue
+            ventanas_dia = ventanas.get((cancha_id, fecha.weekday()), [])
+            if ventanas_dia:
+                libres = restar_intervalos(ventanas_dia, ocupados.get((cancha_id, fecha), []))
+                if franja:
+                    libres = recortar_tramos(libres, *franja)
+                por_fecha[fecha] = generar_slots(libres, duracion_minutos)
+            else:
+                por_fecha[fecha] = []
+        resultado[cancha_id] = por_fecha
+    return resultado
+
+
+def materializar(cancha_ids, fecha_desde, fecha_hasta):
+    """Recalcular y guardar (upsert) las filas DisponibilidadCanchaDia de un rango"""
+    cancha_ids = list(cancha_ids)
+    if not cancha_ids or fecha_hasta < fecha_desde:
+        return 0
+    ventanas = cargar_ventanas(cancha_ids)
+    ocupados = cargar_ocupados(cancha_ids, fecha_desde, fecha_hasta)
+
+    filas = []
+    for cancha_id in cancha_ids:
+        fecha = fecha_desde
+        while fecha <= fecha_hasta:
+            apertura, libres, cortes, alineado = calcular_mapa_dia(
+                ventanas.get((cancha_id, fecha.weekday()), []),
+                ocupados.get((cancha_id, fecha), [])
+            )
+            filas.append(DisponibilidadCanchaDia(
+                id_cancha_id=cancha_id,
+                fecha=fecha,
+                apertura=apertura,
+                libres=libres,
+                cortes=cortes,
+                alineado=alineado,
+            ))
+            fecha += timedelta(days=1)
+
+    # MySQL resuelve el conflicto por cualquier clave única y no acepta unique_fields
+    unique_fields = None
+    if connection.features.supports_update_conflicts_with_target:
+        unique_fields = ['id_cancha', 'fecha']
+    DisponibilidadCanchaDia.objects.bulk_create(
+        filas,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=['apertura', 'libres', 'cortes', 'alineado', 'fecha_actualizacion'],
+    )
+    return len(filas)
+
+
+def rango_horizonte():
+    """Fechas (desde, hasta) que se mantienen materializadas"""
+    hoy = timezone.localdate()
+    return hoy, hoy + timedelta(days=HORIZONTE_DIAS - 1)
+
+
+def actualizar_materializado(cancha_id, fechas=None):
+    """
+    Recalcular la disponibilidad materializada de una cancha.
+
+    Con `fechas` solo se recalculan esas fechas (las que caigan en el
+    horizonte); sin ellas, todo el horizonte (cambios de HorarioCancha).
+    """
+    desde, hasta = rango_horizonte()
+    if fechas is None:
+        return materializar([cancha_id], desde, hasta)
+    fechas = [fecha for fecha in fechas if desde <= fecha <= hasta]
+    if not fechas:
+        return 0
+    # Un solo recálculo del rango cubierto: mismas consultas para una o muchas fechas
+    return materializar([cancha_id], min(fechas), max(fechas))
+
+
+def calendario_cancha(cancha, fecha_desde, dias=14, duracion_minutos=120):
+    """Calendario de disponibilidad de una cancha: lista de {'fecha', 'horarios'}"""
+    fecha_hasta = fecha_desde + timedelta(days=dias - 1)
+    por_fecha = disponibilidad_canchas([cancha.pk], fecha_desde, fecha_hasta, duracion_minutos)[cancha.pk]
+    return [{
+        'fecha': fecha,
+        'horarios': formatear_slots(slots),
+    } for fecha, slots in sorted(por_fecha.items())]
+
+
+def horarios_disponibles(cancha, fecha, duracion_minutos=90):
+    """Slots libres de una cancha para una fecha específica"""
+    slots = disponibilidad_canchas([cancha.pk], fecha, fecha, duracion_minutos)[cancha.pk][fecha]
+    return formatear_slots(slots)
+
+
+def buscar_slots(canchas, fecha_desde, fecha_hasta, duracion_minutos=90, franja=None):
+    """
+    Buscar slots libres en todas las canchas dadas, ordenados por fecha y hora.
+
+    `canchas` es un iterable de Cancha (idealmente con select_related('id_recinto')).
+    Retorna una lista de tuplas (fecha, inicio, fin, cancha) con inicio/fin en minutos.
+    """
+    canchas = {cancha.pk: cancha for cancha in canchas}
+    disponibilidad = disponibilidad_canchas(canchas.keys(), fecha_desde, fecha_hasta, duracion_minutos, franja)
+
+    # Agrupar por fecha y ordenar cada día sobre tuplas de enteros (más barato que comparar fechas)
+    por_fecha = defaultdict(list)
+    for cancha_id, slots_por_fecha in disponibilidad.items():
+        for fecha, slots in slots_por_fecha.items():
+            por_fecha[fecha].extend((inicio, fin, cancha_id) for inicio, fin in slots)
+
+    encontrados = []
+    for fecha in sorted(por_fecha):
+        slots = por_fecha[fecha]
+        slots.sort()
+        encontrados.extend((fecha, inicio, fin, canchas[cancha_id]) for inicio, fin, cancha_id in slots)
+    return encontrados
@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Usuario, MensajePartido, Partido, Localidad, Recinto, Cancha, Equipo, PartidoCompetitivo, InvitacionEquipo, MiembroEquipo, Reserva, HorarioCancha
+from .models import Usuario, MensajePartido, Partido, Localidad, Recinto, Cancha, Equipo, PartidoCompetitivo, InvitacionEquipo, MiembroEquipo, Reserva, HorarioCancha, SerieReserva
 
 
 class LoginForm(AuthenticationForm):
@@ -182,18 +182,34 @@ class PartidoForm(forms.ModelForm):
 class RecintoForm(forms.ModelForm):
     class Meta:
         model = Recinto
-        fields = ['nombre', 'direccion', 'id_localidad']
+        fields = ['nombre', 'direccion', 'id_localidad', 'latitud', 'longitud']
         widgets = {
             'nombre': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre del recinto'}),
             'direccion': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Dirección completa', 'rows': 3}),
             'id_localidad': forms.Select(attrs={'class': 'form-select'}),
+            'latitud': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Ej: -33.448900', 'step': '0.000001'}),
+            'longitud': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Ej: -70.669300', 'step': '0.000001'}),
         }
         labels = {
             'nombre': 'Nombre del Recinto',
             'direccion': 'Dirección',
-            'id_localidad': 'Localidad'
+            'id_localidad': 'Localidad',
+            'latitud': 'Latitud',
+            'longitud': 'Longitud',
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        latitud = cleaned_data.get('latitud')
+        longitud = cleaned_data.get('longitud')
+        if (latitud is None) != (longitud is None):
+            raise forms.ValidationError('Ingresa latitud y longitud juntas, o deja ambas vacías.')
+        if latitud is not None and not -90 <= latitud <= 90:
+            self.add_error('latitud', 'La latitud debe estar entre -90 y 90.')
+        if longitud is not None and not -180 <= longitud <= 180:
+            self.add_error('longitud', 'La longitud debe estar entre -180 y 180.')
+        return cleaned_data
+
 class CanchaForm(forms.ModelForm):
     class Meta:
         model = Cancha
@@ -307,6 +323,29 @@ class ReservaForm(forms.ModelForm):
                 dt = datetime.fromisoformat(fecha_str)
                 self.fields['fecha_reserva'].initial = dt.date()
 
+class SerieReservaForm(forms.ModelForm):
+    class Meta:
+        model = SerieReserva
+        fields = ['id_cancha', 'dia_semana', 'hora_inicio', 'hora_fin', 'fecha_inicio', 'fecha_fin', 'notas']
+        widgets = {
+            'id_cancha': forms.Select(attrs={'class': 'form-select'}),
+            'dia_semana': forms.Select(attrs={'class': 'form-select'}),
+            'hora_inicio': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time', 'step': '1800'}),
+            'hora_fin': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time', 'step': '1800'}),
+            'fecha_inicio': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'fecha_fin': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'notas': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Observaciones (opcional)'}),
+        }
+        labels = {
+            'id_cancha': 'Cancha',
+            'dia_semana': 'Día de la Semana',
+            'hora_inicio': 'Hora de Inicio',
+            'hora_fin': 'Hora de Fin',
+            'fecha_inicio': 'Desde',
+            'fecha_fin': 'Hasta',
+            'notas': 'Notas'
+        }
+
 class HorarioCanchaForm(forms.ModelForm):
     class Meta:
         model = HorarioCancha
@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from eventos.models import Reserva, Partido, InvitacionEquipo
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica las transiciones de ciclo de vida: reservas pasadas a completada, '
+        'invitaciones vencidas a expirada y partidos jugados a archivado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Ancho del rango de claves primarias actualizado por UPDATE')
+        parser.add_argument('--max-filas-por-segundo', type=float, default=0,
+                            help='Límite de filas actualizadas por segundo (0 = sin límite)')
+        parser.add_argument('--dias-invitacion', type=int, default=14,
+                            help='Días tras los que una invitación pendiente expira')
+        parser.add_argument('--horas-partido', type=int, default=6,
+                            help='Horas tras el inicio de un partido para archivarlo')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Repetir el barrido indefinidamente')
+        parser.add_argument('--intervalo', type=int, default=300,
+                            help='Segundos entre barridos en modo continuo')
+
+    def handle(self, *args, **options):
+        self.lote = options['lote']
+        self.max_filas = options['max_filas_por_segundo']
+
+        try:
+            while True:
+                self._barrido(options)
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            # El avance queda guardado: el siguiente arranque continúa donde quedó
+            self.stdout.write(self.style.WARNING('Barrido interrumpido'))
+
+    def _barrido(self, options):
+        ahora = timezone.now()
+        self._barrer(
+            'reservas',
+            Reserva.objects.filter(estado='confirmada', fecha_reserva__lt=timezone.localdate()),
+            estado='completada',
+        )
+        self._barrer(
+            'invitaciones',
+            InvitacionEquipo.objects.filter(
+                estado='pendiente',
+                fecha_invitacion__lt=ahora - timedelta(days=options['dias_invitacion']),
+            ),
+            estado='expirada',
+        )
+        self._barrer(
+            'partidos',
+            Partido.objects.filter(
+                archivado=False,
+                fecha_inicio__lt=ahora - timedelta(hours=options['horas_partido']),
+            ),
+            # El UPDATE no pasa por auto_now: la exportación incremental filtra por esta fecha
+            archivado=True, fecha_actualizacion=ahora,
+        )
+
+    def _barrer(self, nombre, pendientes, **cambios):
+        """
+        Actualizar las filas pendientes en UPDATEs acotados por rangos de clave primaria.
+
+        Cada UPDATE se confirma por separado y solo bloquea su rango. El filtro se
+        repite en cada UPDATE, así que repetir un rango no tiene efecto. El último
+        rango completado queda en la caché para retomar tras un corte.
+        """
+        clave = f'barrer_ciclo_vida:{nombre}'
+        limites = pendientes.aggregate(desde=Min('pk'), hasta=Max('pk'))
+        if limites['desde'] is None:
+            cache.delete(clave)
+            self.stdout.write(f'{nombre}: sin filas pendientes')
+            return 0
+
+        inicio = max(limites['desde'], cache.get(clave) or 0)
+        total = 0
+        lotes = 0
+        comienzo = time.monotonic()
+        for desde in range(inicio, limites['hasta'] + 1, self.lote):
+            hasta = desde + self.lote
+            total += pendientes.filter(pk__gte=desde, pk__lt=hasta).update(**cambios)
+            lotes += 1
+            cache.set(clave, hasta, None)
+            if self.max_filas:
+                # Dormir lo necesario para no superar el ritmo pedido
+                espera = total / self.max_filas - (time.monotonic() - comienzo)
+                if espera > 0:
+                    time.sleep(espera)
+        cache.delete(clave)
+
+        segundos = time.monotonic() - comienzo
+        ritmo = total / segundos if segundos else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{nombre}: {total} filas en {lotes} lotes, {segundos:.1f}s ({ritmo:.0f} filas/s)'
+        ))
+        return total
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from datetime import timedelta
+from eventos.models import Cancha
+from eventos.ocupacion import consolidar
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Consolida la ocupación diaria por hora de las canchas (pensado para correr cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=2,
+                            help='Días hacia atrás a consolidar, terminando ayer (por defecto 2; usar 365 para un año)')
+        parser.add_argument('--hoy', action='store_true',
+                            help='Incluir también el día de hoy')
+        parser.add_argument('--cancha', type=int, action='append', dest='canchas',
+                            help='Consolidar solo esta cancha (se puede repetir)')
+        parser.add_argument('--lote', type=int, default=50,
+                            help='Canchas procesadas por transacción')
+
+    def handle(self, *args, **options):
+        hasta = timezone.localdate()
+        if not options['hoy']:
+            hasta -= timedelta(days=1)
+        desde = hasta - timedelta(days=options['dias'] - 1)
+
+        cancha_ids = Cancha.objects.order_by('id_cancha').values_list('id_cancha', flat=True)
+        if options['canchas']:
+            cancha_ids = cancha_ids.filter(id_cancha__in=options['canchas'])
+        cancha_ids = list(cancha_ids)
+
+        total = 0
+        lote = options['lote']
+        for i in range(0, len(cancha_ids), lote):
+            total += consolidar(cancha_ids[i:i + lote], desde, hasta)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ocupación consolidada: {len(cancha_ids)} canchas, {total} filas ({desde} a {hasta})'
+        ))
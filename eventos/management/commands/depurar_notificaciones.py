@@ -0,0 +1,52 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eventos.models import Notificacion
+from eventos.notificaciones import depurar_leidas, limite_retencion
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes las notificaciones leídas más antiguas que NOTIFICACIONES_RETENCION_DIAS '
+        '(o --dias); con --archivar las copia antes a notificaciones_archivo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Antigüedad mínima en días (por defecto NOTIFICACIONES_RETENCION_DIAS)')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Notificaciones borradas por transacción')
+        parser.add_argument('--pausa', type=float, default=0.1,
+                            help='Segundos entre lotes, para no acaparar la base')
+        parser.add_argument('--archivar', action='store_true',
+                            help='Copiar a notificaciones_archivo antes de borrar')
+        parser.add_argument('--solo-revisar', action='store_true',
+                            help='Informar cuántas se borrarían sin borrarlas')
+
+    def handle(self, *args, **options):
+        if options['dias'] is None:
+            limite = limite_retencion()
+        else:
+            limite = timezone.now() - timedelta(days=options['dias'])
+
+        if options['solo_revisar']:
+            total = Notificacion.objects.filter(leida=True, fecha_creacion__lt=limite).count()
+            self.stdout.write(f'Notificaciones leídas anteriores a {limite:%Y-%m-%d}: {total}')
+            return
+
+        comienzo = time.monotonic()
+        total = 0
+        try:
+            while borradas := depurar_leidas(limite, options['lote'], archivando=options['archivar']):
+                total += borradas
+                time.sleep(options['pausa'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Depuración interrumpida'))
+
+        accion = 'archivadas' if options['archivar'] else 'borradas'
+        self.stdout.write(self.style.SUCCESS(
+            f'Notificaciones {accion}: {total} (anteriores a {limite:%Y-%m-%d}) en {time.monotonic() - comienzo:.1f}s'
+        ))
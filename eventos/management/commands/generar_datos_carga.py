@@ -0,0 +1,254 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from eventos.models import (
+    Cancha, Equipo, HorarioCancha, LecturaChat, Localidad, MensajePartido, MiembroEquipo, Notificacion, Partido,
+    ParticipantePartido, PartidoCompetitivo, Recinto, Reserva, Usuario,
+)
+
+# Horario de las canchas generadas y duración de cada reserva
+HORA_APERTURA = 9
+HORA_CIERRE = 22
+# Los mensajes de chat ya no generan notificaciones: se cuentan con LecturaChat
+TIPOS_NOTIFICACION = [tipo for tipo, _ in Notificacion.TIPOS_NOTIFICACION if tipo != 'nuevo_mensaje']
+# Parte final de los mensajes generados que queda sin leer en los cursores
+FRACCION_NO_LEIDA = 0.1
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos deterministas con bulk_create para medir las vistas '
+        '(ej. a escala: --usuarios 100000 --partidos 500000 --participantes 2000000 '
+        '--reservas 1000000 --notificaciones 1000000). Solo para bases de prueba.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=1000)
+        parser.add_argument('--partidos', type=int, default=5000)
+        parser.add_argument('--participantes', type=int, default=20000,
+                            help='Inscripciones aproximadas en total (limitadas por el cupo de cada partido)')
+        parser.add_argument('--reservas', type=int, default=10000)
+        parser.add_argument('--notificaciones', type=int, default=10000)
+        parser.add_argument('--mensajes', type=int, default=10000)
+        parser.add_argument('--equipos', type=int, default=100)
+        parser.add_argument('--partidos-competitivos', type=int, default=1000)
+        parser.add_argument('--localidades', type=int, default=50)
+        parser.add_argument('--recintos', type=int, default=200)
+        parser.add_argument('--canchas-por-recinto', type=int, default=3)
+        parser.add_argument('--dias-pasados', type=int, default=180,
+                            help='Los partidos y reservas se reparten entre este pasado y --dias-futuros')
+        parser.add_argument('--dias-futuros', type=int, default=60)
+        parser.add_argument('--semilla', type=int, default=1,
+                            help='Misma semilla y misma fecha, mismos datos')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT')
+        parser.add_argument('--forzar', action='store_true', help='Permitir correr con DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forzar']:
+            raise CommandError('Con DEBUG=False se requiere --forzar: este comando llena la base con datos falsos')
+
+        self.rng = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.prefijo = f'carga{options["semilla"]}'
+        if Usuario.objects.filter(email__startswith=f'{self.prefijo}-').exists():
+            raise CommandError(f'Ya hay datos de la semilla {options["semilla"]}; usa otra --semilla')
+
+        self.hoy = timezone.localdate()
+        self.desde = self.hoy - timedelta(days=options['dias_pasados'])
+        self.dias = options['dias_pasados'] + options['dias_futuros']
+        comienzo = time.monotonic()
+
+        usuarios = self._usuarios(options['usuarios'])
+        localidades = self._crear(Localidad, [
+            Localidad(nombre=f'Localidad {n}', latitud=-33.45 + self.rng.uniform(-1, 1), longitud=-70.66 + self.rng.uniform(-1, 1))
+            for n in range(options['localidades'])
+        ])
+        canchas = self._canchas(localidades, options['recintos'], options['canchas_por_recinto'])
+        partidos = self._partidos(usuarios, localidades, options['partidos'], options['participantes'])
+        self._reservas(usuarios, canchas, options['reservas'])
+        self._mensajes_y_notificaciones(usuarios, partidos, options['mensajes'], options['notificaciones'])
+        self._competitiva(usuarios, localidades, options['equipos'], options['partidos_competitivos'])
+
+        # bulk_create no emite señales: reconstruir los datos derivados
+        call_command('materializar_disponibilidad', stdout=self.stdout)
+        # El mapa de ocupación mira 8 semanas por defecto
+        call_command('consolidar_ocupacion', dias=min(options['dias_pasados'], 56), stdout=self.stdout)
+        call_command('reconciliar_notificaciones', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Datos de carga generados en {time.monotonic() - comienzo:.0f}s '
+            f'(usuarios {self.prefijo}-N@nf1.test, contraseña "carga")'
+        ))
+
+    def _crear(self, modelo, objetos):
+        """bulk_create por lotes; devuelve las claves nuevas (MySQL no las asigna a los objetos)"""
+        ultimo = modelo.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        with transaction.atomic():
+            modelo.objects.bulk_create(objetos, batch_size=self.lote)
+        claves = list(modelo.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(f'{modelo._meta.verbose_name_plural}: {len(claves)}')
+        return claves
+
+    def _fecha_hora(self):
+        return timezone.make_aware(datetime.combine(
+            self.desde + timedelta(days=self.rng.randrange(self.dias)),
+            datetime.min.time().replace(hour=self.rng.randrange(HORA_APERTURA, HORA_CIERRE)),
+        ))
+
+    def _usuarios(self, cantidad):
+        # Un solo hash para todos: calcularlo por usuario tomaría horas
+        clave = make_password('carga')
+        return self._crear(Usuario, [
+            Usuario(
+                nombre=f'Nombre{n}', apellido=f'Apellido{n % 997}', email=f'{self.prefijo}-{n}@nf1.test',
+                password=clave, puntos_friendly=int(self.rng.paretovariate(1.5) * 10),
+                # El primero es staff: medir_vistas entra con él para recorrer también las vistas de gestión
+                is_admin=n == 0,
+            )
+            for n in range(cantidad)
+        ])
+
+    def _canchas(self, localidades, recintos, por_recinto):
+        recintos = self._crear(Recinto, [
+            Recinto(nombre=f'Recinto {n}', direccion=f'Calle {n} #{self.rng.randint(1, 9999)}',
+                    id_localidad_id=self.rng.choice(localidades))
+            for n in range(recintos)
+        ])
+        recinto_de = {}
+        objetos = []
+        for recinto in recintos:
+            for n in range(por_recinto):
+                objetos.append(Cancha(nombre=f'Cancha {n + 1}', id_recinto_id=recinto, tipo='Pasto sintético'))
+        canchas = self._crear(Cancha, objetos)
+        for cancha, objeto in zip(canchas, objetos):
+            recinto_de[cancha] = objeto.id_recinto_id
+        self._crear(HorarioCancha, [
+            HorarioCancha(id_cancha_id=cancha, dia_semana=dia,
+                          hora_inicio=f'{HORA_APERTURA:02d}:00', hora_fin=f'{HORA_CIERRE:02d}:00')
+            for cancha in canchas for dia in range(7)
+        ])
+        return recinto_de
+
+    def _partidos(self, usuarios, localidades, cantidad, participantes):
+        promedio = participantes / cantidad if cantidad else 0
+        limite_archivo = timezone.now() - timedelta(hours=6)
+        partidos = []
+        inscritos = 0
+        # Por tandas: así los inscritos de cada tanda se arman con sus claves ya conocidas
+        for inicio in range(0, cantidad, self.lote):
+            tanda = []
+            for _ in range(min(self.lote, cantidad - inicio)):
+                fecha = self._fecha_hora()
+                maximo = self.rng.choice((10, 12, 14, 22))
+                tanda.append(Partido(
+                    lugar=f'Cancha {self.rng.randint(1, 500)}',
+                    descripcion=self.rng.choice(('Partido amistoso', 'Futbolito nocturno', 'Pichanga', None)),
+                    fecha_inicio=fecha, max_jugadores=maximo, archivado=fecha < limite_archivo,
+                    num_participantes=min(maximo, len(usuarios), int(self.rng.uniform(0, 2 * promedio) + 0.5)),
+                    id_organizador_id=self.rng.choice(usuarios), id_localidad_id=self.rng.choice(localidades),
+                ))
+            claves = self._crear(Partido, tanda)
+            objetos = []
+            for clave, partido in zip(claves, tanda):
+                jugadores = self.rng.sample(usuarios, partido.num_participantes)
+                # El organizador queda inscrito, como al crear el partido desde la web
+                if jugadores and partido.id_organizador_id not in jugadores:
+                    jugadores[0] = partido.id_organizador_id
+                objetos.extend(ParticipantePartido(id_partido_id=clave, id_usuario_id=u) for u in jugadores)
+            lecturas = [LecturaChat(id_partido_id=p.id_partido_id, id_usuario_id=p.id_usuario_id) for p in objetos]
+            lecturas.extend(
+                LecturaChat(id_partido_id=clave, id_usuario_id=partido.id_organizador_id)
+                for clave, partido in zip(claves, tanda) if not partido.num_participantes
+            )
+            with transaction.atomic():
+                ParticipantePartido.objects.bulk_create(objetos, batch_size=self.lote)
+                LecturaChat.objects.bulk_create(lecturas, batch_size=self.lote)
+            inscritos += len(objetos)
+            partidos.extend(claves)
+        self.stdout.write(f'Inscripciones: {inscritos}')
+        return partidos
+
+    def _reservas(self, usuarios, recinto_de, cantidad):
+        canchas = list(recinto_de)
+        horas = HORA_CIERRE - HORA_APERTURA
+        # Cada índice es un (cancha, día, hora) distinto: no hay reservas solapadas
+        espacios = len(canchas) * self.dias * horas
+        cantidad = min(cantidad, espacios)
+        objetos = []
+        for indice in self.rng.sample(range(espacios), cantidad):
+            cancha, resto = divmod(indice, self.dias * horas)
+            dia, hora = divmod(resto, horas)
+            fecha = self.desde + timedelta(days=dia)
+            estado = 'cancelada' if self.rng.random() < 0.1 else ('completada' if fecha < self.hoy else 'confirmada')
+            objetos.append(Reserva(
+                id_cancha_id=canchas[cancha], id_recinto_id=recinto_de[canchas[cancha]],
+                id_usuario_id=self.rng.choice(usuarios), fecha_reserva=fecha,
+                hora_inicio=f'{HORA_APERTURA + hora:02d}:00', hora_fin=f'{HORA_APERTURA + hora + 1:02d}:00',
+                estado=estado,
+            ))
+            if len(objetos) == self.lote:
+                Reserva.objects.bulk_create(objetos)
+                objetos = []
+        Reserva.objects.bulk_create(objetos)
+        self.stdout.write(f'Reservas: {cantidad}')
+
+    def _mensajes_y_notificaciones(self, usuarios, partidos, mensajes, notificaciones):
+        if not partidos:
+            return
+        for inicio in range(0, mensajes, self.lote):
+            MensajePartido.objects.bulk_create([
+                MensajePartido(id_partido_id=self.rng.choice(partidos), id_usuario_id=self.rng.choice(usuarios),
+                               mensaje=f'Mensaje de prueba {inicio + n}')
+                for n in range(min(self.lote, mensajes - inicio))
+            ])
+        self.stdout.write(f'Mensajes: {mensajes}')
+        leido = MensajePartido.objects.order_by('-pk').values_list('pk', flat=True)[int(mensajes * FRACCION_NO_LEIDA):][:1]
+        LecturaChat.objects.update(id_ultimo_leido=leido[0] if leido else 0)
+        for inicio in range(0, notificaciones, self.lote):
+            Notificacion.objects.bulk_create([
+                Notificacion(
+                    id_usuario_id=self.rng.choice(usuarios), id_partido_id=self.rng.choice(partidos),
+                    tipo=self.rng.choice(TIPOS_NOTIFICACION), mensaje='Notificación de prueba',
+                    leida=self.rng.random() < 0.7, id_usuario_relacionado_id=self.rng.choice(usuarios),
+                )
+                for _ in range(min(self.lote, notificaciones - inicio))
+            ])
+        self.stdout.write(f'Notificaciones: {notificaciones}')
+
+    def _competitiva(self, usuarios, localidades, equipos, partidos):
+        if equipos < 2:
+            return
+        anfitriones = self.rng.sample(usuarios, min(equipos, len(usuarios)))
+        claves = self._crear(Equipo, [
+            Equipo(nombre=f'Equipo {n}', id_anfitrion_id=anfitrion) for n, anfitrion in enumerate(anfitriones)
+        ])
+        miembros = []
+        for equipo, anfitrion in zip(claves, anfitriones):
+            otros = set(self.rng.sample(usuarios, min(10, len(usuarios)))) - {anfitrion}
+            miembros.append(MiembroEquipo(id_equipo_id=equipo, id_usuario_id=anfitrion, rol='anfitrion'))
+            miembros.extend(MiembroEquipo(id_equipo_id=equipo, id_usuario_id=u) for u in otros)
+        self._crear(MiembroEquipo, miembros)
+
+        ahora = timezone.now()
+        objetos = []
+        for n in range(partidos):
+            local, visitante = self.rng.sample(range(len(claves)), 2)
+            fecha = self._fecha_hora()
+            jugado = fecha < ahora
+            objetos.append(PartidoCompetitivo(
+                nombre=f'Fecha {n}', id_equipo_local_id=claves[local], id_equipo_visitante_id=claves[visitante],
+                id_localidad_id=self.rng.choice(localidades), lugar=f'Cancha {self.rng.randint(1, 500)}',
+                fecha_hora=fecha, estado='finalizado' if jugado else 'programado',
+                goles_local=self.rng.randint(0, 5) if jugado else 0,
+                goles_visitante=self.rng.randint(0, 5) if jugado else 0,
+                id_creador_id=anfitriones[local],
+            ))
+        self._crear(PartidoCompetitivo, objetos)
@@ -0,0 +1,96 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from eventos.models import Localidad, Recinto
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa latitud y longitud de localidades y recintos desde un CSV local con columnas '
+        'tipo,id,nombre,latitud,longitud (tipo = localidad o recinto; se busca por id o, si falta, por nombre)'
+    )
+
+    MODELOS = {'localidad': Localidad, 'recinto': Recinto}
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV')
+        parser.add_argument('--solo-revisar', action='store_true',
+                            help='Validar el archivo sin guardar cambios')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                filas = list(csv.DictReader(archivo))
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        faltantes = {'tipo', 'latitud', 'longitud'} - set(filas[0] if filas else ())
+        if faltantes:
+            raise CommandError(f'Faltan columnas en el CSV: {", ".join(sorted(faltantes))}')
+
+        # Un solo SELECT por tipo para resolver ids y nombres
+        por_id = {}
+        por_nombre = {}
+        for tipo, modelo in self.MODELOS.items():
+            objetos = list(modelo.objects.all())
+            por_id[tipo] = {str(objeto.pk): objeto for objeto in objetos}
+            por_nombre[tipo] = {}
+            for objeto in objetos:
+                por_nombre[tipo].setdefault(objeto.nombre.strip().lower(), []).append(objeto)
+
+        cambios = {tipo: {} for tipo in self.MODELOS}
+        errores = 0
+        for numero, fila in enumerate(filas, start=2):
+            tipo = (fila.get('tipo') or '').strip().lower()
+            if tipo not in self.MODELOS:
+                self.stderr.write(f'Línea {numero}: tipo "{fila.get("tipo")}" no válido')
+                errores += 1
+                continue
+
+            try:
+                latitud = Decimal(fila['latitud'].strip()).quantize(Decimal('0.000001'))
+                longitud = Decimal(fila['longitud'].strip()).quantize(Decimal('0.000001'))
+            except (InvalidOperation, AttributeError):
+                self.stderr.write(f'Línea {numero}: coordenadas no numéricas')
+                errores += 1
+                continue
+            if not (-90 <= latitud <= 90 and -180 <= longitud <= 180):
+                self.stderr.write(f'Línea {numero}: coordenadas fuera de rango')
+                errores += 1
+                continue
+
+            identificador = (fila.get('id') or '').strip()
+            nombre = (fila.get('nombre') or '').strip().lower()
+            if identificador:
+                candidatos = [por_id[tipo][identificador]] if identificador in por_id[tipo] else []
+            else:
+                candidatos = por_nombre[tipo].get(nombre, [])
+            if len(candidatos) != 1:
+                motivo = 'no encontrado' if not candidatos else 'nombre ambiguo, usa la columna id'
+                self.stderr.write(f'Línea {numero}: {tipo} "{identificador or fila.get("nombre")}" {motivo}')
+                errores += 1
+                continue
+
+            objeto = candidatos[0]
+            objeto.latitud = latitud
+            objeto.longitud = longitud
+            cambios[tipo][objeto.pk] = objeto
+
+        if options['solo_revisar']:
+            self.stdout.write(
+                f'Revisión: {len(cambios["localidad"])} localidades y {len(cambios["recinto"])} recintos válidos, '
+                f'{errores} líneas con errores'
+            )
+            return
+
+        with transaction.atomic():
+            for tipo, modelo in self.MODELOS.items():
+                modelo.objects.bulk_update(cambios[tipo].values(), ['latitud', 'longitud'], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Coordenadas importadas: {len(cambios["localidad"])} localidades, {len(cambios["recinto"])} recintos '
+            f'({errores} líneas con errores)'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from datetime import timedelta
+from eventos.disponibilidad import HORIZONTE_DIAS, materializar
+from eventos.models import Cancha, DisponibilidadCanchaDia
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la disponibilidad materializada de las canchas para los próximos días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=HORIZONTE_DIAS,
+                            help=f'Días hacia adelante a materializar (por defecto {HORIZONTE_DIAS})')
+        parser.add_argument('--cancha', type=int, action='append', dest='canchas',
+                            help='Reconstruir solo esta cancha (se puede repetir)')
+        parser.add_argument('--lote', type=int, default=100,
+                            help='Canchas procesadas por transacción')
+
+    def handle(self, *args, **options):
+        desde = timezone.localdate()
+        hasta = desde + timedelta(days=options['dias'] - 1)
+
+        cancha_ids = Cancha.objects.order_by('id_cancha').values_list('id_cancha', flat=True)
+        if options['canchas']:
+            cancha_ids = cancha_ids.filter(id_cancha__in=options['canchas'])
+        cancha_ids = list(cancha_ids)
+
+        # Los días pasados ya no se consultan
+        borradas, _ = DisponibilidadCanchaDia.objects.filter(fecha__lt=desde).delete()
+        if borradas:
+            self.stdout.write(f'Filas de días pasados eliminadas: {borradas}')
+
+        total = 0
+        lote = options['lote']
+        for i in range(0, len(cancha_ids), lote):
+            with transaction.atomic():
+                total += materializar(cancha_ids[i:i + lote], desde, hasta)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Disponibilidad materializada: {len(cancha_ids)} canchas, {total} días ({desde} a {hasta})'
+        ))
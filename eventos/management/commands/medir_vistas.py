@@ -0,0 +1,214 @@
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from eventos import urls
+from eventos.middleware import RegistroConsultas
+from eventos.models import (
+    Cancha, Equipo, InvitacionEquipo, Notificacion, Partido, PartidoCompetitivo, Reserva, SerieReserva, Usuario,
+)
+
+# Rutas que no se miden: logout cierra la sesión del cliente y los flujos
+# Server-Sent Events quedan abiertos minutos a propósito
+RUTAS_EXCLUIDAS = {'logout', 'chat_partido_eventos', 'avisos_eventos'}
+PERCENTILES = (50, 95, 99)
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal entre las muestras ordenadas"""
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia (p50/p95/p99) y las consultas de cada vista de eventos/urls.py con el '
+        'cliente de pruebas sobre la base actual, idealmente llenada con generar_datos_carga. '
+        'Con --comparar BASE NUEVO marca las regresiones entre dos mediciones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', default='medicion_vistas.json', help='Archivo JSON de resultados')
+        parser.add_argument('--iteraciones', type=int, default=20)
+        parser.add_argument('--calentamiento', type=int, default=2,
+                            help='Solicitudes previas por vista que no se miden')
+        parser.add_argument('--ruta', action='append', dest='rutas',
+                            help='Medir solo esta ruta por nombre (se puede repetir)')
+        parser.add_argument('--usuario', help='Email del usuario con el que se navega (por defecto el primer staff)')
+        parser.add_argument('--sin-cache', action='store_true',
+                            help='Vaciar la caché antes de cada solicitud para medir siempre el caso frío')
+        parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NUEVO'),
+                            help='Comparar dos archivos de resultados en vez de medir')
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help='Aumento relativo de p95 aceptado al comparar (0.2 = 20%%)')
+        parser.add_argument('--minimo-ms', type=float, default=2.0,
+                            help='Aumentos de p95 menores a esto no cuentan como regresión')
+
+    def handle(self, *args, **options):
+        if options['comparar']:
+            return self._comparar(*options['comparar'], options['tolerancia'], options['minimo_ms'])
+
+        usuario = self._usuario(options['usuario'])
+        self.objetos = self._objetos(usuario)
+        # Una vista que falla se registra con su estado 500 en vez de cortar la medición
+        client = Client(raise_request_exception=False)
+        client.force_login(usuario)
+
+        resultados = {}
+        # El cliente de pruebas usa el host "testserver". ConsultasMiddleware se quita:
+        # la medición ya cuenta las consultas y sus avisos de N+1 ensuciarían los tiempos
+        middleware = [m for m in settings.MIDDLEWARE if m != 'eventos.middleware.ConsultasMiddleware']
+        with override_settings(ALLOWED_HOSTS=['testserver'], MIDDLEWARE=middleware):
+            for patron in urls.urlpatterns:
+                if patron.name in RUTAS_EXCLUIDAS or (options['rutas'] and patron.name not in options['rutas']):
+                    continue
+                argumentos = self._argumentos(patron)
+                if argumentos is None:
+                    self.stdout.write(self.style.WARNING(f'{patron.name}: sin datos para sus parámetros, se omite'))
+                    continue
+                url = reverse(patron.name, kwargs=argumentos)
+                resultados[patron.name] = self._medir(client, url, self._parametros(patron.name), options)
+                r = resultados[patron.name]
+                self.stdout.write(
+                    f'{patron.name:45} {r["estado"]}  p50 {r["p50_ms"]:8.1f}  p95 {r["p95_ms"]:8.1f}  '
+                    f'p99 {r["p99_ms"]:8.1f} ms  {r["consultas"]:4} consultas'
+                )
+
+        Path(options['salida']).write_text(json.dumps({
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'iteraciones': options['iteraciones'],
+            'sin_cache': options['sin_cache'],
+            'usuario': usuario.email,
+            'filas': {
+                'usuarios': Usuario.objects.count(),
+                'partidos': Partido.objects.count(),
+                'reservas': Reserva.objects.count(),
+                'notificaciones': Notificacion.objects.count(),
+            },
+            'vistas': resultados,
+        }, indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}'))
+
+    def _usuario(self, email):
+        usuarios = Usuario.objects.order_by('pk')
+        usuario = usuarios.filter(email=email).first() if email else usuarios.filter(is_admin=True).first()
+        if usuario is None:
+            raise CommandError('No hay usuario para navegar: usa --usuario o genera datos con generar_datos_carga')
+        return usuario
+
+    def _objetos(self, usuario):
+        """Un objeto representativo por parámetro de URL: el más cargado cuando importa"""
+        partido = Partido.objects.filter(archivado=False).order_by('-num_participantes', 'pk').first()
+        reserva = Reserva.objects.filter(id_usuario=usuario, estado='confirmada').order_by('pk').first()
+        return {
+            'partido_id': partido.pk if partido else None,
+            'partido_competitivo_id': PartidoCompetitivo.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'notificacion_id': Notificacion.objects.filter(id_usuario=usuario).order_by('pk').values_list('pk', flat=True).first(),
+            'usuario_id': usuario.pk,
+            'cancha_id': reserva.id_cancha_id if reserva else Cancha.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'recinto_id': reserva.id_recinto_id if reserva else None,
+            'reserva_id': reserva.pk if reserva else None,
+            'serie_id': SerieReserva.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'equipo_id': Equipo.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'invitacion_id': InvitacionEquipo.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'accion': 'rechazar',
+            'fecha': (timezone.localdate() + timedelta(days=1)).isoformat(),
+        }
+
+    def _argumentos(self, patron):
+        valores = dict(self.objetos)
+        if patron.name.startswith('competitiva_detalle_partido'):
+            valores['partido_id'] = valores['partido_competitivo_id']
+        if patron.name == 'editar_recinto':
+            valores['pk'] = valores['recinto_id']
+        elif patron.name == 'editar_cancha':
+            valores['pk'] = valores['cancha_id']
+        argumentos = {nombre: valores.get(nombre) for nombre in patron.pattern.converters}
+        return None if None in argumentos.values() else argumentos
+
+    def _parametros(self, nombre):
+        o = self.objetos
+        return {
+            'api_horarios_disponibles': {'cancha_id': o['cancha_id'], 'fecha': o['fecha'], 'duracion': 60},
+            'api_buscar_horarios': {'recinto': o['recinto_id'] or '', 'fecha_desde': o['fecha']},
+            'disponibilidad_cancha': {'cancha': o['cancha_id']},
+            'buscar_partidos': {'q': 'futbolito nocturno'},
+            'api_buscar_partidos': {'q': 'futbolito nocturno'},
+            'api_cercanos': {'lat': -33.45, 'lng': -70.66, 'radio': 20},
+        }.get(nombre, {})
+
+    def _medir(self, client, url, parametros, options):
+        tiempos = []
+        registro = None
+        for iteracion in range(options['calentamiento'] + options['iteraciones']):
+            if options['sin_cache']:
+                cache.clear()
+            registro = RegistroConsultas(umbral_n1=0)
+            # Cada solicitud se deshace: las vistas que modifican datos no alteran las siguientes
+            with transaction.atomic(), connection.execute_wrapper(registro):
+                inicio = time.perf_counter()
+                response = client.get(url, parametros)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                transcurrido = (time.perf_counter() - inicio) * 1000
+                transaction.set_rollback(True)
+            if iteracion >= options['calentamiento']:
+                tiempos.append(transcurrido)
+        return {
+            'url': url,
+            'estado': response.status_code,
+            **{f'p{p}_ms': round(percentil(tiempos, p), 2) for p in PERCENTILES},
+            'media_ms': round(statistics.fmean(tiempos), 2),
+            'consultas': registro.total,
+            'db_ms': round(registro.segundos * 1000, 2),
+            'max_repeticiones': registro.max_repeticiones,
+        }
+
+    def _comparar(self, base, nuevo, tolerancia, minimo_ms):
+        try:
+            antes = json.loads(Path(base).read_text())['vistas']
+            despues = json.loads(Path(nuevo).read_text())['vistas']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'No se pudieron leer los resultados: {e}')
+
+        regresiones = []
+        for nombre in sorted(set(antes) & set(despues)):
+            a, d = antes[nombre], despues[nombre]
+            motivos = []
+            aumento = d['p95_ms'] - a['p95_ms']
+            if aumento > minimo_ms and aumento > a['p95_ms'] * tolerancia:
+                motivos.append(f'p95 {a["p95_ms"]:.1f} -> {d["p95_ms"]:.1f} ms')
+            if d['consultas'] > a['consultas']:
+                motivos.append(f'consultas {a["consultas"]} -> {d["consultas"]}')
+            if d['estado'] != a['estado']:
+                motivos.append(f'estado {a["estado"]} -> {d["estado"]}')
+            cambio = f'{(d["p95_ms"] / a["p95_ms"] - 1) * 100:+6.1f}%' if a['p95_ms'] else '   n/a'
+            linea = f'{nombre:45} p95 {a["p95_ms"]:8.1f} -> {d["p95_ms"]:8.1f} ms ({cambio})'
+            if motivos:
+                regresiones.append(nombre)
+                self.stdout.write(self.style.ERROR(f'{linea}  REGRESIÓN: {"; ".join(motivos)}'))
+            else:
+                self.stdout.write(linea)
+        for nombre in sorted(set(antes) ^ set(despues)):
+            self.stdout.write(self.style.WARNING(f'{nombre}: medida solo en {"BASE" if nombre in antes else "NUEVO"}'))
+
+        if regresiones:
+            raise CommandError(f'{len(regresiones)} vistas con regresiones: {", ".join(regresiones)}')
+        self.stdout.write(self.style.SUCCESS('Sin regresiones'))
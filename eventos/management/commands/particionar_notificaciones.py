@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from eventos.notificaciones import limite_retencion
+from eventos.particiones import meses_vencidos, particiones, retirar_mes, sql_agregar_meses, sql_particionar
+
+
+class Command(BaseCommand):
+    help = (
+        'Particiona notificaciones por mes en MySQL. La primera vez crea las particiones; después '
+        '(mensualmente) agrega los meses siguientes y retira los que quedaron fuera de la retención. '
+        'Sin --aplicar solo muestra lo que haría'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Ejecutar las sentencias en lugar de solo mostrarlas')
+        parser.add_argument('--meses-futuros', type=int, default=3,
+                            help='Meses por delante que deben tener partición creada')
+        parser.add_argument('--archivar', action='store_true',
+                            help='Copiar a notificaciones_archivo lo que se retire o borre')
+        parser.add_argument('--sin-retirar', action='store_true',
+                            help='Solo agregar meses, sin retirar los vencidos')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'mysql':
+            raise CommandError('El particionado de notificaciones solo está disponible en MySQL')
+
+        existentes = particiones()
+        if not existentes:
+            # Reescribe la tabla completa: conviene hacerlo en una ventana de mantenimiento
+            self._ejecutar(sql_particionar(options['meses_futuros']), options)
+            return
+
+        self._ejecutar(sql_agregar_meses(existentes, options['meses_futuros']), options)
+        if options['sin_retirar']:
+            return
+        for mes in meses_vencidos(existentes, limite_retencion()):
+            if not options['aplicar']:
+                self.stdout.write(f'Se retiraría el mes {mes:%Y-%m}')
+            elif retirar_mes(mes, archivando=options['archivar']):
+                self.stdout.write(self.style.SUCCESS(f'Mes {mes:%Y-%m} retirado'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'Mes {mes:%Y-%m} conservado: tiene no leídas; se borraron solo sus leídas'
+                ))
+
+    def _ejecutar(self, sentencias, options):
+        if not sentencias:
+            self.stdout.write('Las particiones ya están al día')
+        for sentencia in sentencias:
+            self.stdout.write(sentencia + ';')
+            if options['aplicar']:
+                with connection.cursor() as cursor:
+                    cursor.execute(sentencia)
@@ -0,0 +1,82 @@
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from eventos.tareas import procesar_lote, purgar_completadas, recuperar_colgadas
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las tareas encoladas con eventos.tareas.encolar: varios hilos toman tareas por '
+        'prioridad, reintentan con espera exponencial y recuperan las que quedaron colgadas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=2,
+                            help='Hilos que ejecutan tareas a la vez')
+        parser.add_argument('--lote', type=int, default=10,
+                            help='Tareas que toma cada hilo por consulta')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--mantenimiento', type=int, default=60,
+                            help='Segundos entre recuperación de colgadas y purga de completadas')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vaciar la cola y terminar (cron, pruebas)')
+
+    def handle(self, *args, **options):
+        nombre = f'{socket.gethostname()}:{os.getpid()}'
+        if options['una_vez']:
+            recuperar_colgadas()
+            total = 0
+            while tomadas := procesar_lote(nombre, options['lote']):
+                total += tomadas
+            self.stdout.write(self.style.SUCCESS(f'Tareas ejecutadas: {total}'))
+            return
+
+        detener = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: detener.set())
+        hilos = [
+            threading.Thread(
+                target=self._trabajar, args=(f'{nombre}:{numero}', options, detener), name=f'tareas-{numero}'
+            )
+            for numero in range(options['concurrencia'])
+        ]
+        for hilo in hilos:
+            hilo.start()
+        self.stdout.write(f'Procesando tareas con {len(hilos)} hilos ({nombre})')
+
+        try:
+            while not detener.is_set():
+                recuperadas = recuperar_colgadas()
+                purgadas = purgar_completadas()
+                if recuperadas or purgadas:
+                    self.stdout.write(f'Colgadas recuperadas: {recuperadas}, completadas purgadas: {purgadas}')
+                connections.close_all()
+                detener.wait(options['mantenimiento'])
+        except KeyboardInterrupt:
+            detener.set()
+
+        # Cada hilo termina la tarea que tiene entre manos antes de salir
+        for hilo in hilos:
+            hilo.join()
+        self.stdout.write(self.style.WARNING('Trabajador detenido'))
+
+    def _trabajar(self, nombre, options, detener):
+        try:
+            while not detener.is_set():
+                try:
+                    tomadas = procesar_lote(nombre, options['lote'])
+                except Exception as error:
+                    # Base caída o conexión cortada: reintentar con una conexión nueva
+                    self.stderr.write(f'{nombre}: {error}')
+                    connections.close_all()
+                    tomadas = 0
+                if not tomadas:
+                    detener.wait(options['espera'])
+        finally:
+            # Las conexiones son por hilo; cerrarla al salir
+            connections.close_all()
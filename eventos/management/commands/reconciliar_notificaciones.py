@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from eventos.avisos import reconciliar_no_leidas, usuarios_desviados
+from eventos.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara Usuario.notificaciones_no_leidas con las notificaciones sin leer reales y corrige '
+        'las diferencias; con --continuo se repite cada --intervalo segundos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Ancho del rango de claves primarias revisado por consulta')
+        parser.add_argument('--solo-revisar', action='store_true',
+                            help='Informar los usuarios desviados sin corregirlos')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Repetir la reconciliación indefinidamente')
+        parser.add_argument('--intervalo', type=int, default=3600,
+                            help='Segundos entre reconciliaciones en modo continuo')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self._reconciliar(options)
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Reconciliación interrumpida'))
+
+    def _reconciliar(self, options):
+        ultimo = Usuario.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+        lote = options['lote']
+        comienzo = time.monotonic()
+        total = 0
+
+        for desde in range(1, ultimo + 1, lote):
+            if options['solo_revisar']:
+                for usuario in usuarios_desviados(desde, desde + lote):
+                    self.stdout.write(
+                        f'Usuario {usuario.pk}: contador {usuario.notificaciones_no_leidas}, no leídas {usuario.real}'
+                    )
+                    total += 1
+            else:
+                total += reconciliar_no_leidas(desde, desde + lote)
+
+        accion = 'desviados' if options['solo_revisar'] else 'corregidos'
+        self.stdout.write(self.style.SUCCESS(
+            f'Usuarios {accion}: {total} (ids hasta {ultimo}) en {time.monotonic() - comienzo:.1f}s'
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from eventos.models import Partido
+from eventos.partidos import partidos_desviados, reconciliar_participantes
+
+
+class Command(BaseCommand):
+    help = 'Compara Partido.num_participantes con las inscripciones reales y corrige las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Ancho del rango de claves primarias revisado por consulta')
+        parser.add_argument('--solo-revisar', action='store_true',
+                            help='Informar los partidos desviados sin corregirlos')
+
+    def handle(self, *args, **options):
+        ultimo = Partido.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+        lote = options['lote']
+        comienzo = time.monotonic()
+        total = 0
+
+        for desde in range(1, ultimo + 1, lote):
+            if options['solo_revisar']:
+                for partido in partidos_desviados(desde, desde + lote):
+                    self.stdout.write(
+                        f'Partido {partido.pk}: contador {partido.num_participantes}, inscritos {partido.real}'
+                    )
+                    total += 1
+            else:
+                total += reconciliar_participantes(desde, desde + lote)
+
+        accion = 'desviados' if options['solo_revisar'] else 'corregidos'
+        self.stdout.write(self.style.SUCCESS(
+            f'Partidos {accion}: {total} (ids hasta {ultimo}) en {time.monotonic() - comienzo:.1f}s'
+        ))
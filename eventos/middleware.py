@@ -0,0 +1,169 @@
+"""
+Presupuesto de consultas por solicitud y detector de N+1.
+
+ConsultasMiddleware cuenta las consultas y el tiempo de base de datos de una
+muestra de las solicitudes mediante execute_wrapper, sin activar el registro
+de consultas de DEBUG. Las consultas se agrupan por forma: el SQL de Django ya
+llega con los parámetros aparte, así que basta con colapsar las listas IN de
+largo variable. Cuando una misma forma se repite CONSULTAS_REPETICIONES_N1
+veces se registra un aviso de N+1 con la plantilla y la línea que la disparó
+(o, fuera de plantillas, la primera línea del proyecto en la pila); la pila
+solo se inspecciona esa vez por forma.
+
+Los usuarios staff siempre se miden y reciben los totales en las cabeceras
+X-Consultas, X-Consultas-Tiempo-Ms y Server-Timing. Las consultas hechas al
+enviar una respuesta en flujo quedan fuera de la cuenta.
+
+El usuario solo se carga si la solicitud no salió en la muestra y la sesión
+tiene a alguien identificado; en las muestreadas las cabeceras van solo si la
+vista ya lo cargó. En ASGI el middleware corre en el loop sin
+saltar de hilo; si mide, instala el registro en el hilo donde la solicitud
+ejecuta su ORM (el de ThreadSensitiveContext), que es donde están sus
+conexiones.
+"""
+import logging
+import random
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.db import connections
+
+logger = logging.getLogger('eventos.consultas')
+
+_LISTA_IN = re.compile(r'IN \((?:%s, )*%s\)')
+_RAIZ_PROYECTO = str(settings.BASE_DIR)
+
+
+def forma_consulta(sql):
+    """SQL sin el largo de las listas IN, para agrupar consultas equivalentes"""
+    return _LISTA_IN.sub('IN (...)', sql)
+
+
+def _origen_consulta():
+    """Plantilla y línea que se estaba renderizando, o la primera línea del proyecto en la pila"""
+    marco = sys._getframe(2)
+    linea_proyecto = None
+    while marco is not None:
+        nodo = marco.f_locals.get('self')
+        if marco.f_code.co_name == 'render_annotated' and getattr(nodo, 'origin', None) is not None:
+            token = getattr(nodo, 'token', None)
+            return f'{nodo.origin.template_name}:{token.lineno if token else "?"}'
+        archivo = marco.f_code.co_filename
+        if (linea_proyecto is None and archivo.startswith(_RAIZ_PROYECTO)
+                and 'site-packages' not in archivo and archivo != __file__):
+            linea_proyecto = f'{archivo[len(_RAIZ_PROYECTO) + 1:]}:{marco.f_lineno} ({marco.f_code.co_name})'
+        marco = marco.f_back
+    return linea_proyecto or 'desconocido'
+
+
+class RegistroConsultas:
+    """execute_wrapper que acumula cantidad, tiempo y repeticiones por forma de SQL"""
+
+    def __init__(self, umbral_n1):
+        self.umbral_n1 = umbral_n1
+        self.total = 0
+        self.segundos = 0.0
+        self.formas = {}
+        self.n1 = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.total += 1
+            forma = forma_consulta(sql)
+            repeticiones = self.formas.get(forma, 0) + 1
+            self.formas[forma] = repeticiones
+            if repeticiones == self.umbral_n1:
+                self.n1[forma] = _origen_consulta()
+
+    @property
+    def max_repeticiones(self):
+        return max(self.formas.values(), default=0)
+
+
+def _instalar(registro):
+    """Pila que envuelve todas las conexiones del hilo actual con `registro`"""
+    pila = ExitStack()
+    for conexion in connections.all():
+        pila.enter_context(conexion.execute_wrapper(registro))
+    return pila
+
+
+def _staff_cargado(request):
+    """Si el usuario ya cargado es staff; nunca lo consulta solo para esto"""
+    # Caché de AuthenticationMiddleware: request.user la llena en WSGI y request.auser() en ASGI
+    usuario = getattr(request, '_cached_user', None) or getattr(request, '_acached_user', None)
+    return bool(usuario is not None and usuario.is_staff)
+
+
+class ConsultasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.muestreo = getattr(settings, 'CONSULTAS_MUESTREO', 0.0)
+        self.presupuesto = getattr(settings, 'CONSULTAS_PRESUPUESTO', 50)
+        self.umbral_n1 = getattr(settings, 'CONSULTAS_REPETICIONES_N1', 5)
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def _en_muestra(self):
+        return self.muestreo > 0 and random.random() < self.muestreo
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        # Fuera de la muestra solo se mide a staff, y sin sesión identificada no hace falta cargar el usuario
+        sesion = getattr(request, 'session', None)
+        if not self._en_muestra() and not (sesion is not None and SESSION_KEY in sesion and request.user.is_staff):
+            return self.get_response(request)
+
+        registro = RegistroConsultas(self.umbral_n1)
+        with _instalar(registro):
+            response = self.get_response(request)
+        return self._informar(request, response, registro)
+
+    async def __acall__(self, request):
+        sesion = getattr(request, 'session', None)
+        if not self._en_muestra() and not (
+            sesion is not None and await sesion.ahas_key(SESSION_KEY) and (await request.auser()).is_staff
+        ):
+            return await self.get_response(request)
+
+        registro = RegistroConsultas(self.umbral_n1)
+        pila = await sync_to_async(_instalar)(registro)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+        return self._informar(request, response, registro)
+
+    def _informar(self, request, response, registro):
+        milisegundos = registro.segundos * 1000
+        for forma, origen in registro.n1.items():
+            logger.warning(
+                'N+1 en %s %s: %d consultas iguales desde %s: %s',
+                request.method, request.path, registro.formas[forma], origen, forma[:300],
+            )
+        if registro.total > self.presupuesto:
+            logger.warning(
+                'Presupuesto de consultas excedido en %s %s: %d consultas (máximo %d), %.1f ms',
+                request.method, request.path, registro.total, self.presupuesto, milisegundos,
+            )
+
+        if _staff_cargado(request):
+            response['X-Consultas'] = str(registro.total)
+            response['X-Consultas-Tiempo-Ms'] = f'{milisegundos:.1f}'
+            response['X-Consultas-Repetidas'] = str(registro.max_repeticiones)
+            response['Server-Timing'] = f'db;dur={milisegundos:.1f};desc="{registro.total} consultas"'
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0006_alter_reserva_fecha_reserva'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueoCanchaDia',
+            fields=[
+                ('id_bloqueo', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('version', models.PositiveIntegerField(default=0, help_text='Se incrementa con cada reserva confirmada')),
+                ('id_cancha', models.ForeignKey(db_column='id_cancha', on_delete=django.db.models.deletion.CASCADE, related_name='bloqueos', to='eventos.cancha')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo de Cancha por Día',
+                'verbose_name_plural': 'Bloqueos de Canchas por Día',
+                'db_table': 'bloqueos_cancha_dia',
+                'unique_together': {('id_cancha', 'fecha')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0007_bloqueocanchadia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibilidadCanchaDia',
+            fields=[
+                ('id_disponibilidad', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('apertura', models.BigIntegerField(default=0, help_text='Unidades dentro de algún horario de apertura')),
+                ('libres', models.BigIntegerField(default=0, help_text='Unidades abiertas y sin reserva confirmada')),
+                ('cortes', models.BigIntegerField(default=0, help_text='Unidades donde comienza un horario de apertura')),
+                ('alineado', models.BooleanField(default=True, help_text='Falso si algún horario o reserva no calza con la grilla de 30 minutos')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('id_cancha', models.ForeignKey(db_column='id_cancha', on_delete=django.db.models.deletion.CASCADE, related_name='disponibilidad_dias', to='eventos.cancha')),
+            ],
+            options={
+                'verbose_name': 'Disponibilidad de Cancha por Día',
+                'verbose_name_plural': 'Disponibilidad de Canchas por Día',
+                'db_table': 'disponibilidad_cancha_dia',
+                'unique_together': {('id_cancha', 'fecha')},
+            },
+        ),
+    ]
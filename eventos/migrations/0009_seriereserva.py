@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0008_disponibilidadcanchadia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieReserva',
+            fields=[
+                ('id_serie', models.BigAutoField(primary_key=True, serialize=False)),
+                ('dia_semana', models.IntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], help_text='0=Lunes, 6=Domingo')),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('cancelada', 'Cancelada')], default='activa', max_length=20)),
+                ('notas', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('id_cancha', models.ForeignKey(db_column='id_cancha', on_delete=django.db.models.deletion.CASCADE, to='eventos.cancha')),
+                ('id_recinto', models.ForeignKey(db_column='id_recinto', on_delete=django.db.models.deletion.CASCADE, to='eventos.recinto')),
+                ('id_usuario', models.ForeignKey(db_column='id_usuario', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Serie de Reservas',
+                'verbose_name_plural': 'Series de Reservas',
+                'db_table': 'series_reserva',
+            },
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='id_serie',
+            field=models.ForeignKey(blank=True, db_column='id_serie', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas', to='eventos.seriereserva'),
+        ),
+    ]
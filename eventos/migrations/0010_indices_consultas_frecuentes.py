@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0009_seriereserva'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['id_usuario', 'leida', 'fecha_creacion'], name='notif_usuario_leida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['id_usuario', 'fecha_creacion'], name='notif_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partido',
+            index=models.Index(fields=['fecha_inicio'], name='partidos_fecha_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partidocompetitivo',
+            index=models.Index(fields=['id_equipo_local', 'fecha_hora'], name='pcomp_local_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partidocompetitivo',
+            index=models.Index(fields=['id_equipo_visitante', 'fecha_hora'], name='pcomp_visitante_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partidocompetitivo',
+            index=models.Index(fields=['fecha_hora'], name='pcomp_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['id_cancha', 'fecha_reserva', 'estado', 'hora_inicio', 'hora_fin'], name='reservas_cancha_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['id_usuario', 'fecha_reserva'], name='reservas_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['-puntos_friendly'], name='usuarios_puntos_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0010_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionCanchaDia',
+            fields=[
+                ('id_ocupacion', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], help_text='0=Lunes, 6=Domingo')),
+                ('hora', models.PositiveSmallIntegerField(help_text='Hora del día (0-23)')),
+                ('minutos_apertura', models.PositiveSmallIntegerField(default=0)),
+                ('minutos_reservados', models.PositiveSmallIntegerField(default=0)),
+                ('id_cancha', models.ForeignKey(db_column='id_cancha', on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion_dias', to='eventos.cancha')),
+            ],
+            options={
+                'verbose_name': 'Ocupación de Cancha por Día',
+                'verbose_name_plural': 'Ocupación de Canchas por Día',
+                'db_table': 'ocupacion_cancha_dia',
+                'unique_together': {('id_cancha', 'fecha', 'hora')},
+            },
+        ),
+    ]
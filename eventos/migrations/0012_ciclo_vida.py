@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0011_ocupacioncanchadia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partido',
+            name='archivado',
+            field=models.BooleanField(default=False, help_text='Partido ya jugado; lo marca el comando barrer_ciclo_vida'),
+        ),
+        migrations.AlterField(
+            model_name='invitacionequipo',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('aceptada', 'Aceptada'), ('rechazada', 'Rechazada'), ('expirada', 'Expirada')], default='pendiente', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='partido',
+            index=models.Index(fields=['archivado', 'fecha_inicio'], name='partidos_archivado_fecha_idx'),
+        ),
+    ]
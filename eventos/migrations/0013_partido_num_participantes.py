@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def contar_participantes(apps, schema_editor):
+    Partido = apps.get_model('eventos', 'Partido')
+    ParticipantePartido = apps.get_model('eventos', 'ParticipantePartido')
+    inscritos = ParticipantePartido.objects.filter(
+        id_partido=OuterRef('pk')
+    ).order_by().values('id_partido').annotate(total=Count('pk')).values('total')
+    Partido.objects.update(num_participantes=Coalesce(Subquery(inscritos), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0012_ciclo_vida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partido',
+            name='num_participantes',
+            field=models.PositiveIntegerField(default=0, help_text='Inscritos; se mantiene con UPDATE condicionales en eventos.partidos'),
+        ),
+        migrations.RunPython(contar_participantes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0013_partido_num_participantes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='partido',
+            name='partidos_archivado_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='partido',
+            index=models.Index(fields=['archivado', 'fecha_inicio', 'num_participantes', 'max_jugadores'], name='partidos_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partido',
+            index=models.Index(fields=['archivado', 'id_localidad', 'fecha_inicio'], name='partidos_feed_localidad_idx'),
+        ),
+    ]
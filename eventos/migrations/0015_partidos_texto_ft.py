@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    # En SQLite el equivalente (FTS5) lo crea eventos.busqueda tras cada migrate
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('CREATE FULLTEXT INDEX partidos_texto_ft ON partidos (lugar, descripcion)')
+
+
+def borrar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX partidos_texto_ft ON partidos')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0014_feed_partidos'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fulltext, borrar_indice_fulltext),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0015_partidos_texto_ft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='localidad',
+            name='latitud',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='localidad',
+            name='longitud',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='recinto',
+            name='latitud',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='recinto',
+            name='longitud',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='localidad',
+            index=models.Index(fields=['latitud', 'longitud'], name='localidades_coordenadas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recinto',
+            index=models.Index(fields=['latitud', 'longitud'], name='recintos_coordenadas_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0016_coordenadas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensajepartido',
+            index=models.Index(fields=['id_partido', 'fecha_creacion'], name='mensajes_partido_fecha_idx'),
+        ),
+    ]
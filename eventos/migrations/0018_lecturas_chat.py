@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def crear_lecturas(apps, schema_editor):
+    """Un cursor por organizador e inscrito de los partidos vigentes, con el chat actual ya leído"""
+    Partido = apps.get_model('eventos', 'Partido')
+    ParticipantePartido = apps.get_model('eventos', 'ParticipantePartido')
+    LecturaChat = apps.get_model('eventos', 'LecturaChat')
+    partidos = Partido.objects.filter(archivado=False).annotate(ultimo=Max('mensajes__id_mensaje'))
+    for partido_id, organizador_id, ultimo in partidos.values_list('pk', 'id_organizador_id', 'ultimo').iterator():
+        usuarios = set(ParticipantePartido.objects.filter(id_partido_id=partido_id).values_list('id_usuario_id', flat=True))
+        usuarios.add(organizador_id)
+        LecturaChat.objects.bulk_create([
+            LecturaChat(id_partido_id=partido_id, id_usuario_id=usuario_id, id_ultimo_leido=ultimo or 0)
+            for usuario_id in usuarios
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0017_mensajes_partido_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaChat',
+            fields=[
+                ('id_lectura', models.AutoField(primary_key=True, serialize=False)),
+                ('id_ultimo_leido', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('id_partido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas_chat', to='eventos.partido')),
+                ('id_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas_chat', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lectura de Chat',
+                'verbose_name_plural': 'Lecturas de Chat',
+                'db_table': 'lecturas_chat',
+                'unique_together': {('id_usuario', 'id_partido')},
+            },
+        ),
+        migrations.RunPython(crear_lecturas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def contar_no_leidas(apps, schema_editor):
+    Usuario = apps.get_model('eventos', 'Usuario')
+    Notificacion = apps.get_model('eventos', 'Notificacion')
+    no_leidas = Notificacion.objects.filter(
+        id_usuario=OuterRef('pk'), leida=False
+    ).order_by().values('id_usuario').annotate(total=Count('pk')).values('total')
+    Usuario.objects.update(notificaciones_no_leidas=Coalesce(Subquery(no_leidas), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0018_lecturas_chat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='notificaciones_no_leidas',
+            field=models.PositiveIntegerField(default=0, help_text='Contador de la insignia; se mantiene con UPDATE en eventos.avisos'),
+        ),
+        migrations.RunPython(contar_no_leidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0019_usuario_notificaciones_no_leidas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacion',
+            name='id_partido',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificaciones', to='eventos.partido'),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('nuevo_participante', 'Nuevo Participante'), ('nuevo_mensaje', 'Nuevo Mensaje'), ('salida_participante', 'Salida de Participante'), ('info', 'Partido Actualizado'), ('cancelacion', 'Partido Cancelado')], max_length=50),
+        ),
+    ]
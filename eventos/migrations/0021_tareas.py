@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0020_notificacion_partido_opcional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id_tarea', models.BigAutoField(primary_key=True, serialize=False)),
+                ('funcion', models.CharField(max_length=200)),
+                ('argumentos', models.JSONField(blank=True, default=dict)),
+                ('prioridad', models.SmallIntegerField(default=50)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=5)),
+                ('ejecutar_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tomada_en', models.DateTimeField(blank=True, null=True)),
+                ('trabajador', models.CharField(blank=True, max_length=100)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'db_table': 'tareas',
+                'indexes': [models.Index(fields=['estado', 'prioridad', 'ejecutar_desde'], name='tareas_cola_idx'), models.Index(fields=['estado', 'tomada_en'], name='tareas_estado_tomada_idx'), models.Index(fields=['estado', 'fecha_fin'], name='tareas_estado_fin_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0021_tareas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionArchivada',
+            fields=[
+                ('id_notificacion', models.IntegerField(primary_key=True, serialize=False)),
+                ('id_usuario', models.IntegerField()),
+                ('id_partido', models.IntegerField(blank=True, null=True)),
+                ('tipo', models.CharField(max_length=50)),
+                ('mensaje', models.TextField()),
+                ('leida', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('id_usuario_relacionado', models.IntegerField(blank=True, null=True)),
+                ('id_mensaje', models.IntegerField(blank=True, null=True)),
+                ('fecha_archivo', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Notificación Archivada',
+                'verbose_name_plural': 'Notificaciones Archivadas',
+                'db_table': 'notificaciones_archivo',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['leida', 'fecha_creacion'], name='notif_leida_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacionarchivada',
+            index=models.Index(fields=['id_usuario', 'fecha_creacion'], name='notif_archivo_usuario_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 
 
@@ -48,6 +49,11 @@ class Usuario(AbstractBaseUser):
     # Sistema de ranking
     puntos_friendly = models.IntegerField(default=0)
     
+    notificaciones_no_leidas = models.PositiveIntegerField(
+        default=0,
+        help_text='Contador de la insignia; se mantiene con UPDATE en eventos.avisos'
+    )
+    
     objects = UsuarioManager()
     
     USERNAME_FIELD = 'email'
@@ -57,10 +63,24 @@ class Usuario(AbstractBaseUser):
         db_table = 'usuarios'
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
+        indexes = [
+            # Ranking: se recorre en orden de puntos y se corta en el LIMIT
+            models.Index(fields=['-puntos_friendly'], name='usuarios_puntos_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
     
+    def save(self, *args, **kwargs):
+        # Igual que Partido.num_participantes: el contador solo cambia con UPDATE
+        # y guardar el usuario de la sesión no debe pisarlo con un valor viejo
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'notificaciones_no_leidas'
+            ]
+        super().save(*args, **kwargs)
+    
     def has_perm(self, perm, obj=None):
         return True
     
@@ -101,6 +121,8 @@ class Usuario(AbstractBaseUser):
 class Localidad(models.Model):
     id_localidad = models.BigAutoField(primary_key=True)
     nombre = models.CharField(max_length=100)
+    latitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
@@ -108,6 +130,10 @@ class Localidad(models.Model):
         db_table = 'localidades'
         verbose_name = 'Localidad'
         verbose_name_plural = 'Localidades'
+        indexes = [
+            # Prefiltro por caja de coordenadas en eventos.cercania
+            models.Index(fields=['latitud', 'longitud'], name='localidades_coordenadas_idx'),
+        ]
     
     def __str__(self):
         return self.nombre
@@ -133,11 +159,27 @@ class Reserva(models.Model):
         default='confirmada'
     )
     notas = models.TextField(blank=True, null=True, help_text='Observaciones de la reserva')
+    id_serie = models.ForeignKey(
+        'eventos.SerieReserva',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column='id_serie',
+        related_name='reservas'
+    )
     
     class Meta:
         db_table = 'reservas'
         verbose_name = 'Reserva'
         verbose_name_plural = 'Reservas'
+        indexes = [
+            # Solapamientos y disponibilidad; incluye las horas para resolverlas solo desde el índice
+            models.Index(
+                fields=['id_cancha', 'fecha_reserva', 'estado', 'hora_inicio', 'hora_fin'],
+                name='reservas_cancha_fecha_idx'
+            ),
+            models.Index(fields=['id_usuario', 'fecha_reserva'], name='reservas_usuario_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Reserva {self.id_reserva} - {self.id_cancha.nombre} - {self.fecha_reserva} {self.hora_inicio}"
@@ -208,15 +250,107 @@ class Reserva(models.Model):
         return int((fin_dt - inicio_dt).total_seconds() / 60)
 
 
+class SerieReserva(models.Model):
+    """Reserva recurrente: el mismo horario todas las semanas entre dos fechas"""
+    ESTADOS = [
+        ('activa', 'Activa'),
+        ('cancelada', 'Cancelada'),
+    ]
+    DIAS_SEMANA = [
+        (0, 'Lunes'),
+        (1, 'Martes'),
+        (2, 'Miércoles'),
+        (3, 'Jueves'),
+        (4, 'Viernes'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+    
+    id_serie = models.BigAutoField(primary_key=True)
+    id_cancha = models.ForeignKey('eventos.Cancha', on_delete=models.CASCADE, db_column='id_cancha')
+    id_recinto = models.ForeignKey('eventos.Recinto', on_delete=models.CASCADE, db_column='id_recinto')
+    id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, db_column='id_usuario')
+    dia_semana = models.IntegerField(choices=DIAS_SEMANA, help_text='0=Lunes, 6=Domingo')
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='activa')
+    notas = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'series_reserva'
+        verbose_name = 'Serie de Reservas'
+        verbose_name_plural = 'Series de Reservas'
+    
+    def __str__(self):
+        return f"Serie {self.id_serie} - {self.id_cancha.nombre} - {self.get_dia_semana_display()} {self.hora_inicio}"
+    
+    # Una temporada completa de reservas semanales
+    MAX_OCURRENCIAS = 52
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from datetime import datetime
+        from django.utils import timezone
+        
+        if self.hora_inicio >= self.hora_fin:
+            raise ValidationError('La hora de inicio debe ser anterior a la hora de fin.')
+        
+        duracion = (datetime.combine(self.fecha_inicio, self.hora_fin) - datetime.combine(self.fecha_inicio, self.hora_inicio)).total_seconds() / 60
+        if duracion < 30:
+            raise ValidationError('La duración mínima de una reserva es 30 minutos.')
+        if duracion > 240:
+            raise ValidationError('La duración máxima de una reserva es 4 horas.')
+        
+        if self.fecha_inicio < timezone.now().date():
+            raise ValidationError('No se pueden hacer reservas para fechas pasadas.')
+        if self.fecha_fin < self.fecha_inicio:
+            raise ValidationError('La fecha de término debe ser posterior a la fecha de inicio.')
+        
+        if (self.fecha_fin - self.fecha_inicio).days >= 7 * self.MAX_OCURRENCIAS:
+            raise ValidationError(f'Una serie puede tener como máximo {self.MAX_OCURRENCIAS} reservas.')
+        if not self.fechas():
+            raise ValidationError(f'No hay ningún {self.get_dia_semana_display()} entre las fechas indicadas.')
+        
+        # El horario debe caber en un bloque de apertura de la cancha para ese día
+        dentro_horario = HorarioCancha.objects.filter(
+            id_cancha=self.id_cancha,
+            dia_semana=self.dia_semana,
+            activo=True,
+            hora_inicio__lte=self.hora_inicio,
+            hora_fin__gte=self.hora_fin
+        ).exists()
+        if not dentro_horario:
+            raise ValidationError('El horario seleccionado está fuera de los horarios disponibles de la cancha.')
+    
+    def fechas(self):
+        """Fechas de todas las ocurrencias de la serie"""
+        from datetime import timedelta
+        fecha = self.fecha_inicio + timedelta(days=(self.dia_semana - self.fecha_inicio.weekday()) % 7)
+        fechas = []
+        while fecha <= self.fecha_fin:
+            fechas.append(fecha)
+            fecha += timedelta(days=7)
+        return fechas
+
+
 class Partido(models.Model):
     id_partido = models.AutoField(primary_key=True)
     lugar = models.CharField(max_length=100)
     fecha_inicio = models.DateTimeField(null=True, blank=True)
     descripcion = models.TextField(null=True, blank=True)
     max_jugadores = models.IntegerField(default=10)
+    num_participantes = models.PositiveIntegerField(
+        default=0,
+        help_text='Inscritos; se mantiene con UPDATE condicionales en eventos.partidos'
+    )
     id_organizador = models.ForeignKey(Usuario, on_delete=models.CASCADE, db_column='id_organizador', related_name='partidos_organizados')
     id_localidad = models.ForeignKey(Localidad, on_delete=models.CASCADE, db_column='id_localidad')
     id_reserva = models.ForeignKey(Reserva, on_delete=models.SET_NULL, null=True, blank=True, db_column='id_reserva')
+    archivado = models.BooleanField(default=False, help_text='Partido ya jugado; lo marca el comando barrer_ciclo_vida')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
@@ -224,15 +358,34 @@ class Partido(models.Model):
         db_table = 'partidos'
         verbose_name = 'Partido'
         verbose_name_plural = 'Partidos'
+        indexes = [
+            models.Index(fields=['fecha_inicio'], name='partidos_fecha_inicio_idx'),
+            # Feed de partidos vigentes: orden por fecha; los cupos se filtran desde el propio índice
+            models.Index(
+                fields=['archivado', 'fecha_inicio', 'num_participantes', 'max_jugadores'],
+                name='partidos_feed_idx'
+            ),
+            models.Index(fields=['archivado', 'id_localidad', 'fecha_inicio'], name='partidos_feed_localidad_idx'),
+        ]
     
     def __str__(self):
         return f"Partido {self.id_partido} - {self.lugar}"
     
+    def save(self, *args, **kwargs):
+        # El contador solo cambia con UPDATE condicionales: guardar una instancia
+        # leída antes de una inscripción no debe pisarlo con un valor viejo
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'num_participantes'
+            ]
+        super().save(*args, **kwargs)
+    
     def jugadores_actuales(self):
-        return self.participantes.count()
+        return self.num_participantes
     
     def espacios_disponibles(self):
-        return self.max_jugadores - self.jugadores_actuales()
+        return max(0, self.max_jugadores - self.num_participantes)
 
 
 class ParticipantePartido(models.Model):
@@ -262,21 +415,50 @@ class MensajePartido(models.Model):
         ordering = ['fecha_creacion']
         verbose_name = 'Mensaje de Partido'
         verbose_name_plural = 'Mensajes de Partidos'
+        indexes = [
+            # Historial del chat por páginas; el id (clave primaria) queda al final del índice como desempate
+            models.Index(fields=['id_partido', 'fecha_creacion'], name='mensajes_partido_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.id_usuario.nombre} - {self.mensaje[:50]}"
 
 
+class LecturaChat(models.Model):
+    """Hasta qué mensaje leyó el chat de un partido cada inscrito y el organizador"""
+    id_lectura = models.AutoField(primary_key=True)
+    id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='lecturas_chat')
+    id_partido = models.ForeignKey(Partido, on_delete=models.CASCADE, related_name='lecturas_chat')
+    # Id del último mensaje leído (no una FK: el mensaje puede borrarse y el cursor sigue valiendo)
+    id_ultimo_leido = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'lecturas_chat'
+        # También es el índice para recorrer las lecturas de un usuario
+        unique_together = ['id_usuario', 'id_partido']
+        verbose_name = 'Lectura de Chat'
+        verbose_name_plural = 'Lecturas de Chat'
+    
+    def __str__(self):
+        return f"{self.id_usuario_id} - partido {self.id_partido_id} hasta {self.id_ultimo_leido}"
+
+
 class Notificacion(models.Model):
     TIPOS_NOTIFICACION = [
         ('nuevo_participante', 'Nuevo Participante'),
         ('nuevo_mensaje', 'Nuevo Mensaje'),
         ('salida_participante', 'Salida de Participante'),
+        ('info', 'Partido Actualizado'),
+        ('cancelacion', 'Partido Cancelado'),
     ]
     
     id_notificacion = models.AutoField(primary_key=True)
     id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='notificaciones')
-    id_partido = models.ForeignKey(Partido, on_delete=models.CASCADE, related_name='notificaciones')
+    # Sin partido cuando este se cancela: el aviso de cancelación debe sobrevivir al borrado
+    id_partido = models.ForeignKey(
+        Partido, on_delete=models.SET_NULL, related_name='notificaciones', null=True, blank=True
+    )
     tipo = models.CharField(max_length=50, choices=TIPOS_NOTIFICACION)
     mensaje = models.TextField()
     leida = models.BooleanField(default=False)
@@ -303,10 +485,88 @@ class Notificacion(models.Model):
         ordering = ['-fecha_creacion']
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
+        indexes = [
+            # Contador de no leídas y listado reciente por usuario
+            models.Index(fields=['id_usuario', 'leida', 'fecha_creacion'], name='notif_usuario_leida_idx'),
+            models.Index(fields=['id_usuario', 'fecha_creacion'], name='notif_usuario_fecha_idx'),
+            # Depuración de leídas antiguas (depurar_notificaciones): siempre lee el comienzo del índice
+            models.Index(fields=['leida', 'fecha_creacion'], name='notif_leida_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.tipo} - {self.id_usuario.nombre} - {'Leída' if self.leida else 'No leída'}"
 
+
+class NotificacionArchivada(models.Model):
+    """Notificación retirada de la tabla principal por la política de retención"""
+    # Mismo id que tenía en notificaciones; sin claves foráneas para que el archivo no dependa de las filas vivas
+    id_notificacion = models.IntegerField(primary_key=True)
+    id_usuario = models.IntegerField()
+    id_partido = models.IntegerField(null=True, blank=True)
+    tipo = models.CharField(max_length=50)
+    mensaje = models.TextField()
+    leida = models.BooleanField(default=True)
+    fecha_creacion = models.DateTimeField()
+    id_usuario_relacionado = models.IntegerField(null=True, blank=True)
+    id_mensaje = models.IntegerField(null=True, blank=True)
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'notificaciones_archivo'
+        verbose_name = 'Notificación Archivada'
+        verbose_name_plural = 'Notificaciones Archivadas'
+        indexes = [
+            models.Index(fields=['id_usuario', 'fecha_creacion'], name='notif_archivo_usuario_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo} - usuario {self.id_usuario} ({self.fecha_creacion:%Y-%m-%d})"
+
+# ------------------------
+# Cola de tareas diferidas
+# ------------------------
+
+class Tarea(models.Model):
+    """Trabajo diferido desde una vista; lo ejecuta el comando procesar_tareas"""
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    id_tarea = models.BigAutoField(primary_key=True)
+    # Ruta de la función marcada con @tarea, p. ej. 'eventos.notificaciones.notificar'
+    funcion = models.CharField(max_length=200)
+    argumentos = models.JSONField(default=dict, blank=True)
+    # Menor número se ejecuta antes
+    prioridad = models.SmallIntegerField(default=50)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=5)
+    ejecutar_desde = models.DateTimeField(default=timezone.now)
+    tomada_en = models.DateTimeField(null=True, blank=True)
+    # Marca única de la toma: identifica qué trabajador y qué lote la reservó
+    trabajador = models.CharField(max_length=100, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'tareas'
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        indexes = [
+            # Siguiente tarea a tomar: pendientes por prioridad y antigüedad
+            models.Index(fields=['estado', 'prioridad', 'ejecutar_desde'], name='tareas_cola_idx'),
+            # Tareas colgadas (en_curso) y purga de completadas
+            models.Index(fields=['estado', 'tomada_en'], name='tareas_estado_tomada_idx'),
+            models.Index(fields=['estado', 'fecha_fin'], name='tareas_estado_fin_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.funcion} ({self.estado}, intento {self.intentos}/{self.max_intentos})"
+
 # ------------------------
 # Modelos integrados de canchas
 # ------------------------
@@ -316,6 +576,8 @@ class Recinto(models.Model):
     nombre = models.CharField(max_length=100)
     direccion = models.TextField()
     id_localidad = models.ForeignKey('eventos.Localidad', on_delete=models.CASCADE, db_column='id_localidad')
+    latitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -323,6 +585,10 @@ class Recinto(models.Model):
         db_table = 'recintos'
         verbose_name = 'Recinto'
         verbose_name_plural = 'Recintos'
+        indexes = [
+            # Prefiltro por caja de coordenadas en eventos.cercania
+            models.Index(fields=['latitud', 'longitud'], name='recintos_coordenadas_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} - {self.id_localidad.nombre}"
@@ -346,52 +612,8 @@ class Cancha(models.Model):
     
     def get_horarios_disponibles(self, fecha, duracion_minutos=90):
         """Obtener slots de horarios disponibles para una fecha específica"""
-        from datetime import datetime, timedelta
-        
-        dia_semana = fecha.weekday()  # 0=Lunes, 6=Domingo
-        horarios_cancha = self.horarios.filter(dia_semana=dia_semana, activo=True)
-        
-        if not horarios_cancha.exists():
-            return []
-        
-        # Obtener reservas existentes para esa fecha
-        reservas_existentes = Reserva.objects.filter(
-            id_cancha=self,
-            fecha_reserva=fecha
-        ).values_list('hora_inicio', 'hora_fin')
-        
-        slots_disponibles = []
-        for horario in horarios_cancha:
-            hora_actual = horario.hora_inicio
-            while hora_actual < horario.hora_fin:
-                # Calcular hora_fin del slot
-                hora_inicio_dt = datetime.combine(fecha, hora_actual)
-                hora_fin_dt = hora_inicio_dt + timedelta(minutes=duracion_minutos)
-                hora_fin_slot = hora_fin_dt.time()
-                
-                # Verificar que no exceda el horario de la cancha
-                if hora_fin_slot > horario.hora_fin:
-                    break
-                
-                # Verificar que no solape con reservas existentes
-                solapa = False
-                for res_inicio, res_fin in reservas_existentes:
-                    if not (hora_fin_slot <= res_inicio or hora_actual >= res_fin):
-                        solapa = True
-                        break
-                
-                if not solapa:
-                    slots_disponibles.append({
-                        'hora_inicio': hora_actual,
-                        'hora_fin': hora_fin_slot,
-                        'disponible': True
-                    })
-                
-                # Avanzar en intervalos de 30 minutos
-                hora_inicio_dt += timedelta(minutes=30)
-                hora_actual = hora_inicio_dt.time()
-        
-        return slots_disponibles
+        from .disponibilidad import horarios_disponibles
+        return horarios_disponibles(self, fecha, duracion_minutos)
 
 
 class HorarioCancha(models.Model):
@@ -442,6 +664,76 @@ class HorarioCancha(models.Model):
                 raise ValidationError(f'Este horario solapa con otro horario existente: {horario}')
 
 
+class BloqueoCanchaDia(models.Model):
+    """Fila de bloqueo por cancha y día que serializa la creación de reservas"""
+    id_bloqueo = models.BigAutoField(primary_key=True)
+    id_cancha = models.ForeignKey(Cancha, on_delete=models.CASCADE, db_column='id_cancha', related_name='bloqueos')
+    fecha = models.DateField()
+    version = models.PositiveIntegerField(default=0, help_text='Se incrementa con cada reserva confirmada')
+    
+    class Meta:
+        db_table = 'bloqueos_cancha_dia'
+        verbose_name = 'Bloqueo de Cancha por Día'
+        verbose_name_plural = 'Bloqueos de Canchas por Día'
+        unique_together = ['id_cancha', 'fecha']
+    
+    def __str__(self):
+        return f"{self.id_cancha_id} - {self.fecha} (v{self.version})"
+
+
+class DisponibilidadCanchaDia(models.Model):
+    """
+    Disponibilidad precalculada de una cancha para un día.
+
+    Cada bit de los mapas representa una unidad de 30 minutos (bit 0 = 00:00).
+    Se mantiene desde eventos.signals al cambiar reservas u horarios y se
+    reconstruye con el comando materializar_disponibilidad.
+    """
+    id_disponibilidad = models.BigAutoField(primary_key=True)
+    id_cancha = models.ForeignKey(Cancha, on_delete=models.CASCADE, db_column='id_cancha', related_name='disponibilidad_dias')
+    fecha = models.DateField()
+    apertura = models.BigIntegerField(default=0, help_text='Unidades dentro de algún horario de apertura')
+    libres = models.BigIntegerField(default=0, help_text='Unidades abiertas y sin reserva confirmada')
+    cortes = models.BigIntegerField(default=0, help_text='Unidades donde comienza un horario de apertura')
+    alineado = models.BooleanField(default=True, help_text='Falso si algún horario o reserva no calza con la grilla de 30 minutos')
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'disponibilidad_cancha_dia'
+        verbose_name = 'Disponibilidad de Cancha por Día'
+        verbose_name_plural = 'Disponibilidad de Canchas por Día'
+        unique_together = ['id_cancha', 'fecha']
+    
+    def __str__(self):
+        return f"{self.id_cancha_id} - {self.fecha}"
+
+
+class OcupacionCanchaDia(models.Model):
+    """
+    Consolidado diario de ocupación: minutos abiertos y reservados de una cancha
+    en cada hora de un día. Solo se guardan las horas con apertura o reservas.
+
+    Lo llena el comando consolidar_ocupacion con SQL de agregación y se lee en
+    eventos.ocupacion para los mapas de calor de los recintos.
+    """
+    id_ocupacion = models.BigAutoField(primary_key=True)
+    id_cancha = models.ForeignKey(Cancha, on_delete=models.CASCADE, db_column='id_cancha', related_name='ocupacion_dias')
+    fecha = models.DateField()
+    dia_semana = models.PositiveSmallIntegerField(choices=HorarioCancha.DIAS_SEMANA, help_text='0=Lunes, 6=Domingo')
+    hora = models.PositiveSmallIntegerField(help_text='Hora del día (0-23)')
+    minutos_apertura = models.PositiveSmallIntegerField(default=0)
+    minutos_reservados = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'ocupacion_cancha_dia'
+        verbose_name = 'Ocupación de Cancha por Día'
+        verbose_name_plural = 'Ocupación de Canchas por Día'
+        unique_together = ['id_cancha', 'fecha', 'hora']
+    
+    def __str__(self):
+        return f"{self.id_cancha_id} - {self.fecha} {self.hora:02d}h"
+
+
 # ------------------------
 # Modelos integrados competitiva
 # ------------------------
@@ -535,6 +827,11 @@ class PartidoCompetitivo(models.Model):
         verbose_name = 'Partido Competitivo'
         verbose_name_plural = 'Partidos Competitivos'
         ordering = ['-fecha_hora']
+        indexes = [
+            models.Index(fields=['id_equipo_local', 'fecha_hora'], name='pcomp_local_fecha_idx'),
+            models.Index(fields=['id_equipo_visitante', 'fecha_hora'], name='pcomp_visitante_fecha_idx'),
+            models.Index(fields=['fecha_hora'], name='pcomp_fecha_hora_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id_equipo_local.nombre} vs {self.id_equipo_visitante.nombre}"
@@ -559,6 +856,7 @@ class InvitacionEquipo(models.Model):
         ('pendiente', 'Pendiente'),
         ('aceptada', 'Aceptada'),
         ('rechazada', 'Rechazada'),
+        ('expirada', 'Expirada'),
     ]
     id_invitacion = models.AutoField(primary_key=True)
     id_equipo = models.ForeignKey(Equipo, on_delete=models.CASCADE, related_name='invitaciones')
@@ -598,5 +896,3 @@ class EstadisticaJugador(models.Model):
 
     def __str__(self):
         return f"{self.id_usuario.nombre} - {self.id_partido}"
-
-
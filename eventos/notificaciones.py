@@ -0,0 +1,129 @@
+"""
+Envío de notificaciones a uno o muchos destinatarios.
+
+Todas las notificaciones se crean por aquí: se arman solo con los ids de los
+destinatarios (sin cargar usuarios) y se escriben con bulk_create en lotes de
+TAMANO_LOTE_NOTIFICACIONES, junto con el UPDATE del contador de no leídas de
+cada lote. Notificar a los 22 jugadores de un partido son tres consultas en
+vez de una por destinatario más la carga de cada usuario.
+
+Las vistas no notifican en línea: encolan notificar, avisar_organizador o
+avisar_participantes (eventos.tareas) y el trabajador las ejecuta después.
+Las dos últimas resuelven los destinatarios al ejecutarse y no hacen nada si
+el partido ya no existe.
+
+Retención: las leídas con más de NOTIFICACIONES_RETENCION_DIAS se borran por
+lotes (depurar_notificaciones), opcionalmente copiándolas antes a
+notificaciones_archivo. Las no leídas se conservan a cualquier edad porque
+siguen en el contador del usuario. Las vistas leen esa ventana
+(recientes_de) y, aparte, las no leídas anteriores (no_leidas_vencidas);
+así, con la tabla particionada por mes en MySQL (eventos.particiones), solo
+la segunda consulta, acotada a filas sin leer, llega a los meses viejos.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .avisos import sumar_no_leidas
+from .models import Notificacion, NotificacionArchivada, ParticipantePartido, Partido
+from .tareas import PRIORIDAD_ALTA, tarea
+
+TAMANO_LOTE_NOTIFICACIONES = 1000
+
+
+@tarea(prioridad=PRIORIDAD_ALTA)
+def notificar(usuario_ids, partido_id, tipo, mensaje, relacionado_id=None, mensaje_id=None):
+    """Crear la misma notificación para cada destinatario; devuelve cuántas se crearon"""
+    # Sin duplicados y en el orden recibido
+    usuario_ids = list(dict.fromkeys(usuario_ids))
+    with transaction.atomic():
+        for inicio in range(0, len(usuario_ids), TAMANO_LOTE_NOTIFICACIONES):
+            lote = usuario_ids[inicio:inicio + TAMANO_LOTE_NOTIFICACIONES]
+            Notificacion.objects.bulk_create([
+                Notificacion(
+                    id_usuario_id=usuario_id, id_partido_id=partido_id, tipo=tipo, mensaje=mensaje,
+                    id_usuario_relacionado_id=relacionado_id, id_mensaje_id=mensaje_id,
+                )
+                for usuario_id in lote
+            ])
+            # bulk_create no emite post_save: el contador se ajusta aquí, un UPDATE por lote
+            sumar_no_leidas({usuario_id: 1 for usuario_id in lote})
+    return len(usuario_ids)
+
+
+def participantes_de(partido_id, excluir=None):
+    """Ids de los inscritos del partido, sin cargar los usuarios"""
+    inscritos = ParticipantePartido.objects.filter(id_partido_id=partido_id)
+    if excluir is not None:
+        inscritos = inscritos.exclude(id_usuario_id=excluir)
+    return list(inscritos.values_list('id_usuario_id', flat=True))
+
+
+def limite_retencion():
+    """Fecha antes de la cual una notificación queda fuera de la ventana de retención"""
+    return timezone.now() - timedelta(days=getattr(settings, 'NOTIFICACIONES_RETENCION_DIAS', 90))
+
+
+def recientes_de(usuario_id, limite=None):
+    """Notificaciones del usuario dentro de la ventana de retención"""
+    return Notificacion.objects.filter(id_usuario_id=usuario_id, fecha_creacion__gte=limite or limite_retencion())
+
+
+def no_leidas_vencidas(usuario_id, limite=None):
+    """No leídas del usuario anteriores a la ventana: la depuración las conserva y siguen en su contador"""
+    return Notificacion.objects.filter(
+        id_usuario_id=usuario_id, leida=False, fecha_creacion__lt=limite or limite_retencion()
+    )
+
+
+def archivar(notificaciones):
+    """Copiar notificaciones a notificaciones_archivo; repetir la copia no duplica"""
+    NotificacionArchivada.objects.bulk_create([
+        NotificacionArchivada(
+            id_notificacion=notificacion.pk, id_usuario=notificacion.id_usuario_id,
+            id_partido=notificacion.id_partido_id, tipo=notificacion.tipo, mensaje=notificacion.mensaje,
+            leida=notificacion.leida, fecha_creacion=notificacion.fecha_creacion,
+            id_usuario_relacionado=notificacion.id_usuario_relacionado_id, id_mensaje=notificacion.id_mensaje_id,
+        )
+        for notificacion in notificaciones
+    ], ignore_conflicts=True)
+
+
+def depurar_leidas(limite, lote=TAMANO_LOTE_NOTIFICACIONES, archivando=False):
+    """
+    Borrar un lote de notificaciones leídas creadas antes de `limite`; devuelve cuántas.
+
+    Cada lote es una transacción corta sobre el índice (leida, fecha_creacion):
+    lo ya borrado sale del índice y el siguiente lote vuelve a leer su comienzo.
+    Las no leídas no se tocan: siguen en el contador del usuario.
+    """
+    with transaction.atomic():
+        viejas = Notificacion.objects.filter(leida=True, fecha_creacion__lt=limite).order_by('fecha_creacion')
+        if archivando:
+            viejas = list(viejas[:lote])
+            archivar(viejas)
+            ids = [notificacion.pk for notificacion in viejas]
+        else:
+            ids = list(viejas.values_list('pk', flat=True)[:lote])
+        if ids:
+            Notificacion.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+@tarea
+def avisar_organizador(partido_id, tipo, mensaje, relacionado_id=None):
+    """Notificar al organizador del partido, si el partido sigue existiendo"""
+    organizador_id = Partido.objects.filter(pk=partido_id).values_list('id_organizador_id', flat=True).first()
+    if organizador_id is None:
+        return 0
+    return notificar([organizador_id], partido_id, tipo, mensaje, relacionado_id=relacionado_id)
+
+
+@tarea
+def avisar_participantes(partido_id, tipo, mensaje, excluir=None):
+    """Notificar a los inscritos del partido al momento de ejecutarse, si el partido sigue existiendo"""
+    if not Partido.objects.filter(pk=partido_id).exists():
+        return 0
+    return notificar(participantes_de(partido_id, excluir=excluir), partido_id, tipo, mensaje)
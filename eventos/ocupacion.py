@@ -0,0 +1,154 @@
+"""
+Analítica de ocupación de canchas.
+
+La ocupación (minutos reservados vs minutos abiertos) se calcula con SQL de
+agregación: una suma condicional por cada hora del día sobre Reserva y otra
+sobre HorarioCancha, sin recorrer reservas en Python. El resultado se
+consolida por cancha, fecha y hora en OcupacionCanchaDia (comando
+consolidar_ocupacion), y los mapas de calor se leen agrupando esa tabla, de
+modo que su costo no depende de la cantidad de reservas del período.
+
+La apertura de cada día queda congelada al consolidarlo: cambiar los horarios
+de una cancha no reescribe la ocupación histórica.
+"""
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Sum, Value
+from django.db.models.functions import ExtractHour, ExtractMinute, Greatest, Least
+
+from .models import HorarioCancha, Reserva, OcupacionCanchaDia
+
+HORAS_DIA = 24
+# Reservas que cuentan como ocupación (las completadas son confirmadas ya jugadas)
+ESTADOS_OCUPADOS = ('confirmada', 'completada')
+SIN_MINUTOS = (0,) * HORAS_DIA
+
+
+def _minutos(campo):
+    """Expresión SQL con los minutos desde medianoche de un TimeField"""
+    return ExtractHour(campo) * 60 + ExtractMinute(campo)
+
+
+def _minutos_por_hora(inicio, fin):
+    """Anotaciones h0..h23 con los minutos de [inicio, fin) que caen en cada hora"""
+    return {
+        f'h{hora}': Sum(
+            Greatest(Value(0), Least(fin, Value(hora * 60 + 60)) - Greatest(inicio, Value(hora * 60))),
+            output_field=models.IntegerField(),
+        )
+        for hora in range(HORAS_DIA)
+    }
+
+
+def _horas(fila):
+    return tuple(fila[f'h{hora}'] or 0 for hora in range(HORAS_DIA))
+
+
+def minutos_apertura(cancha_ids):
+    """{(cancha_id, dia_semana): minutos abiertos por hora} según los horarios activos"""
+    filas = HorarioCancha.objects.filter(
+        id_cancha_id__in=cancha_ids, activo=True
+    ).values('id_cancha', 'dia_semana').annotate(
+        **_minutos_por_hora(_minutos('hora_inicio'), _minutos('hora_fin'))
+    ).order_by()
+    return {(fila['id_cancha'], fila['dia_semana']): _horas(fila) for fila in filas}
+
+
+def minutos_reservados(cancha_ids, fecha_desde, fecha_hasta):
+    """{(cancha_id, fecha): minutos reservados por hora} en una sola consulta agregada"""
+    filas = Reserva.objects.filter(
+        id_cancha_id__in=cancha_ids,
+        fecha_reserva__range=(fecha_desde, fecha_hasta),
+        estado__in=ESTADOS_OCUPADOS,
+    ).values('id_cancha', 'fecha_reserva').annotate(
+        **_minutos_por_hora(_minutos('hora_inicio'), _minutos('hora_fin'))
+    ).order_by()
+    return {(fila['id_cancha'], fila['fecha_reserva']): _horas(fila) for fila in filas}
+
+
+def consolidar(cancha_ids, fecha_desde, fecha_hasta):
+    """Recalcular el consolidado de ocupación de las canchas en el rango; devuelve las filas escritas"""
+    cancha_ids = list(cancha_ids)
+    apertura = minutos_apertura(cancha_ids)
+    reservados = minutos_reservados(cancha_ids, fecha_desde, fecha_hasta)
+
+    filas = []
+    for cancha_id in cancha_ids:
+        fecha = fecha_desde
+        while fecha <= fecha_hasta:
+            dia_semana = fecha.weekday()
+            abiertos = apertura.get((cancha_id, dia_semana), SIN_MINUTOS)
+            ocupados = reservados.get((cancha_id, fecha), SIN_MINUTOS)
+            for hora in range(HORAS_DIA):
+                if abiertos[hora] or ocupados[hora]:
+                    filas.append(OcupacionCanchaDia(
+                        id_cancha_id=cancha_id,
+                        fecha=fecha,
+                        dia_semana=dia_semana,
+                        hora=hora,
+                        minutos_apertura=abiertos[hora],
+                        minutos_reservados=ocupados[hora],
+                    ))
+            fecha += timedelta(days=1)
+
+    with transaction.atomic():
+        OcupacionCanchaDia.objects.filter(
+            id_cancha_id__in=cancha_ids, fecha__range=(fecha_desde, fecha_hasta)
+        ).delete()
+        OcupacionCanchaDia.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def _porcentaje(reservados, apertura):
+    if not apertura:
+        return None
+    return min(100, round(100 * reservados / apertura))
+
+
+def mapa_calor(cancha_ids, fecha_desde, fecha_hasta):
+    """
+    Ocupación por día de la semana y hora leída del consolidado.
+
+    Devuelve (horas, filas): las horas con apertura o reservas, y por cada día
+    de la semana una fila {'dia_semana', 'dia', 'celdas'} con una celda
+    {'hora', 'apertura', 'reservados', 'porcentaje'} por hora.
+    """
+    agregados = OcupacionCanchaDia.objects.filter(
+        id_cancha_id__in=cancha_ids, fecha__range=(fecha_desde, fecha_hasta)
+    ).values('dia_semana', 'hora').annotate(
+        apertura=Sum('minutos_apertura'), reservados=Sum('minutos_reservados')
+    ).order_by()
+    celdas = {(fila['dia_semana'], fila['hora']): fila for fila in agregados}
+    horas = sorted({hora for _, hora in celdas})
+
+    filas = []
+    for dia_semana, dia in HorarioCancha.DIAS_SEMANA:
+        fila = {'dia_semana': dia_semana, 'dia': dia, 'celdas': []}
+        for hora in horas:
+            celda = celdas.get((dia_semana, hora), {'apertura': 0, 'reservados': 0})
+            fila['celdas'].append({
+                'hora': hora,
+                'apertura': celda['apertura'],
+                'reservados': celda['reservados'],
+                'porcentaje': _porcentaje(celda['reservados'], celda['apertura']),
+            })
+        filas.append(fila)
+    return horas, filas
+
+
+def ocupacion_por_cancha(cancha_ids, fecha_desde, fecha_hasta):
+    """{cancha_id: {'apertura', 'reservados', 'porcentaje'}} totales del rango leídos del consolidado"""
+    agregados = OcupacionCanchaDia.objects.filter(
+        id_cancha_id__in=cancha_ids, fecha__range=(fecha_desde, fecha_hasta)
+    ).values('id_cancha').annotate(
+        apertura=Sum('minutos_apertura'), reservados=Sum('minutos_reservados')
+    ).order_by()
+    return {
+        fila['id_cancha']: {
+            'apertura': fila['apertura'],
+            'reservados': fila['reservados'],
+            'porcentaje': _porcentaje(fila['reservados'], fila['apertura']),
+        }
+        for fila in agregados
+    }
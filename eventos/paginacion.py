@@ -0,0 +1,41 @@
+"""
+Cursores opacos para paginación por clave (keyset).
+
+En vez de OFFSET, cada página pide las filas posteriores a la última clave
+vista, lo que permite recorrer el índice desde ese punto sin contar ni saltar
+las filas anteriores. El cursor es la clave serializada en base64 para que
+viaje en la URL sin que el cliente dependa de su formato.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class _CodificadorCursor(DjangoJSONEncoder):
+    """DjangoJSONEncoder recorta las horas a milisegundos: la clave debe ser exacta"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(valores):
+    """Serializar una lista de valores (fechas incluidas) como cursor para la URL"""
+    texto = json.dumps(list(valores), cls=_CodificadorCursor, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Recuperar la lista de valores de un cursor; None si falta o no es válido"""
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(texto)
+    except (binascii.Error, ValueError):
+        return None
+    return valores if isinstance(valores, list) else None
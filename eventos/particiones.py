@@ -0,0 +1,157 @@
+"""
+Particionado mensual opcional de la tabla notificaciones en MySQL.
+
+Con PARTITION BY RANGE (TO_DAYS(fecha_creacion)) cada mes es una partición
+(p202601, p202602, ... y pmax para lo que venga después). Retirar un mes
+vencido sin no leídas es un DROP PARTITION instantáneo en vez de borrar fila
+por fila (con no leídas, ver retirar_mes), y
+las consultas con un límite sobre fecha_creacion (recientes_de) solo leen
+las particiones que lo cumplen.
+
+MySQL exige que la columna de partición esté en la clave primaria y no admite
+claves foráneas en tablas particionadas. Por eso particionar cambia la clave
+primaria a (id_notificacion, fecha_creacion) y quita las FK de la tabla. El
+borrado en cascada de Django sigue funcionando, porque Django lo hace desde
+Python. Una migración futura que toque esas FK deberá hacerse a mano.
+
+El comando particionar_notificaciones usa estas funciones: la primera vez
+particiona y después, cada mes, agrega los meses que vienen y retira los que
+quedaron fuera de la retención.
+"""
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Notificacion, NotificacionArchivada
+from .notificaciones import depurar_leidas
+
+TABLA = Notificacion._meta.db_table
+FORMATO_PARTICION = 'p%Y%m'
+# Campos que se copian igual a notificaciones_archivo al retirar un mes
+CAMPOS_ARCHIVO = [
+    'id_notificacion', 'id_usuario', 'id_partido', 'tipo', 'mensaje', 'leida', 'fecha_creacion',
+    'id_usuario_relacionado', 'id_mensaje',
+]
+
+
+def _mes(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def _siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _particion(mes):
+    return (
+        f"PARTITION {mes.strftime(FORMATO_PARTICION)} "
+        f"VALUES LESS THAN (TO_DAYS('{_siguiente(mes).isoformat()}'))"
+    )
+
+
+def _adelante(meses):
+    mes = _mes(timezone.now())
+    for _ in range(meses):
+        mes = _siguiente(mes)
+    return mes
+
+
+def _meses(desde, hasta):
+    """Meses desde `desde` hasta `hasta`, ambos incluidos"""
+    mes = _mes(desde)
+    while mes <= hasta:
+        yield mes
+        mes = _siguiente(mes)
+
+
+def particiones():
+    """Meses con partición propia, en orden; lista vacía si la tabla no está particionada"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT PARTITION_NAME FROM information_schema.PARTITIONS '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL '
+            'ORDER BY PARTITION_ORDINAL_POSITION',
+            [TABLA],
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    return [datetime.strptime(nombre, FORMATO_PARTICION).date() for nombre in nombres if nombre != 'pmax']
+
+
+def _claves_foraneas():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS '
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'",
+            [TABLA],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def sql_particionar(meses_futuros):
+    """Sentencias para particionar la tabla por mes, desde su notificación más antigua"""
+    primera = Notificacion.objects.aggregate(primera=Min('fecha_creacion'))['primera']
+    pk = Notificacion._meta.pk.column
+    sentencias = [f'ALTER TABLE {TABLA} DROP FOREIGN KEY {nombre}' for nombre in _claves_foraneas()]
+    # En una sola sentencia: la columna AUTO_INCREMENT no puede quedar sin clave entre medio
+    sentencias.append(f'ALTER TABLE {TABLA} DROP PRIMARY KEY, ADD PRIMARY KEY ({pk}, fecha_creacion)')
+    meses = ',\n  '.join(_particion(mes) for mes in _meses(primera or timezone.now(), _adelante(meses_futuros)))
+    sentencias.append(
+        f'ALTER TABLE {TABLA} PARTITION BY RANGE (TO_DAYS(fecha_creacion)) (\n'
+        f'  {meses},\n  PARTITION pmax VALUES LESS THAN MAXVALUE\n)'
+    )
+    return sentencias
+
+
+def sql_agregar_meses(existentes, meses_futuros):
+    """REORGANIZE de pmax para crear los meses que faltan hasta `meses_futuros` adelante"""
+    nuevos = list(_meses(_siguiente(existentes[-1]), _adelante(meses_futuros))) if existentes else []
+    if not nuevos:
+        return []
+    # pmax está vacía mientras haya meses adelantados: reorganizarla no mueve filas
+    meses = ', '.join(_particion(mes) for mes in nuevos)
+    return [
+        f'ALTER TABLE {TABLA} REORGANIZE PARTITION pmax INTO '
+        f'({meses}, PARTITION pmax VALUES LESS THAN MAXVALUE)'
+    ]
+
+
+def meses_vencidos(existentes, limite):
+    """Meses cuya partición completa es anterior a `limite`"""
+    return [mes for mes in existentes if _siguiente(mes) <= limite.date()]
+
+
+def retirar_mes(mes, archivando=False):
+    """
+    Retirar un mes vencido; devuelve True si se hizo DROP de su partición.
+
+    Igual que depurar_leidas, las no leídas se conservan: siguen en el
+    contador del usuario y en mis_notificaciones. Un mes sin no leídas se
+    retira con DROP PARTITION, copiándolo antes a notificaciones_archivo si se
+    pide. Si le quedan, solo se borran sus leídas por lotes y la partición
+    sigue hasta que se lean; la próxima corrida lo vuelve a intentar. Ningún
+    camino toca los contadores, y nada vuelve a quedar sin leer en un mes
+    vencido entre la revisión y el DROP.
+    """
+    nombre = mes.strftime(FORMATO_PARTICION)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLA} PARTITION ({nombre}) WHERE leida = 0')
+        if cursor.fetchone()[0]:
+            # Los límites de partición son fechas UTC (TO_DAYS sobre el valor guardado)
+            fin = datetime.combine(_siguiente(mes), time.min, tzinfo=dt_timezone.utc)
+            while depurar_leidas(fin, archivando=archivando):
+                pass
+            return False
+        if archivando:
+            campos = Notificacion._meta
+            origen = ', '.join(campos.get_field(campo).column for campo in CAMPOS_ARCHIVO)
+            destino = ', '.join(NotificacionArchivada._meta.get_field(campo).column for campo in CAMPOS_ARCHIVO)
+            archivo = NotificacionArchivada._meta
+            cursor.execute(
+                f'INSERT IGNORE INTO {archivo.db_table} ({destino}, {archivo.get_field("fecha_archivo").column}) '
+                f'SELECT {origen}, %s FROM {TABLA} PARTITION ({nombre})',
+                [connection.ops.adapt_datetimefield_value(timezone.now())],
+            )
+        cursor.execute(f'ALTER TABLE {TABLA} DROP PARTITION {nombre}')
+    return True
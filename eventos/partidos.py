@@ -0,0 +1,183 @@
+"""
+Inscripción en partidos con cupo garantizado por la base de datos.
+
+Partido.num_participantes guarda la cantidad de inscritos. El cupo se toma
+con un solo UPDATE condicional (num_participantes < max_jugadores), que la
+base de datos aplica de forma atómica: si dos jugadores piden el último cupo
+a la vez, solo a uno le afecta una fila. El UPDATE bloquea la fila del partido
+hasta el commit, así que la inscripción posterior queda serializada con él.
+
+El contador puede desviarse si se borran inscripciones por otras vías (admin,
+borrado de usuarios); el comando reconciliar_participantes lo corrige.
+Estos UPDATE no pasan por save(): renuevan fecha_actualizacion a mano para
+que la exportación incremental (modificados_desde) vea el cambio.
+
+También arma el feed de descubrimiento de partidos, paginado por la clave
+(fecha_inicio, id_partido) para recorrer el índice en orden sin OFFSET.
+
+Los puntos de una inscripción y el aviso al organizador no se dan en la
+vista: unirse_partido encola premiar_inscripcion (eventos.tareas).
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache_home import invalidar_home
+from .models import Partido, ParticipantePartido, Usuario
+from .notificaciones import notificar
+from .paginacion import codificar_cursor, decodificar_cursor
+from .tareas import PRIORIDAD_ALTA, tarea
+
+# Partidos por página del feed
+TAMANO_PAGINA_FEED = 20
+PUNTOS_PARTICIPACION = 10
+PUNTOS_POR_PARTICIPANTE = 5
+
+
+def inscribir_participante(partido, usuario):
+    """Ocupar un cupo del partido e inscribir al usuario; ValidationError si está completo o ya inscrito"""
+    try:
+        with transaction.atomic():
+            ocupado = Partido.objects.filter(
+                pk=partido.pk, num_participantes__lt=F('max_jugadores')
+            ).update(num_participantes=F('num_participantes') + 1, fecha_actualizacion=timezone.now())
+            if not ocupado:
+                raise ValidationError('Este partido ya está completo.')
+            participante = ParticipantePartido.objects.create(id_partido=partido, id_usuario=usuario)
+    except IntegrityError:
+        # La restricción única rechazó la inscripción y el rollback devolvió el cupo
+        raise ValidationError('Ya estás inscrito en este partido.')
+    partido.num_participantes += 1
+    return participante
+
+
+def retirar_participante(partido, usuario):
+    """Borrar la inscripción del usuario y liberar su cupo; False si no estaba inscrito"""
+    with transaction.atomic():
+        borrados, _ = ParticipantePartido.objects.filter(id_partido=partido, id_usuario=usuario).delete()
+        if not borrados:
+            return False
+        Partido.objects.filter(
+            pk=partido.pk, num_participantes__gt=0
+        ).update(num_participantes=F('num_participantes') - 1, fecha_actualizacion=timezone.now())
+    partido.num_participantes = max(0, partido.num_participantes - 1)
+    return True
+
+
+@tarea(prioridad=PRIORIDAD_ALTA)
+def premiar_inscripcion(partido_id, usuario_id):
+    """Puntos al jugador que se unió y a su organizador, y el aviso al organizador"""
+    partido = Partido.objects.filter(pk=partido_id).values('id_organizador_id', 'lugar').first()
+    nombre = Usuario.objects.filter(pk=usuario_id).values_list('nombre', flat=True).first()
+    if partido is None or nombre is None:
+        return
+    # UPDATE con F(): dos inscripciones a la vez no se pisan los puntos del organizador
+    Usuario.objects.filter(pk=usuario_id).update(puntos_friendly=F('puntos_friendly') + PUNTOS_PARTICIPACION)
+    Usuario.objects.filter(pk=partido['id_organizador_id']).update(
+        puntos_friendly=F('puntos_friendly') + PUNTOS_POR_PARTICIPANTE
+    )
+    notificar(
+        [partido['id_organizador_id']], partido_id, 'nuevo_participante',
+        f"{nombre} se ha unido a '{partido['lugar']}' (+{PUNTOS_POR_PARTICIPANTE} puntos)",
+        relacionado_id=usuario_id,
+    )
+
+
+def conteo_real():
+    """Subconsulta con la cantidad de inscripciones de cada partido"""
+    inscritos = ParticipantePartido.objects.filter(
+        id_partido=OuterRef('pk')
+    ).order_by().values('id_partido').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(inscritos), Value(0))
+
+
+def partidos_desviados(desde_pk, hasta_pk):
+    """Partidos del rango [desde_pk, hasta_pk) cuyo contador no coincide con sus inscripciones"""
+    return Partido.objects.filter(pk__gte=desde_pk, pk__lt=hasta_pk).annotate(
+        real=conteo_real()
+    ).exclude(num_participantes=F('real'))
+
+
+def reconciliar_participantes(desde_pk, hasta_pk):
+    """Corregir el contador de los partidos desviados del rango; devuelve los corregidos"""
+    ids = list(partidos_desviados(desde_pk, hasta_pk).values_list('pk', flat=True))
+    if ids:
+        Partido.objects.filter(pk__in=ids).update(num_participantes=conteo_real(), fecha_actualizacion=timezone.now())
+        # El UPDATE masivo no emite señales: los contadores de la portada se renuevan aquí
+        invalidar_home()
+    return len(ids)
+
+
+def _leer_cursor_feed(cursor):
+    """(fecha_inicio, id_partido) de un cursor del feed; None si no es válido"""
+    valores = decodificar_cursor(cursor)
+    if not valores or len(valores) != 2 or not isinstance(valores[1], int):
+        return None
+    if valores[0] is None:
+        return None, valores[1]
+    try:
+        fecha = parse_datetime(valores[0])
+    except (TypeError, ValueError):
+        # No es texto, o es una fecha imposible (mes 13)
+        return None
+    return (fecha, valores[1]) if fecha else None
+
+
+def feed_partidos(localidad_id=None, solo_proximos=True, fecha_desde=None, fecha_hasta=None,
+                  cupos_minimos=0, cursor=None, tamano=TAMANO_PAGINA_FEED, consulta=None):
+    """
+    Página del feed de partidos vigentes; devuelve (partidos, cursor_siguiente).
+
+    Todos los filtros se aplican en SQL. Los próximos se ordenan del más
+    cercano al más lejano; sin ese filtro, del más reciente al más antiguo
+    con los partidos sin fecha al final (orden natural de NULL en MySQL y
+    SQLite). Los cupos se comparan contra max_jugadores en la misma fila,
+    columnas que incluye el índice del listado.
+    
+    consulta permite partir de un queryset propio (por ejemplo con only()),
+    que debe leer fecha_inicio e id_partido para armar el cursor.
+    """
+    if consulta is None:
+        consulta = Partido.objects.select_related('id_organizador', 'id_localidad')
+    partidos = consulta.filter(archivado=False)
+    if localidad_id:
+        partidos = partidos.filter(id_localidad_id=localidad_id)
+    if solo_proximos:
+        partidos = partidos.filter(fecha_inicio__gte=timezone.now())
+    if fecha_desde:
+        partidos = partidos.filter(fecha_inicio__gte=fecha_desde)
+    if fecha_hasta:
+        partidos = partidos.filter(fecha_inicio__lt=fecha_hasta)
+    if cupos_minimos:
+        partidos = partidos.filter(num_participantes__lte=F('max_jugadores') - cupos_minimos)
+
+    clave = _leer_cursor_feed(cursor)
+    if solo_proximos and clave and clave[0] is None:
+        # Los próximos siempre tienen fecha: un cursor sin ella es de otro orden y se ignora como inválido
+        clave = None
+    if solo_proximos:
+        if clave:
+            fecha, pk = clave
+            partidos = partidos.filter(Q(fecha_inicio__gt=fecha) | Q(fecha_inicio=fecha, id_partido__gt=pk))
+        partidos = partidos.order_by('fecha_inicio', 'id_partido')
+    else:
+        if clave:
+            fecha, pk = clave
+            if fecha is None:
+                partidos = partidos.filter(fecha_inicio__isnull=True, id_partido__lt=pk)
+            else:
+                partidos = partidos.filter(
+                    Q(fecha_inicio__lt=fecha) | Q(fecha_inicio=fecha, id_partido__lt=pk) | Q(fecha_inicio__isnull=True)
+                )
+        partidos = partidos.order_by('-fecha_inicio', '-id_partido')
+
+    # Una fila extra indica si hay página siguiente sin contar el total
+    pagina = list(partidos[:tamano + 1])
+    siguiente = None
+    if len(pagina) > tamano:
+        pagina = pagina[:tamano]
+        siguiente = codificar_cursor([pagina[-1].fecha_inicio, pagina[-1].id_partido])
+    return pagina, siguiente
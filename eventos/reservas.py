@@ -0,0 +1,140 @@
+"""
+Creación de reservas segura ante concurrencia.
+
+Reserva.clean() revisa solapamientos leyendo en Python y luego se inserta, por
+lo que dos solicitudes simultáneas pueden pasar la validación y reservar el
+mismo horario. Aquí la validación y el INSERT se ejecutan dentro de una
+transacción que primero toma el bloqueo de la fila BloqueoCanchaDia de esa
+cancha y fecha, de modo que solo se serializan las reservas del mismo día y
+cancha, no toda la tabla. La fila se crea antes, fuera de esa transacción.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache_disponibilidad import invalidar_dia
+from .disponibilidad import actualizar_materializado
+from .models import BloqueoCanchaDia, Reserva
+
+
+def asegurar_bloqueos(cancha_id, fechas):
+    """
+    Crear las filas de bloqueo que falten, en una transacción corta propia.
+
+    Se llama antes del bloque atómico que toma el bloqueo: si la fila se
+    creara dentro de él, en MySQL (REPEATABLE READ) dos primeras reservas del
+    mismo día tomarían bloqueos de hueco y chocarían en un deadlock, o la
+    relectura tras el INSERT fallaría con IntegrityError. Aquí el INSERT
+    IGNORE confirma enseguida y la carrera entre dos creadores es inofensiva.
+    """
+    fechas = set(fechas)
+    existentes = set(BloqueoCanchaDia.objects.filter(
+        id_cancha_id=cancha_id, fecha__in=fechas
+    ).values_list('fecha', flat=True))
+    faltantes = sorted(fechas - existentes)
+    if faltantes:
+        with transaction.atomic():
+            BloqueoCanchaDia.objects.bulk_create(
+                [BloqueoCanchaDia(id_cancha_id=cancha_id, fecha=fecha) for fecha in faltantes],
+                ignore_conflicts=True
+            )
+
+
+def bloquear_cancha_dias(cancha_id, fechas):
+    """
+    Tomar el bloqueo de (cancha, fecha) para cada fecha dentro de la transacción actual.
+
+    Las filas deben existir (asegurar_bloqueos). El UPDATE las deja bloqueadas
+    en modo exclusivo hasta el commit, igual que un SELECT ... FOR UPDATE, y
+    además funciona en SQLite, donde select_for_update no tiene efecto.
+    """
+    fechas = sorted(set(fechas))
+    actualizadas = BloqueoCanchaDia.objects.filter(
+        id_cancha_id=cancha_id, fecha__in=fechas
+    ).update(version=F('version') + 1)
+    if actualizadas < len(fechas):
+        # Solo pasa si la cancha se borró entre medio (las filas caen en cascada)
+        raise ValidationError('La cancha ya no está disponible para reservas.')
+
+
+def bloquear_cancha_dia(cancha_id, fecha):
+    """Tomar el bloqueo de una sola (cancha, fecha)"""
+    bloquear_cancha_dias(cancha_id, [fecha])
+
+
+def refrescar_disponibilidad(cancha_id, fechas):
+    """Actualizar la disponibilidad materializada y la caché tras escrituras masivas (sin señales)"""
+    if not fechas:
+        return
+    actualizar_materializado(cancha_id, fechas)
+    for fecha in set(fechas):
+        invalidar_dia(cancha_id, fecha)
+
+
+def confirmar_reserva(reserva):
+    """Validar y guardar una reserva bajo el bloqueo de su cancha y día"""
+    # Validar campos antes de tomar el bloqueo (requiere cancha y fecha válidas)
+    reserva.clean_fields()
+    asegurar_bloqueos(reserva.id_cancha_id, [reserva.fecha_reserva])
+    with transaction.atomic():
+        bloquear_cancha_dia(reserva.id_cancha_id, reserva.fecha_reserva)
+        reserva.full_clean()
+        reserva.save()
+    return reserva
+
+
+def crear_serie(serie):
+    """
+    Crear una serie recurrente y sus reservas en una sola transacción.
+
+    Los choques de todas las ocurrencias se buscan con una sola consulta y las
+    fechas libres se insertan con bulk_create. Retorna (reservas_creadas,
+    fechas_en_conflicto); si no queda ninguna fecha libre no se crea nada.
+    """
+    serie.full_clean()
+    fechas = serie.fechas()
+    asegurar_bloqueos(serie.id_cancha_id, fechas)
+    with transaction.atomic():
+        bloquear_cancha_dias(serie.id_cancha_id, fechas)
+        conflictos = set(Reserva.objects.filter(
+            id_cancha_id=serie.id_cancha_id,
+            fecha_reserva__in=fechas,
+            estado='confirmada',
+            hora_inicio__lt=serie.hora_fin,
+            hora_fin__gt=serie.hora_inicio,
+        ).values_list('fecha_reserva', flat=True))
+        libres = [fecha for fecha in fechas if fecha not in conflictos]
+        if not libres:
+            raise ValidationError('Todas las fechas de la serie ya están reservadas en ese horario.')
+
+        serie.save()
+        reservas = Reserva.objects.bulk_create([
+            Reserva(
+                id_cancha_id=serie.id_cancha_id,
+                id_recinto_id=serie.id_recinto_id,
+                id_usuario_id=serie.id_usuario_id,
+                fecha_reserva=fecha,
+                hora_inicio=serie.hora_inicio,
+                hora_fin=serie.hora_fin,
+                notas=serie.notas,
+                id_serie=serie,
+            ) for fecha in libres
+        ])
+        refrescar_disponibilidad(serie.id_cancha_id, libres)
+    return reservas, sorted(conflictos)
+
+
+def cancelar_serie(serie):
+    """Cancelar la serie y todas sus reservas futuras con un solo UPDATE"""
+    hoy = timezone.localdate()
+    with transaction.atomic():
+        canceladas = Reserva.objects.filter(
+            id_serie=serie,
+            estado='confirmada',
+            fecha_reserva__gte=hoy
+        ).update(estado='cancelada')
+        serie.estado = 'cancelada'
+        serie.save(update_fields=['estado', 'fecha_actualizacion'])
+        refrescar_disponibilidad(serie.id_cancha_id, [fecha for fecha in serie.fechas() if fecha >= hoy])
+    return canceladas
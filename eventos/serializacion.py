@@ -0,0 +1,123 @@
+"""
+Campos de la API JSON de solo lectura y su serialización.
+
+Cada campo público declara las columnas que necesita y, si sale de una
+relación, la relación a unir; con ?fields= la consulta lee solo esas columnas
+(only) y une solo esas tablas (select_related). De los usuarios se publica
+únicamente lo que ya es visible en el sitio: nunca el email.
+
+Las exportaciones grandes se escriben como un flujo: se leen lotes por rango
+de clave primaria y cada objeto se serializa y se envía antes de leer el
+siguiente lote, sin armar la lista completa en memoria.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+
+TAMANO_LOTE_EXPORTACION = 500
+
+
+def _fecha(valor):
+    return valor.isoformat() if valor else None
+
+
+def _usuario(usuario):
+    return {'id_usuario': usuario.id_usuario, 'nombre': usuario.nombre, 'apellido': usuario.apellido}
+
+
+# nombre: (columnas para only(), relaciones para select_related(), valor)
+CAMPOS_PARTIDO = {
+    'id_partido': (('id_partido',), (), lambda p: p.id_partido),
+    'lugar': (('lugar',), (), lambda p: p.lugar),
+    'descripcion': (('descripcion',), (), lambda p: p.descripcion),
+    'fecha_inicio': (('fecha_inicio',), (), lambda p: _fecha(p.fecha_inicio)),
+    'max_jugadores': (('max_jugadores',), (), lambda p: p.max_jugadores),
+    'num_participantes': (('num_participantes',), (), lambda p: p.num_participantes),
+    'cupos': (('num_participantes', 'max_jugadores'), (), lambda p: p.espacios_disponibles()),
+    'archivado': (('archivado',), (), lambda p: p.archivado),
+    'localidad': (
+        ('id_localidad__id_localidad', 'id_localidad__nombre'), ('id_localidad',),
+        lambda p: {'id_localidad': p.id_localidad.id_localidad, 'nombre': p.id_localidad.nombre},
+    ),
+    'organizador': (
+        ('id_organizador__id_usuario', 'id_organizador__nombre', 'id_organizador__apellido'), ('id_organizador',),
+        lambda p: _usuario(p.id_organizador),
+    ),
+    'fecha_actualizacion': (('fecha_actualizacion',), (), lambda p: _fecha(p.fecha_actualizacion)),
+    'url': (('id_partido',), (), lambda p: reverse('detalle_partido', args=[p.id_partido])),
+}
+CAMPOS_PARTIDO_DEFECTO = (
+    'id_partido', 'lugar', 'fecha_inicio', 'localidad', 'num_participantes', 'max_jugadores', 'url',
+)
+
+CAMPOS_PARTICIPANTE = {
+    'id_participante': (('id_participante',), (), lambda p: p.id_participante),
+    'fecha_registro': (('fecha_registro',), (), lambda p: _fecha(p.fecha_registro)),
+    'usuario': (
+        ('id_usuario__id_usuario', 'id_usuario__nombre', 'id_usuario__apellido'), ('id_usuario',),
+        lambda p: _usuario(p.id_usuario),
+    ),
+    'puntos_friendly': (
+        ('id_usuario__id_usuario', 'id_usuario__puntos_friendly'), ('id_usuario',),
+        lambda p: p.id_usuario.puntos_friendly,
+    ),
+}
+CAMPOS_PARTICIPANTE_DEFECTO = ('id_participante', 'usuario', 'fecha_registro')
+
+
+def campos_pedidos(texto, disponibles, por_defecto):
+    """Campos de ?fields= (separados por comas) en orden; ValueError si alguno no existe"""
+    if not texto:
+        return list(por_defecto)
+    campos = list(dict.fromkeys(campo.strip() for campo in texto.split(',') if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in disponibles]
+    if desconocidos or not campos:
+        raise ValueError(
+            f'Campos desconocidos: {", ".join(desconocidos) or "(vacío)"}. '
+            f'Disponibles: {", ".join(disponibles)}'
+        )
+    return campos
+
+
+def preparar_consulta(consulta, disponibles, campos, siempre=()):
+    """Restringir la consulta a las columnas y relaciones de los campos pedidos"""
+    columnas = set(siempre)
+    relaciones = set()
+    for campo in campos:
+        columnas_campo, relaciones_campo, _ = disponibles[campo]
+        columnas.update(columnas_campo)
+        relaciones.update(relaciones_campo)
+    # La clave foránea de cada relación unida debe estar entre las columnas leídas
+    columnas.update(relaciones)
+    consulta = consulta.select_related(*relaciones) if relaciones else consulta.select_related(None)
+    return consulta.only(*columnas)
+
+
+def serializar(objeto, disponibles, campos):
+    return {campo: disponibles[campo][2](objeto) for campo in campos}
+
+
+def por_lotes(consulta, tamano=TAMANO_LOTE_EXPORTACION):
+    """Recorrer la consulta en orden de clave primaria, un lote por SELECT"""
+    ultimo = None
+    while True:
+        lote = consulta.order_by('pk')
+        if ultimo is not None:
+            lote = lote.filter(pk__gt=ultimo)
+        lote = list(lote[:tamano])
+        yield from lote
+        if len(lote) < tamano:
+            return
+        ultimo = lote[-1].pk
+
+
+def flujo_json(objetos, disponibles, campos, **encabezado):
+    """Generador de un documento JSON {..encabezado, "resultados": [...]} escrito por partes"""
+    codificador = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    inicio = codificador.encode({**encabezado, 'resultados': []})
+    # Todo menos el cierre "]}" del documento vacío
+    yield inicio[:-2]
+    separador = ''
+    for objeto in objetos:
+        yield separador + codificador.encode(serializar(objeto, disponibles, campos))
+        separador = ','
+    yield ']}'
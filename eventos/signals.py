@@ -0,0 +1,120 @@
+"""
+Señales que mantienen al día los datos derivados de reservas, horarios y partidos.
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache_disponibilidad import invalidar_cancha, invalidar_dia
+from .avisos import avisar_usuarios, sumar_no_leidas
+from .cache_home import invalidar_home
+from .chat import crear_lecturas
+from .disponibilidad import actualizar_materializado
+from .models import (
+    Cancha, HorarioCancha, LecturaChat, Localidad, Notificacion, Partido, ParticipantePartido, Recinto, Reserva,
+    Usuario,
+)
+
+
+def borrado_de_cancha(origin):
+    """True si el borrado viene en cascada desde la cancha (o su recinto/localidad)"""
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return modelo in (Cancha, Recinto, Localidad)
+
+
+@receiver(pre_save, sender=Reserva)
+def recordar_dia_reserva(sender, instance, raw=False, **kwargs):
+    """Guardar cancha y fecha previas para recalcular también el día anterior si cambian"""
+    instance._dia_anterior = None
+    if instance.pk and not raw:
+        instance._dia_anterior = Reserva.objects.filter(pk=instance.pk).values_list(
+            'id_cancha_id', 'fecha_reserva'
+        ).first()
+
+
+@receiver(post_save, sender=Reserva)
+def actualizar_disponibilidad_reserva(sender, instance, raw=False, **kwargs):
+    """Recalcular la disponibilidad materializada y la versión de caché del día de la reserva"""
+    if raw:
+        return
+    anterior = getattr(instance, '_dia_anterior', None)
+    if anterior and anterior != (instance.id_cancha_id, instance.fecha_reserva):
+        actualizar_materializado(anterior[0], [anterior[1]])
+        invalidar_dia(anterior[0], anterior[1])
+    actualizar_materializado(instance.id_cancha_id, [instance.fecha_reserva])
+    invalidar_dia(instance.id_cancha_id, instance.fecha_reserva)
+
+
+@receiver(post_delete, sender=Reserva)
+def liberar_disponibilidad_reserva(sender, instance, origin=None, **kwargs):
+    invalidar_dia(instance.id_cancha_id, instance.fecha_reserva)
+    if not borrado_de_cancha(origin):
+        actualizar_materializado(instance.id_cancha_id, [instance.fecha_reserva])
+
+
+@receiver(post_save, sender=HorarioCancha)
+def actualizar_disponibilidad_horario(sender, instance, raw=False, **kwargs):
+    """Un cambio de horario afecta a todas las fechas de la cancha en el horizonte"""
+    if not raw:
+        actualizar_materializado(instance.id_cancha_id)
+        invalidar_cancha(instance.id_cancha_id)
+
+
+@receiver(post_delete, sender=HorarioCancha)
+def quitar_disponibilidad_horario(sender, instance, origin=None, **kwargs):
+    invalidar_cancha(instance.id_cancha_id)
+    if not borrado_de_cancha(origin):
+        actualizar_materializado(instance.id_cancha_id)
+
+
+@receiver(post_save, sender=Partido)
+@receiver(post_delete, sender=Partido)
+@receiver(post_save, sender=ParticipantePartido)
+@receiver(post_delete, sender=ParticipantePartido)
+def invalidar_feed_home(sender, raw=False, **kwargs):
+    """Cualquier cambio en partidos o inscripciones puede alterar el feed de la portada"""
+    if not raw:
+        invalidar_home()
+
+
+@receiver(post_save, sender=Partido)
+def abrir_chat_organizador(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        crear_lecturas(instance.pk, [instance.id_organizador_id])
+
+
+@receiver(post_save, sender=ParticipantePartido)
+def abrir_chat_participante(sender, instance, created=False, raw=False, **kwargs):
+    """Quien se inscribe empieza a acumular mensajes sin leer desde ahora"""
+    if created and not raw:
+        crear_lecturas(instance.id_partido_id, [instance.id_usuario_id])
+
+
+@receiver(post_delete, sender=ParticipantePartido)
+def cerrar_chat_participante(sender, instance, origin=None, **kwargs):
+    # En el borrado en cascada del partido o del usuario las lecturas ya se van con él
+    if isinstance(origin, ParticipantePartido) or (
+        isinstance(origin, QuerySet) and origin.model is ParticipantePartido
+    ):
+        LecturaChat.objects.filter(
+            id_partido_id=instance.id_partido_id, id_usuario_id=instance.id_usuario_id
+        ).exclude(id_partido__id_organizador_id=instance.id_usuario_id).delete()
+        avisar_usuarios([instance.id_usuario_id])
+
+
+@receiver(post_save, sender=Notificacion)
+def contar_notificacion_nueva(sender, instance, created=False, raw=False, **kwargs):
+    """Una notificación nueva sin leer suma uno al contador del destinatario"""
+    if raw:
+        return
+    if created and not instance.leida:
+        sumar_no_leidas({instance.id_usuario_id: 1})
+    else:
+        avisar_usuarios([instance.id_usuario_id])
+
+
+@receiver(post_delete, sender=Notificacion)
+def descontar_notificacion_borrada(sender, instance, origin=None, **kwargs):
+    # Si se borra el propio usuario no hay contador que corregir
+    if not instance.leida and not isinstance(origin, Usuario):
+        sumar_no_leidas({instance.id_usuario_id: -1})
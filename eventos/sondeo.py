@@ -0,0 +1,94 @@
+"""
+Sondeo compartido de claves de la caché para los flujos Server-Sent Events.
+
+Cada flujo abierto espera a que cambie una clave (el último mensaje de un
+chat, la versión de avisos de un usuario). En vez de que cada flujo lea su
+clave cada pocos segundos, un solo sondeo por proceso y por intervalo lee
+con get_many todas las claves que alguien espera y despierta a los flujos
+cuya clave cambió. Con mil pestañas abiertas la caché recibe una lectura
+por intervalo, no mil.
+
+La lectura corre en el ejecutor de hilos del loop (thread_sensitive=False):
+no hace fila en el hilo donde el proceso ASGI ejecuta las vistas síncronas.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+@sync_to_async(thread_sensitive=False)
+def _leer_claves(claves):
+    try:
+        return cache.get_many(claves)
+    except DatabaseError:
+        # Con DatabaseCache, una conexión cortada en este hilo no la cierra ninguna solicitud
+        connections.close_all()
+        raise
+
+
+class SondeoCache:
+    """Una lectura de la caché por intervalo para todos los flujos del proceso"""
+
+    def __init__(self, ajuste, intervalo_defecto):
+        # El intervalo se lee al sondear para que override_settings y el entorno valgan
+        self.ajuste = ajuste
+        self.intervalo_defecto = intervalo_defecto
+        self._loop = None
+        self._tarea = None
+        self._esperas = defaultdict(list)
+
+    @property
+    def intervalo(self):
+        return getattr(settings, self.ajuste, self.intervalo_defecto)
+
+    async def leer(self, clave):
+        """Valor actual de una clave, fuera del hilo de las vistas síncronas"""
+        return (await _leer_claves([clave])).get(clave)
+
+    async def esperar(self, clave, conocido, espera):
+        """El valor de `clave` en cuanto difiera de `conocido`; `conocido` si pasan `espera` segundos sin cambios"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Un loop nuevo (otro worker, otra prueba): las esperas del anterior ya no existen
+            self._loop, self._tarea, self._esperas = loop, None, defaultdict(list)
+        futuro = loop.create_future()
+        entrada = (conocido, futuro)
+        self._esperas[clave].append(entrada)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = loop.create_task(self._sondear())
+        try:
+            return await asyncio.wait_for(futuro, espera)
+        except asyncio.TimeoutError:
+            return conocido
+        finally:
+            esperas = self._esperas.get(clave)
+            if esperas is not None:
+                esperas.remove(entrada)
+                if not esperas:
+                    del self._esperas[clave]
+
+    async def _sondear(self):
+        # Termina cuando nadie espera; la próxima espera lo vuelve a lanzar
+        while self._esperas:
+            await asyncio.sleep(self.intervalo)
+            claves = list(self._esperas)
+            if not claves:
+                continue
+            try:
+                valores = await _leer_claves(claves)
+            except Exception:
+                # Caché caída: los flujos siguen con sus latidos y se reintenta en el próximo intervalo
+                logger.exception('Sondeo de %d claves falló', len(claves))
+                continue
+            for clave in claves:
+                valor = valores.get(clave)
+                for conocido, futuro in self._esperas.get(clave, ()):
+                    if valor != conocido and not futuro.done():
+                        futuro.set_result(valor)
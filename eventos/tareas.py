@@ -0,0 +1,189 @@
+"""
+Cola de tareas diferidas guardada en la misma base de datos.
+
+Las vistas encolan con encolar() lo que no hace falta para responder (puntos,
+avisos a muchos destinatarios) y el comando procesar_tareas lo ejecuta aparte,
+así un POST solo paga las escrituras esenciales. La tarea se inserta dentro
+de la transacción de la vista: si la vista se revierte, la tarea no existe.
+
+Tomar tareas es un SELECT ... FOR UPDATE SKIP LOCKED (MySQL 8, PostgreSQL)
+seguido de un UPDATE condicionado a estado='pendiente' que deja en la fila
+una marca única de la toma. En motores sin SKIP LOCKED (SQLite) el UPDATE
+condicionado basta para que dos trabajadores no ejecuten la misma tarea.
+
+Una tarea que falla vuelve a 'pendiente' con espera exponencial hasta
+max_intentos; después queda 'fallida' con el último error. Solo se ejecutan
+funciones marcadas con @tarea, nunca una ruta arbitraria leída de la tabla.
+
+Una tarea en curso por más de TAREAS_TIEMPO_MAXIMO se da por colgada y otro
+trabajador puede tomarla aunque la primera ejecución siga viva. Cada cierre
+(completada, reintento, fallida) exige la marca de la toma, y la tarea se
+confirma en la misma transacción que su cierre. Si la toma ya no es la
+vigente, lo hecho se revierte: el efecto en la base queda una sola vez.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+PRIORIDAD_ALTA = 10
+PRIORIDAD_NORMAL = 50
+PRIORIDAD_BAJA = 90
+MAX_INTENTOS = 5
+ESPERA_BASE_SEGUNDOS = 10
+ESPERA_MAXIMA_SEGUNDOS = 60 * 60
+
+
+def tarea(funcion=None, *, prioridad=PRIORIDAD_NORMAL, max_intentos=MAX_INTENTOS):
+    """Marcar una función como ejecutable por la cola; admite @tarea y @tarea(prioridad=...)"""
+    def marcar(funcion):
+        funcion.es_tarea = True
+        funcion.prioridad_tarea = prioridad
+        funcion.max_intentos_tarea = max_intentos
+        return funcion
+    return marcar(funcion) if funcion is not None else marcar
+
+
+def _ruta(funcion):
+    return f'{funcion.__module__}.{funcion.__qualname__}'
+
+
+def encolar(funcion, /, *, prioridad=None, retraso=None, **argumentos):
+    """
+    Encolar funcion(**argumentos); los argumentos deben poder guardarse como JSON.
+
+    Con TAREAS_EN_LINEA (desarrollo sin trabajador) se ejecuta al confirmar la
+    transacción en lugar de encolarse.
+    """
+    if not getattr(funcion, 'es_tarea', False):
+        raise ValueError(f'{_ruta(funcion)} no está marcada con @tarea')
+    if getattr(settings, 'TAREAS_EN_LINEA', False):
+        transaction.on_commit(lambda: funcion(**argumentos))
+        return None
+    return Tarea.objects.create(
+        funcion=_ruta(funcion),
+        argumentos=argumentos,
+        prioridad=funcion.prioridad_tarea if prioridad is None else prioridad,
+        max_intentos=funcion.max_intentos_tarea,
+        ejecutar_desde=timezone.now() + (retraso or timedelta()),
+    )
+
+
+def tomar_tareas(trabajador, cantidad=1):
+    """Reservar hasta `cantidad` tareas listas, por prioridad y antigüedad"""
+    marca = f'{trabajador}:{uuid.uuid4().hex[:8]}'[:100]
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Tarea.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', ejecutar_desde__lte=ahora)
+            .order_by('prioridad', 'ejecutar_desde', 'id_tarea')
+            .values_list('pk', flat=True)[:cantidad]
+        )
+        if not ids:
+            return []
+        Tarea.objects.filter(pk__in=ids, estado='pendiente').update(
+            estado='en_curso', tomada_en=ahora, trabajador=marca, intentos=F('intentos') + 1,
+        )
+    return list(Tarea.objects.filter(trabajador=marca, estado='en_curso').order_by('prioridad', 'ejecutar_desde'))
+
+
+def _espera(intentos):
+    segundos = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * 2 ** (intentos - 1))
+    # Con variación para que las tareas que fallaron juntas no reintenten juntas
+    return timedelta(seconds=segundos * random.uniform(0.8, 1.2))
+
+
+def _resolver(ruta):
+    funcion = import_string(ruta)
+    if not getattr(funcion, 'es_tarea', False):
+        raise ValueError(f'{ruta} no está marcada con @tarea')
+    return funcion
+
+
+class TomaVencida(Exception):
+    """La tarea se dio por colgada y otro trabajador la tomó mientras esta ejecución seguía"""
+
+
+def _de_esta_toma(tarea):
+    # Solo la toma vigente cierra la tarea: una recuperada y vuelta a tomar lleva otra marca
+    return Tarea.objects.filter(pk=tarea.pk, trabajador=tarea.trabajador, estado='en_curso')
+
+
+def ejecutar_tarea(tarea):
+    """Ejecutar una tarea tomada; devuelve True si terminó bien"""
+    try:
+        funcion = _resolver(tarea.funcion)
+    except (ImportError, ValueError) as error:
+        # Reintentar no la va a arreglar
+        _de_esta_toma(tarea).update(
+            estado='fallida', ultimo_error=str(error), fecha_fin=timezone.now()
+        )
+        logger.error('Tarea %s descartada: %s', tarea.pk, error)
+        return False
+
+    try:
+        # La tarea y su cierre se confirman juntos: o queda hecha y completada, o nada
+        with transaction.atomic():
+            funcion(**tarea.argumentos)
+            if not _de_esta_toma(tarea).update(estado='completada', ultimo_error='', fecha_fin=timezone.now()):
+                raise TomaVencida
+        return True
+    except TomaVencida:
+        logger.warning('Tarea %s (%s) la tomó otro trabajador; esta ejecución se revierte', tarea.pk, tarea.funcion)
+        return False
+    except Exception:
+        error = traceback.format_exc()
+        if tarea.intentos >= tarea.max_intentos:
+            _de_esta_toma(tarea).update(
+                estado='fallida', ultimo_error=error, fecha_fin=timezone.now()
+            )
+            logger.error('Tarea %s (%s) falló %s veces', tarea.pk, tarea.funcion, tarea.intentos)
+        else:
+            _de_esta_toma(tarea).update(
+                estado='pendiente', ultimo_error=error, ejecutar_desde=timezone.now() + _espera(tarea.intentos)
+            )
+            logger.warning('Tarea %s (%s) falló, intento %s', tarea.pk, tarea.funcion, tarea.intentos)
+        return False
+
+
+def procesar_lote(trabajador, cantidad=1):
+    """Tomar y ejecutar hasta `cantidad` tareas; devuelve cuántas se tomaron"""
+    tareas = tomar_tareas(trabajador, cantidad)
+    for tarea in tareas:
+        ejecutar_tarea(tarea)
+    return len(tareas)
+
+
+def recuperar_colgadas():
+    """Devolver a la cola las tareas de un trabajador que murió a mitad; devuelve cuántas"""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'TAREAS_TIEMPO_MAXIMO', 600))
+    colgadas = Tarea.objects.filter(estado='en_curso', tomada_en__lt=limite)
+    agotadas = colgadas.filter(intentos__gte=F('max_intentos')).update(
+        estado='fallida', ultimo_error='Sin respuesta del trabajador', fecha_fin=timezone.now()
+    )
+    return agotadas + colgadas.update(estado='pendiente', ejecutar_desde=timezone.now())
+
+
+def purgar_completadas(lote=1000):
+    """Borrar por lotes las completadas más viejas que TAREAS_RETENCION_DIAS; devuelve cuántas"""
+    limite = timezone.now() - timedelta(days=getattr(settings, 'TAREAS_RETENCION_DIAS', 7))
+    total = 0
+    while True:
+        ids = list(
+            Tarea.objects.filter(estado='completada', fecha_fin__lt=limite).values_list('pk', flat=True)[:lote]
+        )
+        if not ids:
+            return total
+        total += Tarea.objects.filter(pk__in=ids).delete()[0]
@@ -1,3 +1,1366 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from functools import partial
+from io import StringIO
+from unittest import mock, skipUnless
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.middleware import auser, get_user
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from . import cache_disponibilidad, cache_home, cercania, disponibilidad, notificaciones, sondeo as sondeo_modulo, urls
+from .avisos import cambios_avisos, contar_no_leidos, notificaciones_no_leidas, reconciliar_no_leidas
+from .chat import BrokerCache, crear_mensaje, marcar_leido
+from .models import (
+    Usuario, Localidad, Recinto, Cancha, HorarioCancha, Reserva, BloqueoCanchaDia, DisponibilidadCanchaDia, Partido,
+    ParticipantePartido, LecturaChat, MensajePartido, Notificacion, NotificacionArchivada, Equipo, MiembroEquipo,
+    PartidoCompetitivo, InvitacionEquipo, OcupacionCanchaDia, Tarea,
+)
+from .disponibilidad import disponibilidad_canchas, slots_desde_mapa
+from .management.commands import barrer_ciclo_vida
+from .middleware import ConsultasMiddleware
+from .notificaciones import avisar_organizador, avisar_participantes, depurar_leidas, limite_retencion, notificar
+from .ocupacion import mapa_calor, ocupacion_por_cancha
+from .paginacion import codificar_cursor
+from .particiones import particiones, retirar_mes, sql_particionar
+from .partidos import inscribir_participante, retirar_participante
+from .reservas import asegurar_bloqueos, confirmar_reserva
+from .sondeo import SondeoCache
+from .tareas import (
+    ESPERA_BASE_SEGUNDOS, PRIORIDAD_ALTA, PRIORIDAD_BAJA, ejecutar_tarea, encolar, procesar_lote, recuperar_colgadas,
+    tarea, tomar_tareas,
+)
+
+
+class DatosReserva:
+    """Cancha con horario de 9:00 a 22:00 para mañana y HILOS usuarios"""
+    HILOS = 2
+
+    def setUp(self):
+        localidad = Localidad.objects.create(nombre='Santiago Centro')
+        self.recinto = Recinto.objects.create(nombre='Complejo Central', direccion='Av. Siempre Viva 123', id_localidad=localidad)
+        self.cancha = Cancha.objects.create(nombre='Cancha 1', id_recinto=self.recinto)
+        self.fecha = timezone.now().date() + timedelta(days=1)
+        HorarioCancha.objects.create(
+            id_cancha=self.cancha,
+            dia_semana=self.fecha.weekday(),
+            hora_inicio=time(9, 0),
+            hora_fin=time(22, 0),
+        )
+        self.usuarios = [
+            Usuario.objects.create_user(f'jugador{i}@nf1.cl', 'Jugador', str(i), 'clave123')
+            for i in range(self.HILOS)
+        ]
+
+    def _reservar(self, usuario, hora_inicio, hora_fin):
+        return confirmar_reserva(Reserva(
+            id_cancha=self.cancha,
+            id_recinto=self.recinto,
+            id_usuario=usuario,
+            fecha_reserva=self.fecha,
+            hora_inicio=hora_inicio,
+            hora_fin=hora_fin,
+        ))
+
+
+class ReservaTest(DatosReserva, TestCase):
+
+    def test_primera_reserva_crea_el_bloqueo(self):
+        self._reservar(self.usuarios[0], time(20, 0), time(21, 0))
+        bloqueo = BloqueoCanchaDia.objects.get(id_cancha=self.cancha, fecha=self.fecha)
+        self.assertEqual(bloqueo.version, 1)
+        with self.assertRaises(ValidationError):
+            self._reservar(self.usuarios[1], time(20, 30), time(21, 30))
+        self._reservar(self.usuarios[1], time(21, 0), time(22, 0))
+        # El intento rechazado se revirtió junto con su incremento
+        bloqueo.refresh_from_db()
+        self.assertEqual(bloqueo.version, 2)
+        # Volver a asegurar no duplica ni reinicia la fila
+        asegurar_bloqueos(self.cancha.pk, [self.fecha])
+        self.assertEqual(BloqueoCanchaDia.objects.get(id_cancha=self.cancha, fecha=self.fecha).version, 2)
+
+    def test_reserva_cancelada_no_bloquea(self):
+        reserva = self._reservar(self.usuarios[0], time(20, 0), time(21, 0))
+        Reserva.objects.filter(pk=reserva.pk).update(estado='cancelada')
+        self._reservar(self.usuarios[1], time(20, 0), time(21, 0))
+        self.assertEqual(Reserva.objects.filter(id_cancha=self.cancha, estado='confirmada').count(), 1)
+
+
+class SlotsDesdeMapaTest(SimpleTestCase):
+
+    def test_duracion_no_positiva_no_genera_slots(self):
+        todo_libre = (1 << 48) - 1
+        self.assertEqual(slots_desde_mapa(todo_libre, 0, 0), [])
+        self.assertEqual(slots_desde_mapa(todo_libre, 0, -30), [])
+        self.assertEqual(slots_desde_mapa(todo_libre, 0, 60)[:2], [(0, 60), (30, 90)])
+
+
+class DisponibilidadMaterializadaTest(DatosReserva, TestCase):
+
+    def _fila(self):
+        return DisponibilidadCanchaDia.objects.get(id_cancha=self.cancha, fecha=self.fecha)
+
+    def _igual_al_barrido(self, **opciones):
+        desde, hasta = self.fecha, self.fecha + timedelta(days=6)
+        self.assertEqual(
+            DisponibilidadCanchaDia.objects.filter(
+                id_cancha=self.cancha, fecha__range=(desde, hasta), alineado=True,
+            ).count(),
+            7,
+        )
+        materializado = disponibilidad_canchas([self.cancha.pk], desde, hasta, **opciones)
+        with mock.patch.object(disponibilidad, 'cargar_materializados', return_value={}):
+            barrido = disponibilidad_canchas([self.cancha.pk], desde, hasta, **opciones)
+        self.assertEqual(materializado, barrido)
+        return materializado[self.cancha.pk][self.fecha]
+
+    def test_horario_llena_el_horizonte(self):
+        # 9:00 a 22:00 son las unidades 18 a 43
+        abierto = ((1 << 44) - 1) & ~((1 << 18) - 1)
+        self.assertEqual((self._fila().apertura, self._fila().libres), (abierto, abierto))
+        self.assertEqual(self._igual_al_barrido(duracion_minutos=90)[0], (9 * 60, 10 * 60 + 30))
+
+        horario = HorarioCancha.objects.get(id_cancha=self.cancha)
+        horario.hora_inicio = time(18, 0)
+        horario.save()
+        self.assertEqual(self._igual_al_barrido(duracion_minutos=60)[0], (18 * 60, 19 * 60))
+        horario.delete()
+        self.assertEqual(self._fila().apertura, 0)
+        self.assertEqual(self._igual_al_barrido(), [])
+
+    def test_confirmar_y_cancelar_reserva(self):
+        abierto = self._fila().libres
+        reserva = self._reservar(self.usuarios[0], time(20, 0), time(21, 30))
+        self.assertEqual(self._fila().libres, abierto & ~(0b111 << 40))
+        for opciones in ({'duracion_minutos': 90}, {'duracion_minutos': 60, 'franja': (19 * 60, 22 * 60)}):
+            slots = self._igual_al_barrido(**opciones)
+            self.assertFalse([s for s in slots if s[0] < 21 * 60 + 30 and s[1] > 20 * 60], opciones)
+
+        reserva.estado = 'cancelada'
+        reserva.save()
+        self.assertEqual(self._fila().libres, abierto)
+        self._igual_al_barrido(duracion_minutos=90)
+
+        # Una reserva fuera de la grilla deja el día al barrido de intervalos
+        otra = self._reservar(self.usuarios[1], time(10, 15), time(11, 0))
+        self.assertFalse(self._fila().alineado)
+        slots = disponibilidad_canchas([self.cancha.pk], self.fecha, self.fecha, 60)[self.cancha.pk][self.fecha]
+        self.assertNotIn((10 * 60, 11 * 60), slots)
+        otra.delete()
+        self.assertEqual((self._fila().libres, self._fila().alineado), (abierto, True))
+
+
+class HorariosDisponiblesApiTest(DatosReserva, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_duracion_fuera_de_rango_es_400(self):
+        url = reverse('api_horarios_disponibles')
+        for duracion in (0, -30, 20, 300, 'x'):
+            respuesta = self.client.get(url, {'cancha_id': self.cancha.pk, 'fecha': self.fecha.isoformat(), 'duracion': duracion})
+            self.assertEqual(respuesta.status_code, 400, duracion)
+        respuesta = self.client.get(url, {'cancha_id': self.cancha.pk, 'fecha': self.fecha.isoformat(), 'duracion': 60})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['horarios'][0], {'hora_inicio': '09:00', 'hora_fin': '10:00'})
+
+    def _consultar(self, etag=None):
+        parametros = {'cancha_id': self.cancha.pk, 'fecha': self.fecha.isoformat(), 'duracion': 60}
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(reverse('api_horarios_disponibles'), parametros, headers=headers)
+
+    def test_etag_revalida_hasta_que_cambia_la_cancha(self):
+        primera = self._consultar()
+        etag = primera['ETag']
+        self.assertEqual(self._consultar(etag).status_code, 304)
+
+        # Una reserva nueva cambia la versión del día al confirmarse
+        with self.captureOnCommitCallbacks(execute=True):
+            self._reservar(self.usuarios[0], time(9, 0), time(10, 0))
+        segunda = self._consultar(etag)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertNotEqual(segunda['ETag'], etag)
+        self.assertEqual(segunda.json()['horarios'][0], {'hora_inicio': '10:00', 'hora_fin': '11:00'})
+        self.assertEqual(self._consultar(segunda['ETag']).status_code, 304)
+
+        # Un cambio de horarios cambia la versión de la cancha (todos sus días)
+        with self.captureOnCommitCallbacks(execute=True):
+            horario = HorarioCancha.objects.get(id_cancha=self.cancha)
+            horario.hora_fin = time(21, 0)
+            horario.save()
+        tercera = self._consultar(segunda['ETag'])
+        self.assertEqual(tercera.status_code, 200)
+        self.assertEqual(tercera.json()['horarios'][-1], {'hora_inicio': '20:00', 'hora_fin': '21:00'})
+
+    def _clave_horarios(self):
+        version = cache_disponibilidad.obtener_version(self.cancha.pk, self.fecha)
+        return version, f'disp:h:{self.cancha.pk}:{self.fecha.isoformat()}:60:{version}'
+
+    def test_fallos_simultaneos_calculan_una_sola_vez(self):
+        version, clave = self._clave_horarios()
+        # Otra solicitud ya está calculando la misma entrada y la guarda mientras esta espera
+        cache.add(f'{clave}:calculando', 1)
+        calculados = [{'hora_inicio': '09:00', 'hora_fin': '10:00'}]
+        with mock.patch.object(cache_disponibilidad.time, 'sleep', lambda _: cache.set(clave, calculados)), \
+                mock.patch.object(cache_disponibilidad, '_calcular_horarios') as calcular:
+            horarios = cache_disponibilidad.horarios_cacheados(self.cancha.pk, self.fecha, 60, version)
+        self.assertEqual(horarios, calculados)
+        calcular.assert_not_called()
+
+    def test_sin_respuesta_del_otro_calculo_se_calcula_igual(self):
+        version, clave = self._clave_horarios()
+        cache.add(f'{clave}:calculando', 1)
+        with mock.patch.object(cache_disponibilidad, 'ESPERA_SEGUNDOS', 0.01):
+            horarios = cache_disponibilidad.horarios_cacheados(self.cancha.pk, self.fecha, 60, version)
+        self.assertEqual(horarios[0], {'hora_inicio': '09:00', 'hora_fin': '10:00'})
+        self.assertEqual(cache.get(clave), horarios)
+        # La marca ajena sigue ahí: solo quien la puso la borra
+        self.assertEqual(cache.get(f'{clave}:calculando'), 1)
+
+    def test_quien_calcula_guarda_y_libera_la_marca(self):
+        version, clave = self._clave_horarios()
+        horarios = cache_disponibilidad.horarios_cacheados(self.cancha.pk, self.fecha, 60, version)
+        self.assertEqual(cache.get(clave), horarios)
+        self.assertIsNone(cache.get(f'{clave}:calculando'))
+
+
+class BuscarHorariosApiTest(DatosReserva, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Cancha 1 libre de 9:00 a 10:00 y de 21:00 a 22:00; Cancha 2 abre solo al día siguiente
+        for inicio, fin in ((10, 14), (14, 18), (18, 21)):
+            self._reservar(self.usuarios[0], time(inicio, 0), time(fin, 0))
+        self.otra = Cancha.objects.create(nombre='Cancha 2', id_recinto=self.recinto)
+        HorarioCancha.objects.create(
+            id_cancha=self.otra, dia_semana=(self.fecha + timedelta(days=1)).weekday(),
+            hora_inicio=time(18, 0), hora_fin=time(20, 0),
+        )
+        # Otra localidad: nunca aparece al buscar por la del recinto
+        lejana = Recinto.objects.create(
+            nombre='Complejo Norte', direccion='Calle 1', id_localidad=Localidad.objects.create(nombre='Quilicura'),
+        )
+        HorarioCancha.objects.create(
+            id_cancha=Cancha.objects.create(nombre='Cancha Norte', id_recinto=lejana),
+            dia_semana=self.fecha.weekday(), hora_inicio=time(9, 0), hora_fin=time(22, 0),
+        )
+
+    def _buscar(self, **parametros):
+        return self.client.get(reverse('api_buscar_horarios'), {
+            'localidad': self.recinto.id_localidad_id,
+            'fecha_desde': self.fecha.isoformat(),
+            'fecha_hasta': (self.fecha + timedelta(days=1)).isoformat(),
+            'duracion': 60,
+            **parametros,
+        })
+
+    def _slots(self, respuesta):
+        return [(s['cancha_id'], s['fecha'], s['hora_inicio']) for s in respuesta.json()['slots']]
+
+    def test_slots_de_todas_las_canchas_por_fecha_y_hora(self):
+        respuesta = self._buscar()
+        self.assertEqual(respuesta.status_code, 200)
+        hoy, manana = self.fecha.isoformat(), (self.fecha + timedelta(days=1)).isoformat()
+        self.assertEqual(self._slots(respuesta), [
+            (self.cancha.pk, hoy, '09:00'), (self.cancha.pk, hoy, '21:00'),
+            (self.otra.pk, manana, '18:00'), (self.otra.pk, manana, '18:30'), (self.otra.pk, manana, '19:00'),
+        ])
+        self.assertEqual(respuesta.json()['total'], 5)
+        self.assertEqual(set(respuesta.json()['canchas']), {str(self.cancha.pk), str(self.otra.pk)})
+        # Por recinto da lo mismo
+        self.assertEqual(self._slots(self._buscar(localidad='', recinto=self.recinto.pk)), self._slots(respuesta))
+
+    def test_franja_horaria(self):
+        respuesta = self._buscar(hora_desde='18:00', hora_hasta='19:30')
+        self.assertEqual(self._slots(respuesta), [
+            (self.otra.pk, (self.fecha + timedelta(days=1)).isoformat(), '18:00'),
+            (self.otra.pk, (self.fecha + timedelta(days=1)).isoformat(), '18:30'),
+        ])
+
+    def test_limite_recorta_desde_el_principio(self):
+        respuesta = self._buscar(limite=2)
+        self.assertEqual(len(respuesta.json()['slots']), 2)
+        self.assertEqual(respuesta.json()['total'], 5)
+        # Un límite negativo no puede cortar desde el final
+        self.assertEqual(self._slots(self._buscar(limite=-5)), [(self.cancha.pk, self.fecha.isoformat(), '09:00')])
+
+    def test_parametros_invalidos_son_400(self):
+        for parametros in ({'localidad': 'abc'}, {'localidad': '', 'recinto': '1x'}, {'limite': 'x'}, {'hora_desde': '25:00'}):
+            self.assertEqual(self._buscar(**parametros).status_code, 400, parametros)
+
+
+class OcupacionTest(DatosReserva, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ayer = timezone.localdate() - timedelta(days=1)
+        HorarioCancha.objects.create(
+            id_cancha=self.cancha, dia_semana=self.ayer.weekday(), hora_inicio=time(9, 30), hora_fin=time(11, 0),
+        )
+        for inicio, fin, estado in ((time(10, 0), time(10, 45), 'completada'), (time(9, 30), time(10, 0), 'cancelada')):
+            Reserva.objects.create(
+                id_cancha=self.cancha, id_recinto=self.recinto, id_usuario=self.usuarios[0],
+                fecha_reserva=self.ayer, hora_inicio=inicio, hora_fin=fin, estado=estado,
+            )
+
+    def _consolidar(self):
+        salida = StringIO()
+        call_command('consolidar_ocupacion', cancha=[self.cancha.pk], stdout=salida)
+        return salida.getvalue()
+
+    def test_minutos_por_hora(self):
+        self.assertIn('2 filas', self._consolidar())
+        # Una segunda corrida reemplaza las filas del rango, no las duplica
+        self.assertIn('2 filas', self._consolidar())
+        filas = OcupacionCanchaDia.objects.filter(id_cancha=self.cancha, fecha=self.ayer).order_by('hora')
+        self.assertEqual(
+            [(fila.hora, fila.minutos_apertura, fila.minutos_reservados) for fila in filas],
+            [(9, 30, 0), (10, 60, 45)],
+        )
+        self.assertEqual(
+            ocupacion_por_cancha([self.cancha.pk], self.ayer, self.ayer),
+            {self.cancha.pk: {'apertura': 90, 'reservados': 45, 'porcentaje': 50}},
+        )
+        horas, dias = mapa_calor([self.cancha.pk], self.ayer, self.ayer)
+        self.assertEqual(horas, [9, 10])
+        celdas = dias[self.ayer.weekday()]['celdas']
+        self.assertEqual([celda['porcentaje'] for celda in celdas], [0, 75])
+
+    def test_apertura_consolidada_no_cambia_con_los_horarios(self):
+        self._consolidar()
+        HorarioCancha.objects.filter(id_cancha=self.cancha, dia_semana=self.ayer.weekday()).update(activo=False)
+        self.assertEqual(ocupacion_por_cancha([self.cancha.pk], self.ayer, self.ayer)[self.cancha.pk]['apertura'], 90)
+
+
+class BarrerCicloVidaTest(DatosReserva, TestCase):
+    HILOS = 3
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        hoy = timezone.localdate()
+        self.pasadas = [
+            Reserva.objects.create(
+                id_cancha=self.cancha, id_recinto=self.recinto, id_usuario=self.usuarios[0],
+                fecha_reserva=hoy - timedelta(days=dias), hora_inicio=time(20, 0), hora_fin=time(21, 0),
+            ).pk
+            for dias in range(1, 6)
+        ]
+        self.futura = self._reservar(self.usuarios[0], time(20, 0), time(21, 0))
+        equipo = Equipo.objects.create(nombre='Los Tigres', id_anfitrion=self.usuarios[0])
+        self.vencida, self.vigente = [
+            InvitacionEquipo.objects.create(id_equipo=equipo, id_usuario=usuario, id_invitador=self.usuarios[0])
+            for usuario in self.usuarios[1:]
+        ]
+        InvitacionEquipo.objects.filter(pk=self.vencida.pk).update(fecha_invitacion=timezone.now() - timedelta(days=30))
+        self.jugado, self.proximo = [
+            Partido.objects.create(
+                lugar='Cancha 1', fecha_inicio=timezone.now() + timedelta(days=dias), max_jugadores=10,
+                id_organizador=self.usuarios[0], id_localidad=self.recinto.id_localidad,
+            )
+            for dias in (-1, 1)
+        ]
+
+    def _barrer(self, **opciones):
+        salida = StringIO()
+        call_command('barrer_ciclo_vida', stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def _estados(self, pks):
+        return list(Reserva.objects.filter(pk__in=pks).order_by('pk').values_list('estado', flat=True))
+
+    def test_transiciones_y_segunda_corrida_sin_cambios(self):
+        salida = self._barrer(lote=2)
+        self.assertIn('reservas: 5 filas en 3 lotes', salida)
+        self.assertEqual(self._estados(self.pasadas), ['completada'] * 5)
+        self.assertEqual(self._estados([self.futura.pk]), ['confirmada'])
+        self.assertEqual(
+            [InvitacionEquipo.objects.get(pk=invitacion.pk).estado for invitacion in (self.vencida, self.vigente)],
+            ['expirada', 'pendiente'],
+        )
+        jugado = Partido.objects.get(pk=self.jugado.pk)
+        self.assertEqual([jugado.archivado, Partido.objects.get(pk=self.proximo.pk).archivado], [True, False])
+        self.assertGreater(jugado.fecha_actualizacion, self.jugado.fecha_actualizacion)
+
+        self.assertEqual(self._barrer(lote=2).count('sin filas pendientes'), 3)
+        self.assertEqual(Partido.objects.get(pk=self.jugado.pk).fecha_actualizacion, jugado.fecha_actualizacion)
+
+    def test_retoma_desde_el_avance_guardado(self):
+        # Un corte anterior ya había completado los rangos hasta la tercera reserva
+        cache.set('barrer_ciclo_vida:reservas', self.pasadas[2], None)
+        self.assertIn('reservas: 3 filas en 2 lotes', self._barrer(lote=2))
+        self.assertEqual(self._estados(self.pasadas), ['confirmada'] * 2 + ['completada'] * 3)
+        self.assertIsNone(cache.get('barrer_ciclo_vida:reservas'))
+        # Terminado el barrido, el siguiente parte desde el principio
+        self._barrer(lote=2)
+        self.assertEqual(self._estados(self.pasadas), ['completada'] * 5)
+
+    def test_limite_de_filas_por_segundo(self):
+        with mock.patch.object(barrer_ciclo_vida.time, 'sleep') as dormir:
+            self._barrer(lote=1, max_filas_por_segundo=1)
+        # Con el reloj detenido, la quinta reserva espera hasta completar cinco segundos
+        esperas = [llamada.args[0] for llamada in dormir.call_args_list]
+        self.assertEqual(len(esperas), 7)
+        self.assertAlmostEqual(esperas[4], 5, delta=0.5)
+
+
+class SerieReservaVistaTest(DatosReserva, TestCase):
+
+    def test_crear_serie_termina_en_mis_reservas(self):
+        self.client.force_login(self.usuarios[0])
+        # Una fecha de la serie ya está ocupada en ese horario
+        self._reservar(self.usuarios[1], time(20, 0), time(21, 0))
+        respuesta = self.client.post(reverse('crear_serie_reserva'), {
+            'id_cancha': self.cancha.pk,
+            'dia_semana': self.fecha.weekday(),
+            'hora_inicio': '20:00',
+            'hora_fin': '21:00',
+            'fecha_inicio': self.fecha.isoformat(),
+            'fecha_fin': (self.fecha + timedelta(days=14)).isoformat(),
+        }, follow=True)
+        self.assertRedirects(respuesta, reverse('mis_reservas'))
+        self.assertTemplateUsed(respuesta, 'mis_reservas.html')
+        self.assertEqual(len(respuesta.context['series']), 1)
+        self.assertEqual(len(respuesta.context['reservas_futuras']), 2)
+        self.assertContains(respuesta, 'Reservas Semanales')
+
+        serie = respuesta.context['series'][0]
+        respuesta = self.client.post(reverse('cancelar_serie_reserva', args=[serie.pk]), follow=True)
+        self.assertEqual(len(respuesta.context['series']), 0)
+        self.assertEqual(len(respuesta.context['reservas_futuras']), 0)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ReservaConcurrenteTest(DatosReserva, TransactionTestCase):
+    """Muchos hilos intentan reservar el mismo horario: solo uno debe ganar"""
+    HILOS = 16
+
+    def test_un_solo_ganador_por_horario(self):
+        barrera = threading.Barrier(self.HILOS)
+        exitos = []
+        rechazos = []
+        errores = []
+
+        def intentar(usuario, hora_inicio, hora_fin):
+            try:
+                barrera.wait()
+                self._reservar(usuario, hora_inicio, hora_fin)
+                exitos.append(usuario.pk)
+            except ValidationError:
+                rechazos.append(usuario.pk)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        # Horarios distintos pero solapados sobre 20:00-21:00
+        hilos = []
+        for i, usuario in enumerate(self.usuarios):
+            hora_inicio = time(19, 30) if i % 2 else time(20, 0)
+            hora_fin = time(21, 0) if i % 2 else time(21, 30)
+            hilos.append(threading.Thread(target=intentar, args=(usuario, hora_inicio, hora_fin)))
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(exitos), 1)
+        self.assertEqual(len(rechazos), self.HILOS - 1)
+        self.assertEqual(Reserva.objects.filter(id_cancha=self.cancha, estado='confirmada').count(), 1)
+
+
+class DatosInscripcion:
+    """Partido con CUPOS lugares y HILOS jugadores sin inscribir"""
+    HILOS = 2
+    CUPOS = 4
+
+    def setUp(self):
+        localidad = Localidad.objects.create(nombre='Santiago Centro')
+        organizador = Usuario.objects.create_user('organizador@nf1.cl', 'Organizador', 'Prueba', 'clave123')
+        self.partido = Partido.objects.create(
+            lugar='Cancha 1', fecha_inicio=timezone.now() + timedelta(days=1),
+            max_jugadores=self.CUPOS, id_organizador=organizador, id_localidad=localidad,
+        )
+        self.usuarios = [
+            Usuario.objects.create_user(f'jugador{i}@nf1.cl', 'Jugador', str(i), 'clave123')
+            for i in range(self.HILOS)
+        ]
+
+
+class InscripcionTest(DatosInscripcion, TestCase):
+
+    def test_salir_libera_cupo(self):
+        inscribir_participante(self.partido, self.usuarios[0])
+        with self.assertRaises(ValidationError):
+            inscribir_participante(self.partido, self.usuarios[0])
+        self.assertTrue(retirar_participante(self.partido, self.usuarios[0]))
+        self.assertFalse(retirar_participante(self.partido, self.usuarios[0]))
+        self.partido.refresh_from_db()
+        self.assertEqual(self.partido.num_participantes, 0)
+
+    def test_partido_completo_rechaza(self):
+        Partido.objects.filter(pk=self.partido.pk).update(max_jugadores=1)
+        inscribir_participante(Partido.objects.get(pk=self.partido.pk), self.usuarios[0])
+        with self.assertRaises(ValidationError):
+            inscribir_participante(Partido.objects.get(pk=self.partido.pk), self.usuarios[1])
+        self.partido.refresh_from_db()
+        self.assertEqual(self.partido.num_participantes, 1)
+        self.assertEqual(self.partido.participantes.count(), 1)
+
+
+class CrearPartidoTest(DatosInscripcion, TestCase):
+
+    def _crear(self):
+        return self.client.post(reverse('crear_partido'), {
+            'lugar': 'Cancha 2',
+            'fecha_inicio': (timezone.localtime() + timedelta(days=2)).strftime('%Y-%m-%d %H:%M'),
+            'id_localidad': self.partido.id_localidad_id,
+            'max_jugadores': 10,
+        })
+
+    def test_organizador_queda_inscrito(self):
+        self.client.force_login(self.usuarios[0])
+        self._crear()
+        partido = Partido.objects.get(lugar='Cancha 2')
+        self.assertEqual(partido.num_participantes, 1)
+        self.assertTrue(partido.participantes.filter(id_usuario=self.usuarios[0]).exists())
+
+    def test_sin_inscripcion_no_queda_el_partido(self):
+        self.client.force_login(self.usuarios[0])
+        with mock.patch.object(ParticipantePartido.objects, 'create', side_effect=DatabaseError('falla')):
+            with self.assertRaises(DatabaseError):
+                self._crear()
+        self.assertFalse(Partido.objects.filter(lugar='Cancha 2').exists())
+
+
+class ExportarPartidosTest(DatosInscripcion, TestCase):
+
+    def test_modificados_desde_ve_inscripciones(self):
+        url = reverse('api_exportar_partidos')
+        desde = timezone.now() + timedelta(minutes=1)
+        parametros = {'modificados_desde': desde.isoformat()}
+
+        def exportados():
+            respuesta = self.client.get(url, parametros)
+            return [p['id_partido'] for p in json.loads(b''.join(respuesta.streaming_content))['resultados']]
+
+        self.assertEqual(exportados(), [])
+        # Los UPDATE con F() no pasan por auto_now: deben renovar fecha_actualizacion ellos mismos
+        with mock.patch('django.utils.timezone.now', return_value=desde + timedelta(minutes=1)):
+            inscribir_participante(self.partido, self.usuarios[0])
+        self.assertEqual(exportados(), [self.partido.pk])
+
+    def test_fecha_imposible_es_400(self):
+        for fecha in ('ayer', '2026-13-01T00:00:00', '2026-02-30'):
+            respuesta = self.client.get(reverse('api_exportar_partidos'), {'modificados_desde': fecha})
+            self.assertEqual(respuesta.status_code, 400, fecha)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class InscripcionConcurrenteTest(DatosInscripcion, TransactionTestCase):
+    """Muchos jugadores piden los últimos cupos a la vez: el partido nunca se sobrellena"""
+    HILOS = 12
+
+    def test_no_supera_max_jugadores(self):
+        barrera = threading.Barrier(self.HILOS)
+        exitos = []
+        rechazos = []
+        errores = []
+
+        def intentar(usuario):
+            try:
+                barrera.wait()
+                inscribir_participante(Partido.objects.get(pk=self.partido.pk), usuario)
+                exitos.append(usuario.pk)
+            except ValidationError:
+                rechazos.append(usuario.pk)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=intentar, args=(usuario,)) for usuario in self.usuarios]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(exitos), self.CUPOS)
+        self.assertEqual(len(rechazos), self.HILOS - self.CUPOS)
+        self.partido.refresh_from_db()
+        self.assertEqual(self.partido.num_participantes, self.CUPOS)
+        self.assertEqual(self.partido.participantes.count(), self.CUPOS)
+
+
+# El sondeo lee desde otro hilo y otra conexión: con DatabaseCache no vería lo escrito en la transacción de la prueba
+CACHE_EN_MEMORIA = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sondeo'}}
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class SondeoCacheTest(SimpleTestCase):
+
+    async def test_una_lectura_por_intervalo_para_todos_los_flujos(self):
+        sondeo = SondeoCache('SONDEO_PRUEBA', 0.01)
+        await sync_to_async(cache.set)('sondeo:prueba', 1)
+        lecturas = []
+        leer = sondeo_modulo._leer_claves
+
+        async def contar(claves):
+            lecturas.append(sorted(claves))
+            return await leer(claves)
+
+        with mock.patch.object(sondeo_modulo, '_leer_claves', contar):
+            esperas = [asyncio.create_task(sondeo.esperar('sondeo:prueba', 1, espera=5)) for _ in range(20)]
+            await asyncio.sleep(0.03)
+            await sync_to_async(cache.set)('sondeo:prueba', 2)
+            valores = await asyncio.gather(*esperas)
+            # Sin cambios la espera termina con el valor conocido
+            self.assertEqual(await sondeo.esperar('sondeo:prueba', 2, espera=0.03), 2)
+        self.assertEqual(valores, [2] * 20)
+        self.assertTrue(all(claves == ['sondeo:prueba'] for claves in lecturas))
+        # Un flujo por lectura serían 20 lecturas en el primer intervalo
+        self.assertLess(len(lecturas), 20)
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class ChatEnVivoTest(DatosInscripcion, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Un último id publicado por otra prueba con el mismo partido ocultaría los mensajes
+        cache.clear()
+
+    def _escribir(self, texto):
+        mensaje = MensajePartido.objects.create(
+            id_partido=self.partido, id_usuario=self.partido.id_organizador, mensaje=texto
+        )
+        return mensaje.pk
+
+    @override_settings(CHAT_INTERVALO=0.01)
+    async def test_broker_cache_entrega_solo_lo_nuevo(self):
+        broker = BrokerCache()
+        primero = await sync_to_async(self._escribir)('Hola')
+        flujo = broker.escuchar(self.partido.pk, 0, espera=0.05)
+        try:
+            # Sin clave publicada se lee la base una vez
+            self.assertEqual((await anext(flujo))['id_mensaje'], primero)
+            self.assertIsNone(await anext(flujo))
+            segundo = await sync_to_async(self._escribir)('¿Quién lleva pelota?')
+            await sync_to_async(broker.publicar)(self.partido.pk, {'id_mensaje': segundo})
+            self.assertEqual((await anext(flujo))['mensaje'], '¿Quién lleva pelota?')
+        finally:
+            await flujo.aclose()
+
+    async def test_flujo_sse_retoma_desde_last_event_id(self):
+        primero = await sync_to_async(self._escribir)('Uno')
+        segundo = await sync_to_async(self._escribir)('Dos')
+        respuesta = await self.async_client.get(
+            reverse('chat_partido_eventos', args=[self.partido.pk]),
+            headers={'Last-Event-ID': str(primero), 'Origin': 'https://www.nosfalta1.cl'},
+        )
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertEqual(respuesta['Access-Control-Allow-Origin'], 'https://www.nosfalta1.cl')
+        contenido = respuesta.streaming_content
+        try:
+            self.assertTrue((await anext(contenido)).startswith(b'retry: '))
+            self.assertTrue((await anext(contenido)).startswith(f'id: {segundo}\nevent: mensaje\n'.encode()))
+        finally:
+            await contenido.aclose()
+
+    def test_flujo_rechazado_fuera_de_asgi(self):
+        # Bajo WSGI el flujo tomaría un worker síncrono sin entregar nada hasta cerrarse
+        respuesta = self.client.get(reverse('chat_partido_eventos', args=[self.partido.pk]))
+        self.assertEqual(respuesta.status_code, 503)
+
+    def test_pagina_abre_el_flujo_solo_con_flujos_url(self):
+        url = reverse('detalle_partido', args=[self.partido.pk])
+        with self.settings(FLUJOS_URL=''):
+            respuesta = self.client.get(url)
+        self.assertNotContains(respuesta, 'data-eventos=')
+        self.assertContains(respuesta, f'data-mensajes="{reverse("api_mensajes_partido", args=[self.partido.pk])}"')
+        with self.settings(FLUJOS_URL='https://flujos.nosfalta1.cl'):
+            respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'data-eventos="https://flujos.nosfalta1.cl/')
+
+
+class HistorialChatTest(DatosInscripcion, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        autor = self.partido.id_organizador
+        self.ids = [
+            MensajePartido.objects.create(id_partido=self.partido, id_usuario=autor, mensaje=f'Mensaje {i}').pk
+            for i in range(5)
+        ]
+        # Mismo instante para todos: el id desempata dentro de cada página
+        MensajePartido.objects.filter(pk__in=self.ids).update(fecha_creacion=timezone.now())
+        self.url = reverse('api_mensajes_partido', args=[self.partido.pk])
+
+    def _ids(self, **parametros):
+        datos = self.client.get(self.url, {'tamano': 2, **parametros}).json()
+        return [mensaje['id_mensaje'] for mensaje in datos['resultados']], datos
+
+    def test_paginas_hacia_atras_sin_repetir_ni_saltar(self):
+        vistos, datos = self._ids()
+        self.assertEqual(vistos, self.ids[3:])
+        while datos['before_id']:
+            pagina, datos = self._ids(before_id=datos['before_id'])
+            vistos = pagina + vistos
+        self.assertEqual(vistos, self.ids)
+
+    def test_posteriores_para_consultar_lo_nuevo(self):
+        pagina, datos = self._ids(after_id=self.ids[1])
+        self.assertEqual(pagina, self.ids[2:4])
+        self.assertTrue(datos['hay_mas_recientes'])
+        pagina, datos = self._ids(after_id=datos['after_id'])
+        self.assertEqual(pagina, self.ids[4:])
+        self.assertFalse(datos['hay_mas_recientes'])
+        # Sin nada nuevo after_id se mantiene para la próxima consulta
+        pagina, datos = self._ids(after_id=self.ids[4])
+        self.assertEqual((pagina, datos['after_id']), ([], self.ids[4]))
+
+    def test_parametros_invalidos_son_400(self):
+        for parametros in ({'before_id': 'x'}, {'before_id': self.ids[1], 'after_id': self.ids[0]}):
+            self.assertEqual(self.client.get(self.url, parametros).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_mensajes_partido', args=[0])).status_code, 404)
+
+
+class LecturaChatTest(DatosInscripcion, TestCase):
+
+    def test_no_leidos_por_cursor(self):
+        organizador = self.partido.id_organizador
+        jugador = self.usuarios[0]
+        crear_mensaje(self.partido, organizador, 'Antes de entrar')
+        inscribir_participante(self.partido, jugador)
+        # Lo escrito antes de inscribirse no cuenta, ni lo propio
+        self.assertEqual(contar_no_leidos(jugador.pk), 0)
+        crear_mensaje(self.partido, jugador, 'Llego tarde')
+        self.assertEqual(contar_no_leidos(jugador.pk), 0)
+        self.assertEqual(contar_no_leidos(organizador.pk), 1)
+
+        ultimo = crear_mensaje(self.partido, organizador, 'Sin problema')
+        self.assertEqual(contar_no_leidos(jugador.pk), 1)
+        self.client.force_login(jugador)
+        self.client.post(reverse('marcar_chat_leido', args=[self.partido.pk]), {'hasta': ultimo.pk})
+        self.assertEqual(contar_no_leidos(jugador.pk), 0)
+        # Una marca vieja que llega tarde no hace retroceder el cursor
+        marcar_leido(self.partido.pk, jugador.pk, ultimo.pk - 1)
+        self.assertEqual(contar_no_leidos(jugador.pk), 0)
+
+    def test_salir_cierra_el_chat_menos_al_organizador(self):
+        inscribir_participante(self.partido, self.usuarios[0])
+        self.assertTrue(LecturaChat.objects.filter(id_partido=self.partido, id_usuario=self.usuarios[0]).exists())
+        retirar_participante(self.partido, self.usuarios[0])
+        self.assertFalse(LecturaChat.objects.filter(id_partido=self.partido, id_usuario=self.usuarios[0]).exists())
+        self.assertTrue(
+            LecturaChat.objects.filter(id_partido=self.partido, id_usuario=self.partido.id_organizador).exists()
+        )
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class AvisosEnVivoTest(DatosInscripcion, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.jugador = self.usuarios[0]
+        inscribir_participante(self.partido, self.jugador)
+
+    def _version(self, usuario):
+        return cache.get(f'avisos:usuario:{usuario.pk}')
+
+    def test_mensaje_renueva_la_version_de_quienes_siguen_el_chat(self):
+        antes = self._version(self.jugador)
+        ajeno = self._version(self.usuarios[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_mensaje(self.partido, self.partido.id_organizador, 'Cambio de hora')
+        self.assertNotEqual(self._version(self.jugador), antes)
+        self.assertEqual(self._version(self.usuarios[1]), ajeno)
+
+    def _notificar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notificacion.objects.create(id_usuario=self.jugador, tipo='info', mensaje='Partido actualizado')
+
+    @override_settings(AVISOS_INTERVALO=0.01)
+    async def test_flujo_envia_el_contador_solo_cuando_cambia(self):
+        flujo = cambios_avisos(self.jugador.pk, espera=0.05, duracion=5)
+        try:
+            self.assertEqual((await anext(flujo))['count'], 0)
+            self.assertIsNone(await anext(flujo))
+            await sync_to_async(self._notificar)()
+            self.assertEqual(await anext(flujo), {'count': 1, 'notificaciones': 1, 'mensajes': 0})
+        finally:
+            await flujo.aclose()
+
+    async def test_flujo_requiere_sesion(self):
+        respuesta = await self.async_client.get(reverse('avisos_eventos'))
+        self.assertEqual(respuesta.status_code, 401)
+
+    def test_flujo_rechazado_fuera_de_asgi(self):
+        self.client.force_login(self.jugador)
+        self.assertEqual(self.client.get(reverse('avisos_eventos')).status_code, 503)
+
+    def test_insignia_consulta_sin_flujos_url(self):
+        self.client.force_login(self.jugador)
+        with self.settings(FLUJOS_URL=''):
+            self.assertContains(self.client.get(reverse('lista_partidos')), "const flujos = '';")
+        with self.settings(FLUJOS_URL='https://flujos.nosfalta1.cl'):
+            self.assertContains(self.client.get(reverse('lista_partidos')), "const flujos = 'https://flujos.nosfalta1.cl';")
+
+
+class ContadorNoLeidasTest(DatosInscripcion, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.usuario = self.usuarios[0]
+        self.client.force_login(self.usuario)
+
+    def _notificar(self, cantidad=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notificacion.objects.create(id_usuario=self.usuario, tipo='info', mensaje=f'Aviso {i}')
+                for i in range(cantidad)
+            ]
+
+    def _contador(self):
+        columna = Usuario.objects.get(pk=self.usuario.pk).notificaciones_no_leidas
+        self.assertEqual(notificaciones_no_leidas(self.usuario.pk), columna)
+        return columna
+
+    def test_crear_y_marcar_leida(self):
+        self.assertEqual(self._contador(), 0)
+        notificacion, = self._notificar()
+        self.assertEqual(self._contador(), 1)
+        url = reverse('marcar_notificacion_leida', args=[notificacion.pk])
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url)
+            # Marcarla dos veces no resta de más
+            self.assertEqual(self._contador(), 0)
+
+    def test_marcar_todas(self):
+        self._notificar(3)
+        self.assertEqual(self._contador(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('marcar_todas_leidas'))
+        self.assertEqual(self._contador(), 0)
+
+    def test_lectura_cruzada_no_deja_un_valor_viejo(self):
+        self.assertEqual(notificaciones_no_leidas(self.usuario.pk), 0)
+        version = cache.get(f'avisos:usuario:{self.usuario.pk}')
+        self._notificar()
+        # Una lectura que leyó la columna antes de la escritura la guarda tarde
+        cache.set(f'avisos:no_leidas:{self.usuario.pk}:{version}', 0)
+        self.assertEqual(notificaciones_no_leidas(self.usuario.pk), 1)
+
+    def test_reconciliar_corrige_la_columna_y_la_cache(self):
+        self._notificar(2)
+        Usuario.objects.filter(pk=self.usuario.pk).update(notificaciones_no_leidas=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reconciliar_no_leidas(self.usuario.pk, self.usuario.pk + 1), 1)
+        self.assertEqual(self._contador(), 2)
+        self.assertEqual(reconciliar_no_leidas(self.usuario.pk, self.usuario.pk + 1), 0)
+
+
+class NotificarTest(DatosInscripcion, TestCase):
+    HILOS = 6
+
+    def _ids(self, cantidad):
+        return [usuario.pk for usuario in self.usuarios[:cantidad]]
+
+    def _contadores(self):
+        return dict(Usuario.objects.filter(pk__in=self._ids(self.HILOS)).values_list('pk', 'notificaciones_no_leidas'))
+
+    def test_consultas_no_crecen_con_los_destinatarios(self):
+        with CaptureQueriesContext(connection) as pocos:
+            notificar(self._ids(2), self.partido.pk, 'info', 'Cambio de cancha')
+        with CaptureQueriesContext(connection) as muchos:
+            notificar(self._ids(6), self.partido.pk, 'info', 'Cambio de hora')
+        self.assertEqual(len(muchos), len(pocos))
+
+    def test_lotes_sin_duplicados_y_contador(self):
+        ids = self._ids(5)
+        with mock.patch.object(notificaciones, 'TAMANO_LOTE_NOTIFICACIONES', 2):
+            creadas = notificar(ids + ids[:2], self.partido.pk, 'info', 'Partido actualizado')
+        self.assertEqual(creadas, 5)
+        self.assertEqual(
+            sorted(Notificacion.objects.filter(tipo='info').values_list('id_usuario_id', flat=True)), sorted(ids)
+        )
+        self.assertEqual(self._contadores(), {**{pk: 1 for pk in ids}, self.usuarios[5].pk: 0})
+
+    def test_avisos_resuelven_destinatarios_al_ejecutarse(self):
+        for usuario in self.usuarios[:3]:
+            inscribir_participante(self.partido, usuario)
+        self.assertEqual(avisar_participantes(self.partido.pk, 'info', 'Llueve', excluir=self.usuarios[0].pk), 2)
+        self.assertEqual(avisar_organizador(self.partido.pk, 'info', 'Hola'), 1)
+        partido_id = self.partido.pk
+        self.partido.delete()
+        self.assertEqual(avisar_participantes(partido_id, 'cancelacion', 'Cancelado'), 0)
+        self.assertEqual(avisar_organizador(partido_id, 'info', 'Hola'), 0)
+
+
+@tarea
+def crear_localidad(nombre):
+    """Tarea de prueba con un efecto visible en la base"""
+    Localidad.objects.create(nombre=nombre)
+
+
+@tarea(max_intentos=2)
+def fallar_siempre():
+    raise RuntimeError('Servicio caído')
+
+
+class ColaTareasTest(TestCase):
+
+    def test_toma_por_prioridad_sin_repetir(self):
+        baja = encolar(crear_localidad, prioridad=PRIORIDAD_BAJA, nombre='Baja')
+        alta = encolar(crear_localidad, prioridad=PRIORIDAD_ALTA, nombre='Alta')
+        encolar(crear_localidad, retraso=timedelta(minutes=5), nombre='Después')
+        self.assertEqual([t.pk for t in tomar_tareas('uno', 1)], [alta.pk])
+        self.assertEqual([t.pk for t in tomar_tareas('dos', 5)], [baja.pk])
+        self.assertEqual(tomar_tareas('tres', 5), [])
+
+    def test_reintento_con_espera_y_luego_fallida(self):
+        tarea_id = encolar(fallar_siempre).pk
+        with self.assertLogs('eventos.tareas', 'WARNING'):
+            self.assertEqual(procesar_lote('uno'), 1)
+        pendiente = Tarea.objects.get(pk=tarea_id)
+        self.assertEqual((pendiente.estado, pendiente.intentos), ('pendiente', 1))
+        self.assertIn('Servicio caído', pendiente.ultimo_error)
+        self.assertGreater(pendiente.ejecutar_desde, timezone.now() + timedelta(seconds=ESPERA_BASE_SEGUNDOS * 0.7))
+        # Hasta que pase la espera nadie la toma
+        self.assertEqual(procesar_lote('uno'), 0)
+
+        Tarea.objects.filter(pk=tarea_id).update(ejecutar_desde=timezone.now())
+        with self.assertLogs('eventos.tareas', 'ERROR'):
+            self.assertEqual(procesar_lote('uno'), 1)
+        self.assertEqual(Tarea.objects.values_list('estado', 'intentos').get(pk=tarea_id), ('fallida', 2))
+
+    def test_colgada_se_recupera_y_la_toma_vieja_se_revierte(self):
+        tarea_id = encolar(crear_localidad, nombre='Una vez').pk
+        vieja, = tomar_tareas('lento')
+        Tarea.objects.filter(pk=tarea_id).update(tomada_en=timezone.now() - timedelta(hours=1))
+        self.assertEqual(recuperar_colgadas(), 1)
+        nueva, = tomar_tareas('rapido')
+
+        self.assertTrue(ejecutar_tarea(nueva))
+        # La primera ejecución termina tarde: no cierra la tarea ni repite su efecto
+        with self.assertLogs('eventos.tareas', 'WARNING'):
+            self.assertFalse(ejecutar_tarea(vieja))
+        self.assertEqual(Localidad.objects.filter(nombre='Una vez').count(), 1)
+        self.assertEqual(
+            Tarea.objects.values_list('estado', 'trabajador').get(pk=tarea_id), ('completada', nueva.trabajador)
+        )
+
+
+class EncolarEnLaVistaTest(DatosInscripcion, TestCase):
+
+    def test_sin_tarea_no_hay_inscripcion(self):
+        self.client.force_login(self.usuarios[0])
+        with mock.patch('eventos.views.encolar', side_effect=DatabaseError('cola caída')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('unirse_partido', args=[self.partido.pk]))
+        self.partido.refresh_from_db()
+        self.assertEqual(self.partido.num_participantes, 0)
+        self.assertFalse(self.partido.participantes.exists())
+
+    def test_inscripcion_encola_premio(self):
+        self.client.force_login(self.usuarios[0])
+        self.client.post(reverse('unirse_partido', args=[self.partido.pk]))
+        encolada, = Tarea.objects.all()
+        self.assertEqual(encolada.funcion, 'eventos.partidos.premiar_inscripcion')
+        self.assertEqual(encolada.argumentos, {'partido_id': self.partido.pk, 'usuario_id': self.usuarios[0].pk})
+
+
+class DatosRetencion:
+    """Un usuario con una notificación reciente y dos fuera de la retención, una leída y otra no"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user('jugador@nf1.cl', 'Jugador', 'Prueba', 'clave123')
+        self.reciente, self.vieja_no_leida, self.vieja_leida = [
+            Notificacion.objects.create(id_usuario=self.usuario, tipo='info', mensaje=mensaje, leida=leida)
+            for mensaje, leida in (('Reciente', False), ('Vieja sin leer', False), ('Vieja leída', True))
+        ]
+        self.vencida = timezone.now() - timedelta(days=400)
+        Notificacion.objects.filter(pk__in=[self.vieja_no_leida.pk, self.vieja_leida.pk]).update(
+            fecha_creacion=self.vencida
+        )
+
+    def _contador(self):
+        return Usuario.objects.get(pk=self.usuario.pk).notificaciones_no_leidas
+
+
+class RetencionNotificacionesTest(DatosRetencion, TestCase):
+
+    def test_mis_notificaciones_muestra_las_no_leidas_viejas(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('mis_notificaciones'))
+        self.assertEqual(
+            [notificacion.pk for notificacion in respuesta.context['notificaciones']],
+            [self.reciente.pk, self.vieja_no_leida.pk],
+        )
+        self.assertEqual(respuesta.context['no_leidas'], 2)
+
+    def test_depurar_borra_solo_las_leidas_viejas(self):
+        self.assertEqual(depurar_leidas(limite_retencion(), archivando=True), 1)
+        self.assertEqual(depurar_leidas(limite_retencion()), 0)
+        self.assertCountEqual(
+            Notificacion.objects.values_list('pk', flat=True), [self.reciente.pk, self.vieja_no_leida.pk]
+        )
+        self.assertEqual(list(NotificacionArchivada.objects.values_list('pk', flat=True)), [self.vieja_leida.pk])
+        self.assertEqual(self._contador(), 2)
+
+
+@skipUnless(connection.vendor == 'mysql', 'El particionado de notificaciones solo existe en MySQL')
+class RetirarMesTest(DatosRetencion, TransactionTestCase):
+    """DDL real sobre la base de pruebas: en MySQL cada ALTER confirma solo"""
+
+    def test_mes_con_no_leidas_se_conserva_hasta_leerlas(self):
+        with connection.cursor() as cursor:
+            for sentencia in sql_particionar(meses_futuros=1):
+                cursor.execute(sentencia)
+        mes = date(self.vencida.year, self.vencida.month, 1)
+
+        self.assertFalse(retirar_mes(mes))
+        self.assertIn(mes, particiones())
+        self.assertCountEqual(
+            Notificacion.objects.values_list('pk', flat=True), [self.reciente.pk, self.vieja_no_leida.pk]
+        )
+        self.assertEqual(self._contador(), 2)
+
+        Notificacion.objects.filter(pk=self.vieja_no_leida.pk).update(leida=True)
+        self.assertTrue(retirar_mes(mes))
+        self.assertNotIn(mes, particiones())
+        self.assertEqual(list(Notificacion.objects.values_list('pk', flat=True)), [self.reciente.pk])
+
+
+class CacheHomeTest(DatosInscripcion, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_partido_e_inscripcion_renuevan_la_version(self):
+        antes = cache_home._version()
+        self.assertNotContains(self.client.get(reverse('home')), 'Cancha Nueva')
+        with self.captureOnCommitCallbacks(execute=True):
+            Partido.objects.create(
+                lugar='Cancha Nueva', fecha_inicio=timezone.now() + timedelta(days=2), max_jugadores=10,
+                id_organizador=self.usuarios[0], id_localidad=self.partido.id_localidad,
+            )
+        creado = cache_home._version()
+        self.assertNotEqual(creado, antes)
+        self.assertContains(self.client.get(reverse('home')), 'Cancha Nueva')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inscribir_participante(self.partido, self.usuarios[1])
+        self.assertNotEqual(cache_home._version(), creado)
+
+    def test_insignias_propias_sobre_el_feed_compartido(self):
+        inscribir_participante(self.partido, self.usuarios[0])
+        feed = cache_home.feed_home()
+        # El feed ya está en caché: solo se consulta lo propio del usuario
+        with mock.patch.object(cache_home, '_calcular_feed') as calcular:
+            self.assertEqual(cache_home.feed_home(), feed)
+        calcular.assert_not_called()
+        with self.assertNumQueries(1):
+            inscrito = cache_home.html_para_usuario(feed, self.usuarios[0])
+        self.assertIn('Inscrito', inscrito)
+        self.assertNotIn('<!--estado:', inscrito)
+
+        organizador = cache_home.html_para_usuario(feed, self.partido.id_organizador)
+        self.assertIn('Organizas', organizador)
+        self.assertNotIn('Inscrito', organizador)
+
+        anonimo = self.client.get(reverse('home')).content.decode()
+        self.assertIn('Cancha 1', anonimo)
+        for texto in ('Inscrito', 'Organizas', '<!--estado:'):
+            self.assertNotIn(texto, anonimo)
+
+
+class FeedPartidosTest(DatosInscripcion, TestCase):
+
+    def test_cursor_siguiente_y_cursor_invalido(self):
+        for dias in (2, 3):
+            Partido.objects.create(
+                lugar=f'Cancha {dias}', fecha_inicio=timezone.now() + timedelta(days=dias),
+                id_organizador=self.usuarios[0], id_localidad=self.partido.id_localidad,
+            )
+        url = reverse('api_partidos')
+        primera = self.client.get(url, {'tamano': 2}).json()
+        self.assertEqual(len(primera['resultados']), 2)
+        segunda = self.client.get(url, {'tamano': 2, 'cursor': primera['siguiente']}).json()
+        self.assertEqual(len(segunda['resultados']), 1)
+        self.assertIsNone(segunda['siguiente'])
+
+        # Un cursor sin fecha (del orden "todos"), con una fecha imposible o ilegible vuelve a la primera página
+        for cursor in (
+            codificar_cursor([None, self.partido.pk]), codificar_cursor(['2026-13-01T00:00:00', 1]),
+            codificar_cursor([20260101, 1]), 'no-es-un-cursor',
+        ):
+            respuesta = self.client.get(url, {'tamano': 2, 'cuando': 'proximos', 'cursor': cursor})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.json()['resultados'], primera['resultados'])
+
+
+class PartidosCercanosTest(TestCase):
+
+    def setUp(self):
+        self.organizador = Usuario.objects.create_user('organizador@nf1.cl', 'Organizador', 'Prueba', 'clave123')
+        self.cerca = Localidad.objects.create(nombre='Providencia', latitud=-33.43, longitud=-70.61)
+        self.lejos = Localidad.objects.create(nombre='Valparaíso', latitud=-33.05, longitud=-71.62)
+
+    def _partido(self, localidad, dias):
+        return Partido.objects.create(
+            lugar=localidad.nombre, fecha_inicio=timezone.now() + timedelta(days=dias),
+            id_organizador=self.organizador, id_localidad=localidad,
+        )
+
+    def test_radio_ventana_y_tope_de_candidatos(self):
+        pronto = self._partido(self.cerca, 1)
+        despues = self._partido(self.cerca, 2)
+        self._partido(self.cerca, cercania.DIAS_PARTIDOS + 5)
+        self._partido(self.lejos, 1)
+        cercanos = cercania.partidos_cercanos(-33.44, -70.62, 10)
+        self.assertEqual([partido.pk for partido in cercanos], [pronto.pk, despues.pk])
+        self.assertLess(cercanos[0].distancia_km, 10)
+
+        with mock.patch.object(cercania, 'MAX_CANDIDATOS', 1):
+            self.assertEqual([partido.pk for partido in cercania.partidos_cercanos(-33.44, -70.62, 10)], [pronto.pk])
+
+
+class BusquedaPartidosTest(TransactionTestCase):
+    """Búsqueda por texto: en MySQL el índice FULLTEXT solo ve filas confirmadas, por eso TransactionTestCase"""
+
+    def setUp(self):
+        self.localidad = Localidad.objects.create(nombre='Santiago Centro')
+        self.usuario = Usuario.objects.create_user('organizador@nf1.cl', 'Organizador', 'Prueba', 'clave123')
+        self.manana = timezone.now() + timedelta(days=1)
+
+    def _partido(self, lugar, descripcion, fecha_inicio=None, **campos):
+        return Partido.objects.create(
+            lugar=lugar, descripcion=descripcion, fecha_inicio=fecha_inicio or self.manana,
+            id_organizador=self.usuario, id_localidad=self.localidad, **campos
+        )
+
+    def _buscar(self, **parametros):
+        respuesta = self.client.get(reverse('api_buscar_partidos'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_relevancia_y_filtros(self):
+        ambos = self._partido('Estadio Central', 'Futbolito nocturno con luces')
+        uno = self._partido('Cancha Norte', 'Futbolito de día')
+        self._partido('Estadio Sur', 'Partido nocturno', fecha_inicio=timezone.now() - timedelta(days=1))
+        self._partido('Cancha Oeste', 'Futbolito nocturno', archivado=True)
+        self._partido('Gimnasio', 'Básquetbol')
+
+        ids = [resultado['id_partido'] for resultado in self._buscar(q='futbolito nocturno')['resultados']]
+        self.assertEqual(ids[0], ambos.id_partido)
+        self.assertCountEqual(ids, [ambos.id_partido, uno.id_partido])
+
+        ids = [resultado['id_partido'] for resultado in self._buscar(q='nocturno', cuando='todos')['resultados']]
+        self.assertEqual(len(ids), 2)
+
+        self._partido('Cancha Este', 'Lugar editado')
+        Partido.objects.filter(lugar='Cancha Este').update(descripcion='Ahora es nocturno')
+        self.assertEqual(len(self._buscar(q='nocturno')['resultados']), 2)
+
+    def test_paginacion(self):
+        for i in range(25):
+            self._partido(f'Estadio {i}', 'Futbolito')
+        primera = self._buscar(q='futbolito')
+        self.assertEqual(len(primera['resultados']), 20)
+        self.assertEqual(primera['pagina_siguiente'], 2)
+        segunda = self._buscar(q='futbolito', pagina=2)
+        self.assertEqual(len(segunda['resultados']), 5)
+        self.assertIsNone(segunda['pagina_siguiente'])
+
+        respuesta = self.client.get(reverse('buscar_partidos'), {'q': 'futbolito'})
+        self.assertEqual(len(respuesta.context['partidos']), 20)
+
+
+class IndicesConsultasTest(TestCase):
+    """Recorre las vistas de eventos/urls.py y exige que las consultas filtradas sobre
+    las tablas grandes usen un índice (EXPLAIN) en lugar de recorrer la tabla completa"""
+    TABLAS_VIGILADAS = {
+        'reservas', 'notificaciones', 'partidos', 'partidos_competitivos', 'usuarios',
+        'participantes_partido', 'eventos_mensajepartido',
+    }
+    # Rutas que no se recorren: cierran la sesión del usuario de prueba
+    # Los flujos en vivo solo se sirven por ASGI: bajo el cliente WSGI responden 503 sin consultar
+    RUTAS_EXCLUIDAS = {'logout', 'chat_partido_eventos', 'avisos_eventos'}
+    # Recorridos completos aceptados: el invitador lista a todos los usuarios activos
+    RECORRIDOS_PERMITIDOS = {('competitiva_invitar_miembro', 'usuarios')}
+
+    @classmethod
+    def setUpTestData(cls):
+        ahora = timezone.now()
+        cls.usuario = Usuario.objects.create_superuser('staff@nf1.cl', 'Staff', 'Prueba', 'clave123')
+        otro = Usuario.objects.create_user('rival@nf1.cl', 'Rival', 'Prueba', 'clave123')
+        localidad = Localidad.objects.create(nombre='Santiago Centro')
+        recinto = Recinto.objects.create(nombre='Complejo Central', direccion='Av. Siempre Viva 123', id_localidad=localidad)
+        cls.cancha = Cancha.objects.create(nombre='Cancha 1', id_recinto=recinto)
+        cls.fecha = timezone.localdate() + timedelta(days=1)
+        HorarioCancha.objects.create(
+            id_cancha=cls.cancha, dia_semana=cls.fecha.weekday(), hora_inicio=time(9, 0), hora_fin=time(22, 0)
+        )
+        cls.reserva = Reserva.objects.create(
+            id_cancha=cls.cancha, id_recinto=recinto, id_usuario=cls.usuario,
+            fecha_reserva=cls.fecha, hora_inicio=time(10, 0), hora_fin=time(11, 0),
+        )
+        cls.partido = Partido.objects.create(
+            lugar='Cancha 1', fecha_inicio=ahora + timedelta(days=1), num_participantes=1,
+            id_organizador=cls.usuario, id_localidad=localidad,
+        )
+        ParticipantePartido.objects.create(id_partido=cls.partido, id_usuario=cls.usuario)
+        mensaje = MensajePartido.objects.create(id_partido=cls.partido, id_usuario=cls.usuario, mensaje='Hola')
+        cls.notificacion = Notificacion.objects.create(
+            id_usuario=cls.usuario, id_partido=cls.partido, tipo='nuevo_mensaje', mensaje='Hola', id_mensaje=mensaje
+        )
+        cls.equipo = Equipo.objects.create(nombre='Los Pumas', id_anfitrion=cls.usuario)
+        rival = Equipo.objects.create(nombre='Los Zorros', id_anfitrion=otro)
+        MiembroEquipo.objects.create(id_equipo=cls.equipo, id_usuario=cls.usuario, rol='anfitrion')
+        cls.partido_competitivo = PartidoCompetitivo.objects.create(
+            nombre='Clásico', id_equipo_local=cls.equipo, id_equipo_visitante=rival, id_localidad=localidad,
+            lugar='Cancha 1', fecha_hora=ahora + timedelta(days=2), id_creador=cls.usuario,
+        )
+        cls.invitacion = InvitacionEquipo.objects.create(id_equipo=rival, id_usuario=cls.usuario, id_invitador=otro)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _argumentos(self, patron):
+        valores = {
+            'partido_id': self.partido.pk,
+            'notificacion_id': self.notificacion.pk,
+            'usuario_id': self.usuario.pk,
+            'cancha_id': self.cancha.pk,
+            'reserva_id': self.reserva.pk,
+            'serie_id': 0,
+            'equipo_id': self.equipo.pk,
+            'invitacion_id': self.invitacion.pk,
+            'accion': 'rechazar',
+        }
+        if patron.name.startswith('competitiva_detalle_partido'):
+            valores['partido_id'] = self.partido_competitivo.pk
+        if patron.name == 'editar_recinto':
+            valores['pk'] = self.cancha.id_recinto_id
+        elif patron.name == 'editar_cancha':
+            valores['pk'] = self.cancha.pk
+        return {nombre: valores[nombre] for nombre in patron.pattern.converters}
+
+    def _parametros(self, nombre):
+        if nombre == 'api_horarios_disponibles':
+            return {'cancha_id': self.cancha.pk, 'fecha': self.fecha.isoformat(), 'duracion': 60}
+        if nombre == 'api_buscar_horarios':
+            return {'recinto': self.cancha.id_recinto_id, 'fecha_desde': self.fecha.isoformat()}
+        if nombre == 'disponibilidad_cancha':
+            return {'cancha': self.cancha.pk}
+        return {}
+
+    def _tablas_recorridas(self, sql):
+        """Tablas vigiladas que el plan recorre completas, sin índice que pueda resolverlas"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                detalles = [fila[-1] for fila in cursor.fetchall()]
+                return [
+                    detalle.split()[1] for detalle in detalles
+                    if detalle.startswith('SCAN ') and 'INDEX' not in detalle
+                ]
+            if connection.vendor == 'mysql':
+                cursor.execute(f'EXPLAIN {sql}')
+                columnas = [columna[0] for columna in cursor.description]
+                filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+                # Con pocas filas MySQL puede preferir ALL aunque exista un índice: solo falla si no hay ninguno posible
+                return [fila['table'] for fila in filas if fila['type'] == 'ALL' and not fila['possible_keys']]
+        self.skipTest(f'EXPLAIN no soportado para {connection.vendor}')
+
+    def test_consultas_filtradas_usan_indice(self):
+        recorridos = []
+        for patron in urls.urlpatterns:
+            if patron.name in self.RUTAS_EXCLUIDAS:
+                continue
+            url = reverse(patron.name, kwargs=self._argumentos(patron))
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url, self._parametros(patron.name))
+            self.assertLess(respuesta.status_code, 500, patron.name)
+            for consulta in consultas.captured_queries:
+                sql = consulta['sql']
+                # Solo consultas de lectura con filtro: los listados completos son otro problema
+                if not sql.startswith('SELECT') or ' WHERE ' not in sql:
+                    continue
+                for tabla in self._tablas_recorridas(sql):
+                    if tabla in self.TABLAS_VIGILADAS and (patron.name, tabla) not in self.RECORRIDOS_PERMITIDOS:
+                        recorridos.append(f'{patron.name}: {tabla} -> {sql}')
+        self.assertEqual(recorridos, [], '\n'.join(recorridos))
+
+
+@override_settings(CONSULTAS_MUESTREO=0)
+class ConsultasMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser('staff@nf1.cl', 'Staff', 'Prueba', 'clave123')
+
+    @staticmethod
+    def _vista(request):
+        Usuario.objects.count()
+        return HttpResponse()
+
+    @staticmethod
+    async def _vista_async(request):
+        await Usuario.objects.acount()
+        return HttpResponse()
+
+    def _solicitud(self, con_sesion):
+        request = RequestFactory().get('/')
+        if con_sesion:
+            self.client.force_login(self.staff)
+            request.session = self.client.session
+        else:
+            request.session = SessionStore()
+        request.user = SimpleLazyObject(partial(get_user, request))
+        request.auser = partial(auser, request)
+        return request
+
+    def test_anonimo_fuera_de_muestra_no_carga_usuario(self):
+        request = self._solicitud(con_sesion=False)
+        with self.assertNumQueries(1):
+            response = ConsultasMiddleware(self._vista)(request)
+        self.assertNotIn('X-Consultas', response)
+        self.assertFalse(hasattr(request, '_cached_user'))
+
+    def test_staff_recibe_cabeceras(self):
+        response = ConsultasMiddleware(self._vista)(self._solicitud(con_sesion=True))
+        self.assertEqual(response['X-Consultas'], '1')
+
+    async def test_async_sin_pasar_por_sync(self):
+        middleware = ConsultasMiddleware(self._vista_async)
+        self.assertTrue(iscoroutinefunction(middleware))
+        anonimo = await sync_to_async(self._solicitud)(con_sesion=False)
+        self.assertNotIn('X-Consultas', await middleware(anonimo))
+        staff = await sync_to_async(self._solicitud)(con_sesion=True)
+        # La consulta de la vista corre en el hilo de la solicitud y entra en la cuenta
+        self.assertEqual((await middleware(staff))['X-Consultas'], '1')
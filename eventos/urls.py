@@ -8,10 +8,15 @@ urlpatterns = [
     path('home/', views.home, name='home'),
     path('partidos/', views.lista_partidos, name='lista_partidos'),
     path('partidos/crear/', views.crear_partido, name='crear_partido'),
+    path('partidos/buscar/', views.buscar_partidos, name='buscar_partidos'),
+    path('cerca-de-mi/', views.cerca_de_mi, name='cerca_de_mi'),
     path('partidos/<int:partido_id>/', views.detalle_partido, name='detalle_partido'),
     path('partidos/<int:partido_id>/editar/', views.editar_partido, name='editar_partido'),
     path('partidos/<int:partido_id>/cancelar/', views.cancelar_partido, name='cancelar_partido'),
     path('partidos/<int:partido_id>/unirse/', views.unirse_partido, name='unirse_partido'),
+    path('partidos/<int:partido_id>/chat/enviar/', views.enviar_mensaje_partido, name='enviar_mensaje_partido'),
+    path('partidos/<int:partido_id>/chat/eventos/', views.chat_partido_eventos, name='chat_partido_eventos'),
+    path('partidos/<int:partido_id>/chat/leido/', views.marcar_chat_leido, name='marcar_chat_leido'),
     path('partidos/<int:partido_id>/salir/', views.salir_partido, name='salir_partido'),
     path('mis-partidos/', views.mis_partidos, name='mis_partidos'),
     path('login/', views.login_view, name='login'),
@@ -20,7 +25,9 @@ urlpatterns = [
     path('notificaciones/', views.mis_notificaciones, name='mis_notificaciones'),
     path('notificaciones/<int:notificacion_id>/marcar-leida/', views.marcar_notificacion_leida, name='marcar_notificacion_leida'),
     path('notificaciones/marcar-todas-leidas/', views.marcar_todas_leidas, name='marcar_todas_leidas'),
+    path('api/partidos/buscar/', views.api_buscar_partidos, name='api_buscar_partidos'),
     path('api/notificaciones/nuevas/', views.obtener_notificaciones_nuevas, name='obtener_notificaciones_nuevas'),
+    path('api/notificaciones/eventos/', views.avisos_eventos, name='avisos_eventos'),
     path('perfil/', views.mi_perfil, name='mi_perfil'),
     path('perfil/editar/', views.editar_perfil, name='editar_perfil'),
     path('usuario/<int:usuario_id>/', views.ver_perfil_usuario, name='ver_perfil_usuario'),
@@ -28,6 +35,8 @@ urlpatterns = [
     # --- Rutas integradas de canchas ---
     path('canchas/', views.lista_canchas, name='lista_canchas'),
     path('canchas/recintos/', views.lista_recintos, name='lista_recintos'),
+    path('canchas/recintos/ocupacion/', views.ocupacion_recintos, name='ocupacion_recintos'),
+    path('api/ocupacion-recintos/', views.api_ocupacion_recintos, name='api_ocupacion_recintos'),
     path('canchas/recintos/crear/', views.crear_recinto, name='crear_recinto'),
     path('canchas/recintos/editar/<int:pk>/', views.editar_recinto, name='editar_recinto'),
     path('canchas/crear/', views.crear_cancha, name='crear_cancha'),
@@ -37,7 +46,16 @@ urlpatterns = [
     path('reservas/crear/', views.crear_reserva, name='crear_reserva'),
     path('reservas/mis-reservas/', views.mis_reservas, name='mis_reservas'),
     path('reservas/<int:reserva_id>/cancelar/', views.cancelar_reserva, name='cancelar_reserva'),
+    path('reservas/series/crear/', views.crear_serie_reserva, name='crear_serie_reserva'),
+    path('reservas/series/<int:serie_id>/cancelar/', views.cancelar_serie_reserva, name='cancelar_serie_reserva'),
     path('api/horarios-disponibles/', views.api_horarios_disponibles, name='api_horarios_disponibles'),
+    path('api/horarios-disponibles/buscar/', views.api_buscar_horarios, name='api_buscar_horarios'),
+    path('api/cercanos/', views.api_cercanos, name='api_cercanos'),
+    path('api/partidos/', views.api_partidos, name='api_partidos'),
+    path('api/partidos/exportar/', views.api_exportar_partidos, name='api_exportar_partidos'),
+    path('api/partidos/<int:partido_id>/', views.api_detalle_partido, name='api_detalle_partido'),
+    path('api/partidos/<int:partido_id>/participantes/', views.api_participantes_partido, name='api_participantes_partido'),
+    path('api/partidos/<int:partido_id>/mensajes/', views.api_mensajes_partido, name='api_mensajes_partido'),
     # --- Rutas integradas competitiva ---
     path('competitiva/equipos/', views.lista_equipos, name='competitiva_lista_equipos'),
     path('competitiva/equipos/crear/', views.crear_equipo, name='competitiva_crear_equipo'),
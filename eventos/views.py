@@ -1,12 +1,48 @@
+import json
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from .models import Partido, Localidad, ParticipantePartido, Reserva, MensajePartido, Notificacion, Usuario, Recinto, Cancha, Equipo, MiembroEquipo, PartidoCompetitivo, InvitacionEquipo
 from django.db.models import Count, Q
 from .forms import LoginForm, RegistroForm, MensajePartidoForm, PartidoForm
-from django.http import JsonResponse
+from .reservas import confirmar_reserva, crear_serie, cancelar_serie
+from .partidos import (
+    inscribir_participante, retirar_participante, feed_partidos, premiar_inscripcion, PUNTOS_PARTICIPACION,
+    TAMANO_PAGINA_FEED,
+)
+from .busqueda import buscar_partidos_texto, MAX_PAGINAS_BUSQUEDA
+from .cache_home import feed_home, html_para_usuario
+from .chat import (
+    DURACION_FLUJO_SEGUNDOS, LATIDO_SEGUNDOS, MENSAJES_PAGINA, REINTENTO_MS, broker, crear_mensaje, historial_mensajes,
+    marcar_leido, puede_escribir, serializar_mensaje,
+)
+from .avisos import (
+    cambios_avisos, chats_no_leidos, contar_avisos, notificaciones_no_leidas, sumar_no_leidas,
+)
+from .notificaciones import (
+    avisar_organizador, avisar_participantes, limite_retencion, no_leidas_vencidas, notificar, participantes_de,
+    recientes_de,
+)
+from .tareas import encolar
+from .paginacion import codificar_cursor, decodificar_cursor
+from .serializacion import (
+    CAMPOS_PARTICIPANTE, CAMPOS_PARTICIPANTE_DEFECTO, CAMPOS_PARTIDO, CAMPOS_PARTIDO_DEFECTO,
+    campos_pedidos, flujo_json, por_lotes, preparar_consulta, serializar,
+)
+from django.db import transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from datetime import datetime, timedelta
+from django.utils.dateparse import parse_datetime
 
 def index(request):
     """Vista de índice que redirige a la página principal"""
@@ -14,45 +50,60 @@ def index(request):
 
 def home(request):
     """Vista principal que muestra los próximos partidos"""
-    partidos = Partido.objects.filter(
-        fecha_inicio__gte=timezone.now()
-    ).select_related('id_organizador', 'id_localidad').annotate(
-        num_participantes=Count('participantes')
-    ).order_by('fecha_inicio')[:10]
-    
+    # El listado sale de la caché compartida; solo las insignias del usuario se consultan
     context = {
-        'partidos': partidos,
+        'partidos_html': mark_safe(html_para_usuario(feed_home(), request.user)),
     }
     return render(request, 'home.html', context)
 
 
-def lista_partidos(request):
-    """Vista que lista todos los partidos disponibles"""
-    localidad_filtro = request.GET.get('localidad')
-    
-    partidos = Partido.objects.select_related(
-        'id_organizador', 'id_localidad'
-    ).annotate(
-        num_participantes=Count('participantes')
-    ).order_by('-fecha_inicio')
+def _filtros_feed(request):
+    """Filtros del feed desde la consulta; devuelve (filtros, fechas_invalidas)"""
+    localidad = request.GET.get('localidad')
+    fecha_desde = fecha_hasta = None
+    fechas_invalidas = False
+    try:
+        if request.GET.get('desde'):
+            fecha_desde = timezone.make_aware(datetime.strptime(request.GET['desde'], '%Y-%m-%d'))
+        if request.GET.get('hasta'):
+            fecha_hasta = timezone.make_aware(datetime.strptime(request.GET['hasta'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        fecha_desde = fecha_hasta = None
+        fechas_invalidas = True
+    try:
+        cupos = max(0, int(request.GET.get('cupos') or 0))
+    except ValueError:
+        cupos = 0
+    if request.GET.get('disponibles') == '1':
+        cupos = max(cupos, 1)
     
-    if localidad_filtro:
-        partidos = partidos.filter(id_localidad__id_localidad=localidad_filtro)
+    filtros = {
+        'localidad_id': localidad if localidad and localidad.isdigit() else None,
+        'solo_proximos': request.GET.get('cuando', 'proximos') != 'todos',
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'cupos_minimos': cupos,
+    }
+    return filtros, fechas_invalidas
+
+
+def lista_partidos(request):
+    """Feed de partidos con filtros y paginación por cursor"""
+    filtros, fechas_invalidas = _filtros_feed(request)
+    if fechas_invalidas:
+        messages.warning(request, 'Formato de fecha inválido; se ignoró el filtro de fechas.')
+    partidos, siguiente = feed_partidos(cursor=request.GET.get('cursor'), **filtros)
     
-    # Si el usuario está autenticado, marcar en qué partidos está inscrito
-    if request.user.is_authenticated:
-        partidos_ids_inscritos = ParticipantePartido.objects.filter(
-            id_usuario=request.user
-        ).values_list('id_partido_id', flat=True)
-        
-        for partido in partidos:
-            partido.usuario_inscrito = partido.id_partido in partidos_ids_inscritos
-    else:
-        for partido in partidos:
-            partido.usuario_inscrito = False
+    # Inscripciones del usuario solo entre los partidos de esta página
+    inscritos = set()
+    if request.user.is_authenticated and partidos:
+        inscritos = set(ParticipantePartido.objects.filter(
+            id_usuario=request.user,
+            id_partido__in=[partido.id_partido for partido in partidos]
+        ).values_list('id_partido_id', flat=True))
     
-    # Agregar estado de disponibilidad para cada partido
     for partido in partidos:
+        partido.usuario_inscrito = partido.id_partido in inscritos
         partido.casi_lleno = partido.num_participantes >= (partido.max_jugadores * 0.75)
         partido.completo = partido.num_participantes >= partido.max_jugadores
     
@@ -60,17 +111,226 @@ def lista_partidos(request):
     
     context = {
         'partidos': partidos,
+        'siguiente': siguiente,
         'localidades': localidades,
-        'localidad_filtro': localidad_filtro,
+        'localidad_filtro': request.GET.get('localidad'),
+        'cuando': request.GET.get('cuando', 'proximos'),
+        'desde': request.GET.get('desde', ''),
+        'hasta': request.GET.get('hasta', ''),
+        'cupos': request.GET.get('cupos', ''),
+        'solo_disponibles': request.GET.get('disponibles') == '1',
+        'hay_filtros': any(request.GET.get(campo) for campo in ('localidad', 'desde', 'hasta', 'cupos', 'disponibles', 'cuando')),
     }
     return render(request, 'lista_partidos.html', context)
 
 
+# Filas máximas por página en la API de partidos
+TAMANO_MAXIMO_API = 100
+
+def _tamano_api(request, por_defecto):
+    try:
+        tamano = int(request.GET.get('tamano', por_defecto))
+    except ValueError:
+        raise ValueError('tamano debe ser un número')
+    return min(max(tamano, 1), TAMANO_MAXIMO_API)
+
+def api_partidos(request):
+    """API de solo lectura del feed de partidos, con ?fields= y paginación por cursor"""
+    try:
+        campos = campos_pedidos(request.GET.get('fields'), CAMPOS_PARTIDO, CAMPOS_PARTIDO_DEFECTO)
+        tamano = _tamano_api(request, TAMANO_PAGINA_FEED)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    filtros, fechas_invalidas = _filtros_feed(request)
+    if fechas_invalidas:
+        return JsonResponse({'error': 'Formato de fecha inválido (AAAA-MM-DD)'}, status=400)
+    
+    # El cursor del feed se arma con fecha_inicio e id_partido
+    consulta = preparar_consulta(Partido.objects.all(), CAMPOS_PARTIDO, campos, siempre=('id_partido', 'fecha_inicio'))
+    partidos, siguiente = feed_partidos(cursor=request.GET.get('cursor'), tamano=tamano, consulta=consulta, **filtros)
+    return JsonResponse({
+        'fields': campos,
+        'siguiente': siguiente,
+        'resultados': [serializar(partido, CAMPOS_PARTIDO, campos) for partido in partidos],
+    })
+
+def api_detalle_partido(request, partido_id):
+    """API de solo lectura con los campos pedidos de un partido"""
+    try:
+        campos = campos_pedidos(request.GET.get('fields'), CAMPOS_PARTIDO, CAMPOS_PARTIDO_DEFECTO)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    partido = preparar_consulta(Partido.objects.all(), CAMPOS_PARTIDO, campos).filter(pk=partido_id).first()
+    if partido is None:
+        return JsonResponse({'error': 'Partido no encontrado'}, status=404)
+    return JsonResponse(serializar(partido, CAMPOS_PARTIDO, campos))
+
+def api_participantes_partido(request, partido_id):
+    """API de solo lectura con los inscritos de un partido, por orden de inscripción"""
+    try:
+        campos = campos_pedidos(request.GET.get('fields'), CAMPOS_PARTICIPANTE, CAMPOS_PARTICIPANTE_DEFECTO)
+        tamano = _tamano_api(request, TAMANO_MAXIMO_API)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not Partido.objects.filter(pk=partido_id).exists():
+        return JsonResponse({'error': 'Partido no encontrado'}, status=404)
+    
+    participantes = preparar_consulta(
+        ParticipantePartido.objects.filter(id_partido_id=partido_id), CAMPOS_PARTICIPANTE, campos,
+        siempre=('id_participante',)
+    ).order_by('id_participante')
+    clave = decodificar_cursor(request.GET.get('cursor'))
+    if clave and isinstance(clave[0], int):
+        participantes = participantes.filter(id_participante__gt=clave[0])
+    
+    pagina = list(participantes[:tamano + 1])
+    siguiente = None
+    if len(pagina) > tamano:
+        pagina = pagina[:tamano]
+        siguiente = codificar_cursor([pagina[-1].id_participante])
+    return JsonResponse({
+        'fields': campos,
+        'siguiente': siguiente,
+        'resultados': [serializar(participante, CAMPOS_PARTICIPANTE, campos) for participante in pagina],
+    })
+
+def api_mensajes_partido(request, partido_id):
+    """
+    Historial del chat de un partido en orden cronológico, por páginas.
+    
+    Sin parámetros devuelve los últimos mensajes. ?before_id= trae los
+    anteriores a ese mensaje y la respuesta indica en before_id desde dónde
+    seguir (null si no quedan). ?after_id= trae solo los posteriores, para
+    consultar lo nuevo; after_id de la respuesta es el último mensaje entregado.
+    """
+    try:
+        tamano = _tamano_api(request, MENSAJES_PAGINA)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    antes_de = request.GET.get('before_id') or '0'
+    despues_de = request.GET.get('after_id') or '0'
+    if not (antes_de.isdigit() and despues_de.isdigit()):
+        return JsonResponse({'error': 'before_id y after_id deben ser ids de mensaje'}, status=400)
+    antes_de, despues_de = int(antes_de), int(despues_de)
+    if antes_de and despues_de:
+        return JsonResponse({'error': 'Usa before_id o after_id, no ambos'}, status=400)
+    if not Partido.objects.filter(pk=partido_id).exists():
+        return JsonResponse({'error': 'Partido no encontrado'}, status=404)
+    
+    mensajes, hay_mas = historial_mensajes(partido_id, antes_de=antes_de, despues_de=despues_de, limite=tamano)
+    return JsonResponse({
+        'resultados': [serializar_mensaje(mensaje) for mensaje in mensajes],
+        'before_id': mensajes[0].id_mensaje if mensajes and hay_mas and not despues_de else None,
+        'after_id': mensajes[-1].id_mensaje if mensajes else despues_de or None,
+        'hay_mas_recientes': hay_mas if despues_de else False,
+    })
+
+def api_exportar_partidos(request):
+    """
+    Exportación completa de partidos como JSON en flujo, para sincronizaciones masivas.
+    
+    ?modificados_desde=<ISO 8601> limita a los cambiados desde esa fecha y
+    ?archivados=1 incluye los partidos ya jugados.
+    """
+    try:
+        campos = campos_pedidos(request.GET.get('fields'), CAMPOS_PARTIDO, CAMPOS_PARTIDO_DEFECTO)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    partidos = Partido.objects.all()
+    if request.GET.get('archivados') != '1':
+        partidos = partidos.filter(archivado=False)
+    desde_texto = request.GET.get('modificados_desde')
+    if desde_texto:
+        try:
+            desde = parse_datetime(desde_texto.replace(' ', '+'))
+        except ValueError:
+            # Bien formada pero imposible (mes 13, 30 de febrero)
+            desde = None
+        if desde is None:
+            return JsonResponse({'error': 'modificados_desde debe ser una fecha ISO 8601'}, status=400)
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+        partidos = partidos.filter(fecha_actualizacion__gte=desde)
+    
+    partidos = preparar_consulta(partidos, CAMPOS_PARTIDO, campos, siempre=('id_partido',))
+    generado = timezone.now()
+    return StreamingHttpResponse(
+        flujo_json(por_lotes(partidos), CAMPOS_PARTIDO, campos, fields=campos, generado=generado),
+        content_type='application/json',
+    )
+
+
+def _parametros_busqueda(request):
+    """Extraer (texto, solo_proximos, pagina) de la consulta de búsqueda"""
+    texto = request.GET.get('q', '').strip()
+    solo_proximos = request.GET.get('cuando', 'proximos') != 'todos'
+    try:
+        pagina = int(request.GET.get('pagina', 1))
+    except ValueError:
+        pagina = 1
+    return texto, solo_proximos, min(max(pagina, 1), MAX_PAGINAS_BUSQUEDA)
+
+
+def buscar_partidos(request):
+    """Búsqueda de partidos por lugar o descripción, ordenada por relevancia"""
+    texto, solo_proximos, pagina = _parametros_busqueda(request)
+    partidos, hay_siguiente = buscar_partidos_texto(texto, solo_proximos, pagina)
+    
+    inscritos = set()
+    if request.user.is_authenticated and partidos:
+        inscritos = set(ParticipantePartido.objects.filter(
+            id_usuario=request.user,
+            id_partido__in=[partido.id_partido for partido in partidos]
+        ).values_list('id_partido_id', flat=True))
+    for partido in partidos:
+        partido.usuario_inscrito = partido.id_partido in inscritos
+        partido.completo = partido.num_participantes >= partido.max_jugadores
+    
+    context = {
+        'partidos': partidos,
+        'q': texto,
+        'cuando': 'proximos' if solo_proximos else 'todos',
+        'pagina': pagina,
+        'pagina_anterior': pagina - 1 if pagina > 1 else None,
+        'pagina_siguiente': pagina + 1 if hay_siguiente and pagina < MAX_PAGINAS_BUSQUEDA else None,
+    }
+    return render(request, 'buscar_partidos.html', context)
+
+
+def api_buscar_partidos(request):
+    """API de búsqueda de partidos por texto (AJAX)"""
+    texto, solo_proximos, pagina = _parametros_busqueda(request)
+    if not texto:
+        return JsonResponse({'error': 'q requerido'}, status=400)
+    
+    partidos, hay_siguiente = buscar_partidos_texto(texto, solo_proximos, pagina)
+    return JsonResponse({
+        'q': texto,
+        'pagina': pagina,
+        'pagina_siguiente': pagina + 1 if hay_siguiente and pagina < MAX_PAGINAS_BUSQUEDA else None,
+        'resultados': [
+            {
+                'id_partido': partido.id_partido,
+                'lugar': partido.lugar,
+                'descripcion': partido.descripcion,
+                'fecha_inicio': partido.fecha_inicio.isoformat() if partido.fecha_inicio else None,
+                'localidad': partido.id_localidad.nombre,
+                'num_participantes': partido.num_participantes,
+                'max_jugadores': partido.max_jugadores,
+                'relevancia': round(partido.relevancia, 4),
+                'url': reverse('detalle_partido', args=[partido.id_partido]),
+            }
+            for partido in partidos
+        ],
+    })
+
+
 def detalle_partido(request, partido_id):
     """Vista de detalle de un partido específico con mensajes"""
     partido = get_object_or_404(
         Partido.objects.select_related('id_organizador', 'id_localidad', 'id_reserva')
-        .prefetch_related('participantes__id_usuario', 'mensajes__id_usuario'),
+        .prefetch_related('participantes__id_usuario'),
         pk=partido_id
     )
     
@@ -83,29 +343,16 @@ def detalle_partido(request, partido_id):
         # Puede enviar mensajes si es participante o el organizador
         puede_enviar_mensaje = esta_inscrito or partido.id_organizador == request.user
     
-    # Obtener mensajes del partido
-    mensajes = partido.mensajes.all()
+    # Solo la última página del chat; los anteriores se piden a api_mensajes_partido
+    mensajes, hay_anteriores = historial_mensajes(partido.pk)
+    if puede_enviar_mensaje and mensajes:
+        marcar_leido(partido.pk, request.user.pk, mensajes[-1].id_mensaje)
     
     # Manejar envío de mensajes
     if request.method == 'POST' and puede_enviar_mensaje:
         form = MensajePartidoForm(request.POST)
         if form.is_valid():
-            mensaje = form.save(commit=False)
-            mensaje.id_partido = partido
-            mensaje.id_usuario = request.user
-            mensaje.save()
-            
-            # Crear notificación para el organizador si no es él quien escribe
-            if partido.id_organizador != request.user:
-                Notificacion.objects.create(
-                    id_usuario=partido.id_organizador,
-                    id_partido=partido,
-                    tipo='nuevo_mensaje',
-                    mensaje=f"{request.user.nombre} escribió un mensaje en '{partido.lugar}'",
-                    id_usuario_relacionado=request.user,
-                    id_mensaje=mensaje
-                )
-            
+            crear_mensaje(partido, request.user, form.cleaned_data['mensaje'])
             messages.success(request, 'Mensaje enviado correctamente.')
             return redirect('detalle_partido', partido_id=partido_id)
     else:
@@ -117,22 +364,98 @@ def detalle_partido(request, partido_id):
         'esta_inscrito': esta_inscrito,
         'espacios_disponibles': partido.espacios_disponibles(),
         'mensajes': mensajes,
+        'hay_anteriores': hay_anteriores,
+        'ultimo_mensaje_id': mensajes[-1].id_mensaje if mensajes else 0,
         'form': form,
         'puede_enviar_mensaje': puede_enviar_mensaje,
     }
     return render(request, 'detalle_partido.html', context)
 
 
+@login_required
+@require_POST
+def enviar_mensaje_partido(request, partido_id):
+    """Enviar un mensaje al chat sin recargar: responde el mensaje en JSON"""
+    partido = get_object_or_404(Partido.objects.only('id_partido', 'lugar', 'id_organizador'), pk=partido_id)
+    if not puede_escribir(partido, request.user):
+        return JsonResponse({'error': 'Solo el organizador y los inscritos pueden escribir'}, status=403)
+    form = MensajePartidoForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    mensaje = crear_mensaje(partido, request.user, form.cleaned_data['mensaje'])
+    return JsonResponse(serializar_mensaje(mensaje), status=201)
+
+
+@login_required
+@require_POST
+def marcar_chat_leido(request, partido_id):
+    """Avanzar el cursor de lectura del chat hasta el mensaje indicado (el chat abierto lo llama)"""
+    hasta = request.POST.get('hasta', '')
+    if not hasta.isdigit():
+        return JsonResponse({'error': 'hasta debe ser un id de mensaje'}, status=400)
+    marcar_leido(partido_id, request.user.pk, int(hasta))
+    return JsonResponse({'success': True})
+
+
+def _flujo_fuera_de_asgi(request):
+    """
+    Rechazo para un flujo pedido al sitio WSGI; None si lo atiende el proceso ASGI.
+    
+    Bajo WSGI, Django consume el flujo entero antes de enviarlo: la pestaña no
+    recibiría nada y un worker síncrono quedaría tomado hasta que se cierre.
+    El 503 hace que EventSource se rinda y la página pase a consultar.
+    """
+    if isinstance(request, ASGIRequest):
+        return None
+    return JsonResponse({'error': 'Los flujos en vivo se sirven desde FLUJOS_URL'}, status=503)
+
+
+def _respuesta_flujo(request, eventos):
+    """Respuesta Server-Sent Events; admite el sitio como origen cuando los flujos se sirven aparte (FLUJOS_URL)"""
+    response = StreamingHttpResponse(eventos, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    origen = request.headers.get('Origin')
+    if origen and origen in settings.CSRF_TRUSTED_ORIGINS:
+        response['Access-Control-Allow-Origin'] = origen
+        response['Access-Control-Allow-Credentials'] = 'true'
+        response['Vary'] = 'Origin'
+    return response
+
+
+async def chat_partido_eventos(request, partido_id):
+    """Flujo Server-Sent Events con los mensajes nuevos del chat de un partido"""
+    if (rechazo := _flujo_fuera_de_asgi(request)) is not None:
+        return rechazo
+    if not await Partido.objects.filter(pk=partido_id).aexists():
+        return JsonResponse({'error': 'Partido no encontrado'}, status=404)
+    # Al reconectar, EventSource manda el id del último evento recibido
+    desde = request.headers.get('Last-Event-ID') or request.GET.get('desde') or '0'
+    if not desde.isdigit():
+        return JsonResponse({'error': 'desde debe ser un id de mensaje'}, status=400)
+
+    async def eventos():
+        # El flujo se cierra cada cierto tiempo y el navegador reconecta solo,
+        # así ningún worker queda tomado indefinidamente por una pestaña olvidada
+        limite = time.monotonic() + DURACION_FLUJO_SEGUNDOS
+        yield f'retry: {REINTENTO_MS}\n\n'
+        async for mensaje in broker.escuchar(partido_id, int(desde), espera=LATIDO_SEGUNDOS):
+            if mensaje is None:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ': latido\n\n'
+            else:
+                yield f'id: {mensaje["id_mensaje"]}\nevent: mensaje\ndata: {json.dumps(mensaje, ensure_ascii=False)}\n\n'
+            if time.monotonic() >= limite:
+                return
+
+    return _respuesta_flujo(request, eventos())
+
+
 @login_required
 def unirse_partido(request, partido_id):
     """Vista para que un usuario se una a un partido"""
     partido = get_object_or_404(Partido, pk=partido_id)
     
-    # Verificar si hay espacio disponible
-    if partido.espacios_disponibles() <= 0:
-        messages.error(request, 'Este partido ya está completo.')
-        return redirect('detalle_partido', partido_id=partido_id)
-    
     # Verificar si el usuario ya está inscrito
     ya_inscrito = ParticipantePartido.objects.filter(
         id_partido=partido,
@@ -142,27 +465,18 @@ def unirse_partido(request, partido_id):
     if ya_inscrito:
         messages.warning(request, 'Ya estás inscrito en este partido.')
     else:
-        ParticipantePartido.objects.create(
-            id_partido=partido,
-            id_usuario=request.user
-        )
-        
-        # Agregar 10 puntos al usuario que se une
-        request.user.agregar_puntos_participacion()
-        
-        # Agregar 5 puntos al organizador
-        partido.id_organizador.agregar_puntos_organizador(1)
-        
-        # Crear notificación para el organizador
-        Notificacion.objects.create(
-            id_usuario=partido.id_organizador,
-            id_partido=partido,
-            tipo='nuevo_participante',
-            mensaje=f"{request.user.nombre} se ha unido a '{partido.lugar}' (+5 puntos)",
-            id_usuario_relacionado=request.user
-        )
+        # El cupo se toma de forma atómica: si se llenó entre medio, no se inscribe
+        try:
+            with transaction.atomic():
+                inscribir_participante(partido, request.user)
+                # Los puntos (jugador y organizador) y el aviso al organizador los da el trabajador de tareas;
+                # la tarea se confirma junto con la inscripción o ninguna de las dos
+                encolar(premiar_inscripcion, partido_id=partido.pk, usuario_id=request.user.pk)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+            return redirect('detalle_partido', partido_id=partido_id)
         
-        messages.success(request, '¡Te has unido al partido exitosamente! (+10 puntos Friendly)')
+        messages.success(request, f'¡Te has unido al partido exitosamente! (+{PUNTOS_PARTICIPACION} puntos Friendly)')
     
     return redirect('detalle_partido', partido_id=partido_id)
 
@@ -172,23 +486,16 @@ def salir_partido(request, partido_id):
     """Vista para que un usuario salga de un partido"""
     partido = get_object_or_404(Partido, pk=partido_id)
     
-    participante = ParticipantePartido.objects.filter(
-        id_partido=partido,
-        id_usuario=request.user
-    ).first()
+    with transaction.atomic():
+        salio = retirar_participante(partido, request.user)
+        if salio:
+            # Notificación para el organizador, en segundo plano
+            encolar(
+                avisar_organizador, partido_id=partido.pk, tipo='salida_participante',
+                mensaje=f"{request.user.nombre} ha salido de '{partido.lugar}'", relacionado_id=request.user.pk,
+            )
     
-    if participante:
-        participante.delete()
-        
-        # Crear notificación para el organizador
-        Notificacion.objects.create(
-            id_usuario=partido.id_organizador,
-            id_partido=partido,
-            tipo='salida_participante',
-            mensaje=f"{request.user.nombre} ha salido de '{partido.lugar}'",
-            id_usuario_relacionado=request.user
-        )
-        
+    if salio:
         messages.success(request, 'Has salido del partido.')
     else:
         messages.warning(request, 'No estabas inscrito en este partido.')
@@ -202,15 +509,11 @@ def mis_partidos(request):
     # Partidos organizados por el usuario
     partidos_organizados = Partido.objects.filter(
         id_organizador=request.user
-    ).annotate(
-        num_participantes=Count('participantes')
     ).order_by('-fecha_inicio')
     
     # Partidos en los que participa
     partidos_participando = Partido.objects.filter(
         participantes__id_usuario=request.user
-    ).annotate(
-        num_participantes=Count('participantes')
     ).order_by('-fecha_inicio')
     
     context = {
@@ -276,22 +579,26 @@ def logout_view(request):
 @login_required
 def mis_notificaciones(request):
     """Vista para mostrar las notificaciones del usuario"""
-    # Contar notificaciones no leídas primero
-    no_leidas = Notificacion.objects.filter(
-        id_usuario=request.user,
-        leida=False
-    ).count()
+    # El contador se mantiene al escribir: no hace falta contar la tabla
+    no_leidas = notificaciones_no_leidas(request.user.pk)
     
-    # Luego obtener las notificaciones limitadas
-    notificaciones = Notificacion.objects.filter(
-        id_usuario=request.user
-    ).select_related(
-        'id_partido', 'id_usuario_relacionado', 'id_mensaje__id_usuario'
-    ).order_by('-fecha_creacion')[:50]
+    # Las últimas de la ventana de retención y, al final, las no leídas más viejas: la depuración
+    # las conserva y siguen en la insignia, así que deben poder abrirse y marcarse
+    limite = limite_retencion()
+    notificaciones = [
+        *recientes_de(request.user.pk, limite).select_related(
+            'id_partido', 'id_usuario_relacionado', 'id_mensaje__id_usuario'
+        ).order_by('-fecha_creacion')[:50],
+        *no_leidas_vencidas(request.user.pk, limite).select_related(
+            'id_partido', 'id_usuario_relacionado', 'id_mensaje__id_usuario'
+        ).order_by('-fecha_creacion')[:50],
+    ]
     
     context = {
         'notificaciones': notificaciones,
         'no_leidas': no_leidas,
+        # Los mensajes de chat no generan notificaciones: salen de los cursores de lectura
+        'chats_no_leidos': chats_no_leidos(request.user.pk),
     }
     return render(request, 'notificaciones.html', context)
 
@@ -299,9 +606,14 @@ def mis_notificaciones(request):
 @login_required
 def marcar_notificacion_leida(request, notificacion_id):
     """Vista para marcar una notificación como leída"""
-    notificacion = get_object_or_404(Notificacion, id_notificacion=notificacion_id, id_usuario=request.user)
-    notificacion.leida = True
-    notificacion.save()
+    with transaction.atomic():
+        # Solo el paso de no leída a leída descuenta: marcarla dos veces no resta de más
+        if Notificacion.objects.filter(
+            id_notificacion=notificacion_id, id_usuario=request.user, leida=False
+        ).update(leida=True):
+            sumar_no_leidas({request.user.pk: -1})
+        elif not Notificacion.objects.filter(id_notificacion=notificacion_id, id_usuario=request.user).exists():
+            raise Http404('Notificación no encontrada')
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -312,7 +624,10 @@ def marcar_notificacion_leida(request, notificacion_id):
 @login_required
 def marcar_todas_leidas(request):
     """Vista para marcar todas las notificaciones como leídas"""
-    Notificacion.objects.filter(id_usuario=request.user, leida=False).update(leida=True)
+    with transaction.atomic():
+        # Se resta lo marcado y no se deja en cero: una notificación que llegue entre medio sigue contando
+        marcadas = Notificacion.objects.filter(id_usuario=request.user, leida=False).update(leida=True)
+        sumar_no_leidas({request.user.pk: -marcadas})
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -324,8 +639,26 @@ def marcar_todas_leidas(request):
 @login_required
 def obtener_notificaciones_nuevas(request):
     """API para obtener el conteo de notificaciones nuevas (AJAX)"""
-    count = Notificacion.objects.filter(id_usuario=request.user, leida=False).count()
-    return JsonResponse({'count': count})
+    return JsonResponse(contar_avisos(request.user.pk))
+
+
+async def avisos_eventos(request):
+    """Flujo Server-Sent Events con el contador de la insignia, enviado solo cuando cambia"""
+    if (rechazo := _flujo_fuera_de_asgi(request)) is not None:
+        return rechazo
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return JsonResponse({'error': 'Sesión requerida'}, status=401)
+    
+    async def eventos():
+        yield f'retry: {REINTENTO_MS}\n\n'
+        async for conteo in cambios_avisos(usuario.pk, espera=LATIDO_SEGUNDOS, duracion=DURACION_FLUJO_SEGUNDOS):
+            if conteo is None:
+                yield ': latido\n\n'
+            else:
+                yield f'event: avisos\ndata: {json.dumps(conteo)}\n\n'
+    
+    return _respuesta_flujo(request, eventos())
 
 
 @login_required
@@ -416,21 +749,22 @@ def crear_partido(request):
                         hora_fin=hora_fin,
                         estado='confirmada'
                     )
-                    reserva_creada.full_clean()
-                    reserva_creada.save()
+                    confirmar_reserva(reserva_creada)
                     partido.id_reserva = reserva_creada
                     
                 except Exception as e:
                     messages.error(request, f'Error al crear reserva: {str(e)}')
                     return render(request, 'crear_partido.html', {'form': form})
             
-            partido.save()
-            
-            # Automáticamente inscribir al organizador en el partido
-            ParticipantePartido.objects.create(
-                id_partido=partido,
-                id_usuario=request.user
-            )
+            # Automáticamente inscribir al organizador en el partido; el contador
+            # desnormalizado y su inscripción se guardan juntos o no se guardan
+            with transaction.atomic():
+                partido.num_participantes = 1
+                partido.save()
+                ParticipantePartido.objects.create(
+                    id_partido=partido,
+                    id_usuario=request.user
+                )
             
             if reserva_creada:
                 messages.success(request, f'¡Partido creado exitosamente con reserva de cancha confirmada!')
@@ -452,23 +786,19 @@ def editar_partido(request, partido_id):
     partido = get_object_or_404(Partido, id_partido=partido_id)
     
     # Verificar que el usuario sea el organizador
-    if partido.id_organizador != request.user:
+    if partido.id_organizador_id != request.user.pk:
         messages.error(request, 'No tienes permiso para editar este partido.')
         return redirect('detalle_partido', partido_id=partido.id_partido)
     
     if request.method == 'POST':
         form = PartidoForm(request.POST, instance=partido)
         if form.is_valid():
-            form.save()
-            
-            # Notificar a todos los participantes del cambio
-            participantes = ParticipantePartido.objects.filter(id_partido=partido).exclude(id_usuario=request.user)
-            for participante in participantes:
-                Notificacion.objects.create(
-                    id_usuario=participante.id_usuario,
-                    tipo='info',
+            with transaction.atomic():
+                form.save()
+                # Notificar a todos los participantes del cambio, en segundo plano
+                encolar(
+                    avisar_participantes, partido_id=partido.pk, tipo='info', excluir=request.user.pk,
                     mensaje=f'El partido "{partido.lugar}" ha sido actualizado por el organizador.',
-                    id_partido=partido
                 )
             
             messages.success(request, 'Partido actualizado exitosamente.')
@@ -497,22 +827,19 @@ def cancelar_partido(request, partido_id):
     partido = get_object_or_404(Partido, id_partido=partido_id)
     
     # Verificar que el usuario sea el organizador
-    if partido.id_organizador != request.user:
+    if partido.id_organizador_id != request.user.pk:
         messages.error(request, 'No tienes permiso para cancelar este partido.')
         return redirect('detalle_partido', partido_id=partido.id_partido)
     
     if request.method == 'POST':
-        # Notificar a todos los participantes
-        participantes = ParticipantePartido.objects.filter(id_partido=partido).exclude(id_usuario=request.user)
-        for participante in participantes:
-            Notificacion.objects.create(
-                id_usuario=participante.id_usuario,
+        # Los inscritos se leen antes de borrar; la notificación (sin partido) se envía en segundo plano
+        with transaction.atomic():
+            encolar(
+                notificar, usuario_ids=participantes_de(partido.pk, excluir=request.user.pk), partido_id=None,
                 tipo='cancelacion',
                 mensaje=f'El partido "{partido.lugar}" del {partido.fecha_inicio.strftime("%d/%m/%Y %H:%M")} ha sido cancelado.',
-                id_partido=partido
             )
-        
-        partido.delete()
+            partido.delete()
         messages.success(request, 'Partido cancelado exitosamente.')
         return redirect('mis_partidos')
     
@@ -526,6 +853,7 @@ def cancelar_partido(request, partido_id):
 # ------------------------
 from django.contrib.admin.views.decorators import staff_member_required
 from .forms import RecintoForm, CanchaForm
+from .ocupacion import mapa_calor, ocupacion_por_cancha
 
 @staff_member_required
 def lista_canchas(request):
@@ -540,7 +868,7 @@ def lista_canchas(request):
         canchas = canchas.filter(id_recinto__id_recinto=recinto_filtro)
     if tipo_filtro:
         canchas = canchas.filter(tipo=tipo_filtro)
-    recintos = Recinto.objects.select_related('id_localidad').all().order_by('nombre')
+    recintos = Recinto.objects.select_related('id_localidad').annotate(num_canchas=Count('cancha')).order_by('nombre')
     tipos = Cancha.objects.values_list('tipo', flat=True).distinct().exclude(tipo__isnull=True)
     return render(request, 'canchas/lista_canchas.html', {
         'canchas': canchas,
@@ -554,9 +882,84 @@ def lista_canchas(request):
 
 @staff_member_required
 def lista_recintos(request):
-    recintos = Recinto.objects.select_related('id_localidad').all().order_by('nombre')
+    recintos = Recinto.objects.select_related('id_localidad').annotate(num_canchas=Count('cancha')).order_by('nombre')
     return render(request, 'canchas/lista_recintos.html', {'recintos': recintos})
 
+# Semanas del mapa de ocupación por defecto y máximas
+SEMANAS_OCUPACION = 8
+MAX_SEMANAS_OCUPACION = 52
+
+def _parametros_ocupacion(request):
+    """Extraer (recinto_id, semanas, fecha_desde, fecha_hasta); el período termina ayer"""
+    recinto_id = request.GET.get('recinto') or None
+    if recinto_id is not None:
+        recinto_id = int(recinto_id)
+    semanas = int(request.GET.get('semanas', SEMANAS_OCUPACION))
+    if semanas < 1 or semanas > MAX_SEMANAS_OCUPACION:
+        raise ValueError(f'semanas debe estar entre 1 y {MAX_SEMANAS_OCUPACION}')
+    fecha_hasta = timezone.localdate() - timedelta(days=1)
+    fecha_desde = fecha_hasta - timedelta(weeks=semanas) + timedelta(days=1)
+    return recinto_id, semanas, fecha_desde, fecha_hasta
+
+def _canchas_ocupacion(recinto_id):
+    canchas = Cancha.objects.select_related('id_recinto').order_by('id_recinto__nombre', 'nombre')
+    if recinto_id is not None:
+        canchas = canchas.filter(id_recinto_id=recinto_id)
+    return list(canchas)
+
+@staff_member_required
+def ocupacion_recintos(request):
+    """Mapa de calor de ocupación (día de la semana x hora) de un recinto o de todos"""
+    try:
+        recinto_id, semanas, fecha_desde, fecha_hasta = _parametros_ocupacion(request)
+    except ValueError:
+        messages.error(request, 'Parámetros de ocupación inválidos.')
+        return redirect('ocupacion_recintos')
+    
+    canchas = _canchas_ocupacion(recinto_id)
+    cancha_ids = [cancha.id_cancha for cancha in canchas]
+    horas, filas = mapa_calor(cancha_ids, fecha_desde, fecha_hasta)
+    totales = ocupacion_por_cancha(cancha_ids, fecha_desde, fecha_hasta)
+    for cancha in canchas:
+        cancha.ocupacion = totales.get(cancha.id_cancha)
+    
+    return render(request, 'canchas/ocupacion_recintos.html', {
+        'recintos': Recinto.objects.order_by('nombre'),
+        'recinto_filtro': recinto_id,
+        'semanas': semanas,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'horas': horas,
+        'filas': filas,
+        'canchas': canchas,
+    })
+
+@staff_member_required
+def api_ocupacion_recintos(request):
+    """API con la ocupación por día de la semana y hora, y el total por cancha"""
+    try:
+        recinto_id, semanas, fecha_desde, fecha_hasta = _parametros_ocupacion(request)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros de ocupación inválidos'}, status=400)
+    
+    canchas = _canchas_ocupacion(recinto_id)
+    cancha_ids = [cancha.id_cancha for cancha in canchas]
+    horas, filas = mapa_calor(cancha_ids, fecha_desde, fecha_hasta)
+    totales = ocupacion_por_cancha(cancha_ids, fecha_desde, fecha_hasta)
+    
+    return JsonResponse({
+        'fecha_desde': fecha_desde.isoformat(),
+        'fecha_hasta': fecha_hasta.isoformat(),
+        'semanas': semanas,
+        'horas': horas,
+        'mapa': filas,
+        'canchas': [
+            {'cancha_id': cancha.id_cancha, 'cancha': cancha.nombre, 'recinto': cancha.id_recinto.nombre,
+             **(totales.get(cancha.id_cancha) or {'apertura': 0, 'reservados': 0, 'porcentaje': None})}
+            for cancha in canchas
+        ],
+    })
+
 @staff_member_required
 def crear_recinto(request):
     if request.method == 'POST':
@@ -610,9 +1013,12 @@ def editar_cancha(request, pk):
 # ------------------------
 # Vistas de Calendario y Reservas
 # ------------------------
-from .models import HorarioCancha
-from .forms import ReservaForm, HorarioCanchaForm
-from datetime import datetime, timedelta
+from .models import HorarioCancha, SerieReserva
+from .forms import ReservaForm, HorarioCanchaForm, SerieReservaForm
+from .disponibilidad import calendario_cancha, buscar_slots, a_minutos, hora_texto
+from .cercania import partidos_cercanos, canchas_cercanas, MAX_RADIO_KM
+from .cache_disponibilidad import horarios_cacheados, obtener_version
+from django.views.decorators.http import condition
 
 def disponibilidad_cancha(request):
     """Mostrar calendario de disponibilidad de canchas"""
@@ -624,7 +1030,7 @@ def disponibilidad_cancha(request):
     fechas_disponibles = []
     
     if cancha_id:
-        cancha_seleccionada = get_object_or_404(Cancha, id_cancha=cancha_id)
+        cancha_seleccionada = get_object_or_404(Cancha.objects.select_related('id_recinto'), id_cancha=cancha_id)
         
         # Obtener fecha desde query param o usar hoy
         fecha_str = request.GET.get('fecha')
@@ -636,15 +1042,8 @@ def disponibilidad_cancha(request):
         else:
             fecha = timezone.now().date()
         
-        # Calcular rango de fechas para el calendario (próximos 14 días)
-        for i in range(14):
-            fecha_iter = fecha + timedelta(days=i)
-            # Obtener horarios con duración de 2 horas para el calendario
-            horarios = cancha_seleccionada.get_horarios_disponibles(fecha_iter, duracion_minutos=120)
-            fechas_disponibles.append({
-                'fecha': fecha_iter,
-                'horarios': horarios,
-            })
+        # Calendario de los próximos 14 días con slots de 2 horas, calculado en una sola pasada
+        fechas_disponibles = calendario_cancha(cancha_seleccionada, fecha, dias=14, duracion_minutos=120)
     
     context = {
         'canchas': canchas,
@@ -680,7 +1079,7 @@ def gestionar_horarios_cancha(request, cancha_id):
         'horarios': horarios,
         'form': form,
     }
-    return render(request, 'canchas/gestionar_horarios.html', context)
+    return render(request, 'gestionar_horarios.html', context)
 
 @login_required
 def crear_reserva(request):
@@ -692,8 +1091,7 @@ def crear_reserva(request):
             reserva.id_usuario = request.user
             reserva.id_recinto = reserva.id_cancha.id_recinto
             try:
-                reserva.full_clean()
-                reserva.save()
+                confirmar_reserva(reserva)
                 messages.success(request, f'Reserva confirmada para {reserva.fecha_reserva} de {reserva.hora_inicio} a {reserva.hora_fin}.')
                 return redirect('mis_reservas')
             except Exception as e:
@@ -711,7 +1109,7 @@ def crear_reserva(request):
             initial_data['hora_fin'] = request.GET.get('hora_fin')
         form = ReservaForm(initial=initial_data)
     
-    return render(request, 'canchas/crear_reserva.html', {'form': form})
+    return render(request, 'crear_reserva.html', {'form': form})
 
 @login_required
 def mis_reservas(request):
@@ -727,11 +1125,18 @@ def mis_reservas(request):
         DJQ(fecha_reserva__lt=ahora.date()) | DJQ(estado='cancelada')
     )[:20]
     
+    series = SerieReserva.objects.filter(
+        id_usuario=request.user,
+        estado='activa',
+        fecha_fin__gte=ahora.date()
+    ).select_related('id_cancha', 'id_recinto').order_by('fecha_inicio')
+    
     context = {
         'reservas_futuras': reservas_futuras,
         'reservas_pasadas': reservas_pasadas,
+        'series': series,
     }
-    return render(request, 'canchas/mis_reservas.html', context)
+    return render(request, 'mis_reservas.html', context)
 
 @login_required
 def cancelar_reserva(request, reserva_id):
@@ -748,8 +1153,81 @@ def cancelar_reserva(request, reserva_id):
         messages.success(request, 'Reserva cancelada exitosamente.')
         return redirect('mis_reservas')
     
-    return render(request, 'canchas/cancelar_reserva.html', {'reserva': reserva})
+    return render(request, 'cancelar_reserva.html', {'reserva': reserva})
+
+@login_required
+def crear_serie_reserva(request):
+    """Crear una reserva recurrente semanal (ej: todos los martes a las 20:00 de la temporada)"""
+    es_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if request.method == 'POST':
+        form = SerieReservaForm(request.POST)
+        if form.is_valid():
+            serie = form.save(commit=False)
+            serie.id_usuario = request.user
+            serie.id_recinto = serie.id_cancha.id_recinto
+            try:
+                reservas, conflictos = crear_serie(serie)
+            except ValidationError as e:
+                if es_ajax:
+                    return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+                messages.error(request, f'Error al crear la serie: {" ".join(e.messages)}')
+            else:
+                if es_ajax:
+                    return JsonResponse({
+                        'serie': serie.id_serie,
+                        'creadas': [reserva.fecha_reserva.isoformat() for reserva in reservas],
+                        'conflictos': [fecha.isoformat() for fecha in conflictos],
+                    })
+                messages.success(request, f'Serie creada con {len(reservas)} reservas.')
+                if conflictos:
+                    fechas = ', '.join(fecha.strftime('%d/%m/%Y') for fecha in conflictos)
+                    messages.warning(request, f'No se reservaron estas fechas porque ya estaban ocupadas: {fechas}')
+                return redirect('mis_reservas')
+        elif es_ajax:
+            return JsonResponse({'error': form.errors}, status=400)
+    else:
+        form = SerieReservaForm()
+    
+    return render(request, 'crear_serie_reserva.html', {'form': form})
 
+@login_required
+def cancelar_serie_reserva(request, serie_id):
+    """Cancelar una serie y todas sus reservas futuras"""
+    serie = get_object_or_404(SerieReserva, id_serie=serie_id, id_usuario=request.user)
+    
+    if request.method == 'POST':
+        if serie.estado == 'cancelada':
+            messages.warning(request, 'Esta serie ya está cancelada.')
+        else:
+            canceladas = cancelar_serie(serie)
+            messages.success(request, f'Serie cancelada ({canceladas} reservas futuras liberadas).')
+    return redirect('mis_reservas')
+
+# Duración aceptada (minutos) en las APIs de horarios
+DURACION_MINIMA = 30
+DURACION_MAXIMA = 240
+
+def _parametros_horarios(request):
+    """Extraer (cancha_id, fecha, duracion) de la consulta; None si son inválidos"""
+    try:
+        cancha_id = int(request.GET['cancha_id'])
+        fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date()
+        duracion = int(request.GET.get('duracion', 90))
+    except (KeyError, ValueError):
+        return None
+    if duracion < DURACION_MINIMA or duracion > DURACION_MAXIMA:
+        return None
+    return cancha_id, fecha, duracion
+
+def etag_horarios_disponibles(request):
+    """ETag de la API de horarios: cambia cuando cambian reservas u horarios de ese día"""
+    parametros = _parametros_horarios(request)
+    if parametros is None:
+        return None
+    cancha_id, fecha, duracion = parametros
+    return f'{obtener_version(cancha_id, fecha)}-{duracion}'
+
+@condition(etag_func=etag_horarios_disponibles)
 def api_horarios_disponibles(request):
     """API endpoint para obtener horarios disponibles (AJAX)"""
     cancha_id = request.GET.get('cancha_id')
@@ -758,35 +1236,209 @@ def api_horarios_disponibles(request):
     
     cancha = get_object_or_404(Cancha, id_cancha=cancha_id)
     fecha_str = request.GET.get('fecha')
-    duracion = int(request.GET.get('duracion', 90))
     
     if not fecha_str:
         return JsonResponse({'error': 'Fecha requerida'}, status=400)
     
+    parametros = _parametros_horarios(request)
+    if parametros is None:
+        return JsonResponse({
+            'error': f'Fecha inválida o duración fuera de {DURACION_MINIMA} a {DURACION_MAXIMA} minutos'
+        }, status=400)
+    _, fecha, duracion = parametros
+    
+    response = JsonResponse({
+        'cancha': cancha.nombre,
+        'fecha': fecha_str,
+        'horarios': horarios_cacheados(cancha.id_cancha, fecha, duracion)
+    })
+    # El navegador guarda la respuesta pero la revalida siempre con If-None-Match
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Máximo de días que se pueden consultar en una búsqueda de horarios
+MAX_DIAS_BUSQUEDA = 14
+# Cantidad de slots devueltos por defecto y máxima en una búsqueda
+LIMITE_BUSQUEDA = 200
+MAX_LIMITE_BUSQUEDA = 2000
+
+def api_buscar_horarios(request):
+    """API para buscar horarios libres en todas las canchas de una localidad o recinto (AJAX)"""
+    localidad_id = request.GET.get('localidad')
+    recinto_id = request.GET.get('recinto')
+    if not localidad_id and not recinto_id:
+        return JsonResponse({'error': 'localidad o recinto requerido'}, status=400)
     try:
-        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+        localidad_id = int(localidad_id) if localidad_id else None
+        recinto_id = int(recinto_id) if recinto_id else None
+    except ValueError:
+        return JsonResponse({'error': 'localidad y recinto deben ser ids numéricos'}, status=400)
+    
+    try:
+        fecha_desde_str = request.GET.get('fecha_desde')
+        if fecha_desde_str:
+            fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
+        else:
+            fecha_desde = timezone.now().date()
+        fecha_hasta_str = request.GET.get('fecha_hasta')
+        if fecha_hasta_str:
+            fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
+        else:
+            fecha_hasta = fecha_desde + timedelta(days=6)
     except ValueError:
         return JsonResponse({'error': 'Formato de fecha inválido'}, status=400)
     
-    horarios = cancha.get_horarios_disponibles(fecha, duracion)
+    if fecha_hasta < fecha_desde:
+        return JsonResponse({'error': 'fecha_hasta debe ser posterior a fecha_desde'}, status=400)
+    if (fecha_hasta - fecha_desde).days >= MAX_DIAS_BUSQUEDA:
+        return JsonResponse({'error': f'El rango máximo es de {MAX_DIAS_BUSQUEDA} días'}, status=400)
+    
+    try:
+        duracion = int(request.GET.get('duracion', 90))
+    except ValueError:
+        return JsonResponse({'error': 'Duración inválida'}, status=400)
+    if duracion < DURACION_MINIMA or duracion > DURACION_MAXIMA:
+        return JsonResponse({
+            'error': f'La duración debe estar entre {DURACION_MINIMA} y {DURACION_MAXIMA} minutos'
+        }, status=400)
+    
+    try:
+        # Un límite negativo cortaría desde el final de la lista
+        limite = max(1, min(int(request.GET.get('limite', LIMITE_BUSQUEDA)), MAX_LIMITE_BUSQUEDA))
+    except ValueError:
+        return JsonResponse({'error': 'Límite inválido'}, status=400)
+    
+    # Franja horaria opcional (ej: hora_desde=18:00&hora_hasta=23:00)
+    franja = None
+    hora_desde_str = request.GET.get('hora_desde')
+    hora_hasta_str = request.GET.get('hora_hasta')
+    if hora_desde_str or hora_hasta_str:
+        try:
+            desde = a_minutos(datetime.strptime(hora_desde_str, '%H:%M').time()) if hora_desde_str else 0
+            hasta = a_minutos(datetime.strptime(hora_hasta_str, '%H:%M').time()) if hora_hasta_str else 24 * 60
+        except ValueError:
+            return JsonResponse({'error': 'Formato de hora inválido'}, status=400)
+        franja = (desde, hasta)
+    
+    canchas = Cancha.objects.select_related('id_recinto').only(
+        'id_cancha', 'nombre', 'tipo', 'id_recinto__id_recinto', 'id_recinto__nombre'
+    )
+    if localidad_id is not None:
+        canchas = canchas.filter(id_recinto__id_localidad_id=localidad_id)
+    if recinto_id is not None:
+        canchas = canchas.filter(id_recinto_id=recinto_id)
     
-    # Formatear respuesta
-    horarios_formateados = [{
-        'hora_inicio': slot['hora_inicio'].strftime('%H:%M'),
-        'hora_fin': slot['hora_fin'].strftime('%H:%M'),
-    } for slot in horarios]
+    slots = buscar_slots(canchas, fecha_desde, fecha_hasta, duracion, franja)
+    
+    # Los datos de cada cancha van una sola vez; los slots solo referencian su id
+    canchas_info = {}
+    slots_formateados = []
+    for fecha, inicio, fin, cancha in slots[:limite]:
+        if cancha.id_cancha not in canchas_info:
+            canchas_info[cancha.id_cancha] = {
+                'cancha': cancha.nombre,
+                'tipo': cancha.tipo,
+                'recinto_id': cancha.id_recinto.id_recinto,
+                'recinto': cancha.id_recinto.nombre,
+            }
+        slots_formateados.append({
+            'cancha_id': cancha.id_cancha,
+            'fecha': fecha.isoformat(),
+            'hora_inicio': hora_texto(inicio),
+            'hora_fin': hora_texto(fin),
+        })
     
     return JsonResponse({
-        'cancha': cancha.nombre,
-        'fecha': fecha_str,
-        'horarios': horarios_formateados
+        'fecha_desde': fecha_desde.isoformat(),
+        'fecha_hasta': fecha_hasta.isoformat(),
+        'duracion': duracion,
+        'total': len(slots),
+        'canchas': canchas_info,
+        'slots': slots_formateados,
+    })
+
+# Días de horarios libres que se buscan como máximo en la búsqueda por cercanía
+MAX_DIAS_CERCANIA = 7
+
+def cerca_de_mi(request):
+    """Página que pide la ubicación del navegador y consulta api_cercanos"""
+    return render(request, 'cerca_de_mi.html', {'max_radio': MAX_RADIO_KM})
+
+def api_cercanos(request):
+    """API de partidos próximos o canchas con horarios libres alrededor de un punto (AJAX)"""
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+        radio = float(request.GET.get('radio', 10))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat y lng requeridos (números)'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({'error': 'Coordenadas fuera de rango'}, status=400)
+    if radio <= 0 or radio > MAX_RADIO_KM:
+        return JsonResponse({'error': f'El radio debe estar entre 0 y {MAX_RADIO_KM} km'}, status=400)
+    
+    tipo = request.GET.get('tipo', 'partidos')
+    if tipo == 'partidos':
+        partidos = partidos_cercanos(lat, lng, radio)
+        return JsonResponse({
+            'tipo': tipo,
+            'radio': radio,
+            'resultados': [
+                {
+                    'id_partido': partido.id_partido,
+                    'lugar': partido.lugar,
+                    'localidad': partido.id_localidad.nombre,
+                    'fecha_inicio': partido.fecha_inicio.isoformat(),
+                    'num_participantes': partido.num_participantes,
+                    'max_jugadores': partido.max_jugadores,
+                    'distancia_km': round(partido.distancia_km, 2),
+                    'url': reverse('detalle_partido', args=[partido.id_partido]),
+                }
+                for partido in partidos
+            ],
+        })
+    
+    if tipo != 'canchas':
+        return JsonResponse({'error': 'tipo debe ser partidos o canchas'}, status=400)
+    try:
+        fecha_str = request.GET.get('fecha')
+        fecha_desde = datetime.strptime(fecha_str, '%Y-%m-%d').date() if fecha_str else timezone.localdate()
+        dias = min(max(int(request.GET.get('dias', 1)), 1), MAX_DIAS_CERCANIA)
+        duracion = int(request.GET.get('duracion', 90))
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if duracion < DURACION_MINIMA or duracion > DURACION_MAXIMA:
+        return JsonResponse({
+            'error': f'La duración debe estar entre {DURACION_MINIMA} y {DURACION_MAXIMA} minutos'
+        }, status=400)
+    
+    canchas = canchas_cercanas(lat, lng, radio, fecha_desde, fecha_desde + timedelta(days=dias - 1), duracion)
+    return JsonResponse({
+        'tipo': tipo,
+        'radio': radio,
+        'duracion': duracion,
+        'resultados': [
+            {
+                'cancha_id': cancha.id_cancha,
+                'cancha': cancha.nombre,
+                'tipo': cancha.tipo,
+                'recinto': cancha.id_recinto.nombre,
+                'direccion': cancha.id_recinto.direccion,
+                'distancia_km': round(cancha.distancia_km, 2),
+                'slots': [
+                    {'fecha': fecha.isoformat(), 'hora_inicio': hora_texto(inicio), 'hora_fin': hora_texto(fin)}
+                    for fecha, inicio, fin in cancha.slots
+                ],
+            }
+            for cancha in canchas
+        ],
     })
 
 # ------------------------
 # Vistas integradas competitiva (simplificadas)
 # ------------------------
 from .forms import EquipoForm, PartidoCompetitivoForm
-from django.db.models import Count, Q as DJQ
+from django.db.models import Count, F, Q as DJQ
 from django.utils import timezone
 
 def lista_equipos(request):
@@ -797,6 +1449,16 @@ def detalle_equipo(request, equipo_id):
     equipo = get_object_or_404(Equipo.objects.prefetch_related('miembros__id_usuario'), id_equipo=equipo_id)
     miembros = equipo.miembros.filter(activo=True).select_related('id_usuario')
     partidos = PartidoCompetitivo.objects.filter(DJQ(id_equipo_local=equipo) | DJQ(id_equipo_visitante=equipo)).select_related('id_equipo_local', 'id_equipo_visitante').order_by('-fecha_hora')[:10]
+    # Victorias y partidos jugados en una sola consulta (mismos criterios que Equipo.contar_*)
+    estadisticas = PartidoCompetitivo.objects.filter(
+        DJQ(id_equipo_local=equipo) | DJQ(id_equipo_visitante=equipo)
+    ).aggregate(
+        jugados=Count('pk'),
+        victorias=Count('pk', filter=DJQ(estado='finalizado') & (
+            DJQ(id_equipo_local=equipo, goles_local__gt=F('goles_visitante'))
+            | DJQ(id_equipo_visitante=equipo, goles_visitante__gt=F('goles_local'))
+        )),
+    )
     es_miembro = False
     es_anfitrion = False
     invitacion_pendiente = None
@@ -808,6 +1470,7 @@ def detalle_equipo(request, equipo_id):
         'equipo': equipo,
         'miembros': miembros,
         'partidos': partidos,
+        'estadisticas': estadisticas,
         'es_miembro': es_miembro,
         'es_anfitrion': es_anfitrion,
         'invitacion_pendiente': invitacion_pendiente,
@@ -858,7 +1521,14 @@ def invitar_miembro(request, equipo_id):
         if MiembroEquipo.objects.filter(id_equipo=equipo, id_usuario=usuario).exists():
             messages.warning(request, 'Este usuario ya es miembro.')
             return redirect('competitiva_detalle_equipo', equipo_id=equipo_id)
-        InvitacionEquipo.objects.get_or_create(id_equipo=equipo, id_usuario=usuario, defaults={'id_invitador': request.user, 'mensaje': mensaje_texto})
+        invitacion, creada = InvitacionEquipo.objects.get_or_create(id_equipo=equipo, id_usuario=usuario, defaults={'id_invitador': request.user, 'mensaje': mensaje_texto})
+        if not creada and invitacion.estado == 'expirada':
+            # Reabrir la invitación vencida en vez de chocar con unique_together
+            invitacion.estado = 'pendiente'
+            invitacion.id_invitador = request.user
+            invitacion.mensaje = mensaje_texto
+            invitacion.fecha_invitacion = timezone.now()
+            invitacion.save()
         messages.success(request, f'Invitación enviada a {usuario.nombre}.')
         return redirect('competitiva_detalle_equipo', equipo_id=equipo_id)
     miembros_ids = equipo.miembros.values_list('id_usuario', flat=True)